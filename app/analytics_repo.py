@@ -0,0 +1,342 @@
+"""
+Chart-ready training analytics computed in the database.
+"""
+
+import re
+from datetime import date, timedelta
+from typing import List, Optional
+
+from app.report_archive import (
+    archive_boundary,
+    get_archive_manifest,
+    read_archived_set_reports,
+)
+from app.utils import cursor_factory
+from sql.analytics_sql import *
+
+MAX_POINTS = 300
+E1RM_MAX_REPS = 12
+METRICS = ("top_weight", "volume", "e1rm")
+
+
+def choose_bucket(first: date, last: date, max_points: int = MAX_POINTS) -> str:
+    """
+    Smallest of day, week or month giving at most ``max_points`` buckets.
+
+    Args:
+        first (date): First day of the range
+        last (date): Last day of the range
+        max_points (int): Maximum number of points wanted
+
+    Returns:
+        str: "day", "week" or "month"
+    """
+    days = (last - first).days + 1
+    if days <= max_points:
+        return "day"
+    if days <= max_points * 7:
+        return "week"
+    return "month"
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+# Same rule as the reps_count column of set_report.
+_LEADING_REPS = re.compile(r"\s*([0-9]{1,6})(?![0-9])", re.ASCII)
+
+
+def _leading_int(reps: str) -> Optional[int]:
+    match = _LEADING_REPS.match(reps)
+    return int(match.group(1)) if match else None
+
+
+def _archived_points(sets: List[dict], bucket: str) -> dict:
+    # Same aggregation as GET_PROGRESS_SERIES, for sets read from Parquet.
+    points = {}
+    for set_report in sets:
+        key = _bucket_start(set_report["report_date"], bucket)
+        point = points.setdefault(
+            key,
+            {"date": key, "top_weight": None, "volume": 0, "e1rm": None, "sets": 0}
+        )
+        reps = _leading_int(set_report["reps"])
+        weight = set_report["weight"]
+        point["sets"] += 1
+        point["top_weight"] = max(point["top_weight"] or weight, weight)
+        if reps is not None:
+            point["volume"] += reps * weight
+            if 1 <= reps <= E1RM_MAX_REPS:
+                e1rm = weight * (1 + reps / 30)
+                point["e1rm"] = max(point["e1rm"] or e1rm, e1rm)
+    return points
+
+
+def _merge_points(first: Optional[dict], second: dict) -> dict:
+    if first is None:
+        return second
+    return {
+        "date": second["date"],
+        "top_weight": max(first["top_weight"], second["top_weight"]),
+        "volume": first["volume"] + second["volume"],
+        "e1rm": max(
+            (value for value in (first["e1rm"], second["e1rm"]) if value is not None),
+            default=None
+        ),
+        "sets": first["sets"] + second["sets"]
+    }
+
+
+def lttb(points: List[dict], metric: str, threshold: int) -> List[dict]:
+    """
+    Downsample a series with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, from each of ``threshold - 2``
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the average of the next bucket, which keeps
+    the visual shape of the series.
+
+    Args:
+        points (List[dict]): Points ordered by "date"
+        metric (str): Key of the value to preserve the shape of
+        threshold (int): Number of points to keep
+
+    Returns:
+        List[dict]: The kept points
+    """
+    values = [
+        (point["date"].toordinal(), point[metric] or 0) for point in points
+    ]
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    kept = [points[0]]
+    size = (len(points) - 2) / (threshold - 2)
+    previous = 0
+    for index in range(threshold - 2):
+        start = int(index * size) + 1
+        end = int((index + 1) * size) + 1
+        next_end = min(int((index + 2) * size) + 1, len(points))
+        following = values[end:next_end] or [values[-1]]
+        avg_x = sum(x for x, _ in following) / len(following)
+        avg_y = sum(y for _, y in following) / len(following)
+
+        prev_x, prev_y = values[previous]
+        best, best_area = start, -1.0
+        for candidate in range(start, end):
+            x, y = values[candidate]
+            area = abs(
+                (prev_x - avg_x) * (y - prev_y) - (prev_x - x) * (avg_y - prev_y)
+            )
+            if area > best_area:
+                best, best_area = candidate, area
+        kept.append(points[best])
+        previous = best
+
+    kept.append(points[-1])
+    return kept
+
+
+def get_progress_series(
+    exercise_id: int,
+    user_id: int,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    max_points: int = MAX_POINTS,
+    downsample: Optional[str] = None
+) -> dict:
+    """
+    Progress of an exercise over time, bounded to ``max_points`` points.
+
+    By default sets are aggregated per day, week or month, whichever is the
+    finest giving at most ``max_points`` buckets over the range. With
+    ``downsample`` set to a metric name, daily points are reduced with LTTB
+    instead, preserving the shape of that metric. Archived history is
+    included when the range reaches it.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        user_id (int): ID of the user owning the sets
+        since (date, optional): First day of the range
+        until (date, optional): Last day of the range
+        max_points (int): Maximum number of points returned
+        downsample (str, optional): "top_weight", "volume" or "e1rm" to use
+            LTTB on daily points instead of coarser buckets
+
+    Returns:
+        dict: "bucket" used and "points", each with the date, top weight,
+            volume (weight x reps), best estimated 1RM and set count
+    """
+    if downsample is not None and downsample not in METRICS:
+        raise ValueError(f"Unknown metric: {downsample}")
+
+    params = {
+        "exercise_id": exercise_id,
+        "user_id": user_id,
+        "since": since,
+        "until": until,
+        "e1rm_max_reps": E1RM_MAX_REPS
+    }
+    manifest = get_archive_manifest(user_id)
+    boundary = archive_boundary(manifest)
+    archived = []
+    if boundary is not None and (since is None or since < boundary):
+        archived = [
+            set_report
+            for set_report in read_archived_set_reports(
+                user_id, exercise_id, since, manifest
+            )
+            if until is None or set_report["report_date"] <= until
+        ]
+
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_PROGRESS_RANGE, params)
+        first, last = cursor.fetchone()
+        dates = [day for day in (first, last) if day] + [
+            set_report["report_date"] for set_report in archived[:1] + archived[-1:]
+        ]
+        if not dates:
+            return {"bucket": "day", "points": []}
+
+        bucket = "day"
+        if downsample is None:
+            bucket = choose_bucket(since or min(dates), until or max(dates), max_points)
+        cursor.execute(GET_PROGRESS_SERIES, dict(params, bucket=bucket))
+        points = _archived_points(archived, bucket)
+        for row in cursor.fetchall():
+            point = {
+                "date": row[0],
+                "top_weight": row[1],
+                "volume": row[2] or 0,
+                "e1rm": float(row[3]) if row[3] is not None else None,
+                "sets": row[4]
+            }
+            # A week or month may straddle the archive boundary.
+            points[row[0]] = _merge_points(points.get(row[0]), point)
+
+    series = sorted(points.values(), key=lambda point: point["date"])
+    if downsample is not None:
+        series = lttb(series, downsample, max_points)
+    return {"bucket": bucket, "points": series}
+
+
+def record_training_day(cursor, user_id: int, day):
+    """
+    Update a user's streak record for a newly logged training day.
+
+    Meant to run in the transaction that stored the report. Days after the
+    last one logged extend or restart the current streak in place; a day
+    already inside it changes nothing; older days, which may join or merge
+    past streaks, rebuild the record from the report history.
+
+    Args:
+        cursor: Cursor of the transaction that stored the report
+        user_id (int): ID of the user owning the report
+        day (date): Date of the report
+    """
+    params = {"user_id": user_id, "day": day}
+    cursor.execute(ADVANCE_USER_STREAK, params)
+    if cursor.fetchone() is None:
+        cursor.execute(RECOMPUTE_USER_STREAK, params)
+
+
+def recompute_user_streak(cursor, user_id: int):
+    """
+    Rebuild a user's streak record from the report history.
+
+    Needed after reports are deleted, as removing a day can split a streak.
+
+    Args:
+        cursor: Cursor of the transaction that deleted the reports
+        user_id (int): ID of the user
+    """
+    cursor.execute(RECOMPUTE_USER_STREAK, {"user_id": user_id, "day": None})
+    if cursor.fetchone() is None:
+        cursor.execute(DELETE_USER_STREAK, (user_id,))
+
+
+def _streak(row: Optional[tuple], today: date) -> dict:
+    current_start, last_date, current_length, longest_length = row or (None,) * 4
+    # A streak is still current until a full day passes without training.
+    if last_date is None or last_date < today - timedelta(days=1):
+        current_start, current_length = None, 0
+    return {
+        "current_streak": current_length,
+        "current_streak_start": current_start,
+        "longest_streak": longest_length or 0,
+        "last_training_day": last_date
+    }
+
+
+def get_user_streak(user_id: int) -> dict:
+    """
+    Current and longest run of consecutive training days of a user.
+
+    Args:
+        user_id (int): ID of the user
+
+    Returns:
+        dict: "current_streak" and "longest_streak" in days, the day the
+            current streak started and the last training day
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_USER_STREAK, (user_id,))
+        row = cursor.fetchone()
+    return _streak(row, date.today())
+
+
+def get_training_calendar(
+    user_id: int,
+    since: Optional[date] = None,
+    until: Optional[date] = None
+) -> dict:
+    """
+    Training calendar of a user across all of their plans.
+
+    Args:
+        user_id (int): ID of the user
+        since (date, optional): First day, defaults to a year before ``until``
+        until (date, optional): Last day, defaults to today
+
+    Returns:
+        dict: "days" with the number of workouts of each training day,
+            "weeks" with the number of training days of each week (starting
+            on Monday), "weekly_frequency" as the average training days per
+            week over the range, and the streaks as in get_user_streak
+    """
+    today = date.today()
+    until = until or today
+    since = since or until - timedelta(days=364)
+
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            GET_TRAINING_CALENDAR,
+            {"user_id": user_id, "since": since, "until": until}
+        )
+        days, weeks, *streak = cursor.fetchone()
+
+    days = [
+        {"date": date.fromisoformat(day["date"]), "workouts": day["workouts"]}
+        for day in days
+    ]
+    weeks = [
+        {
+            "week": date.fromisoformat(week["week"]),
+            "training_days": week["training_days"]
+        }
+        for week in weeks
+    ]
+    week_count = max(((until - since).days + 1) / 7, 1)
+    return {
+        "since": since,
+        "until": until,
+        "days": days,
+        "weeks": weeks,
+        "weekly_frequency": round(len(days) / week_count, 2),
+        **_streak(tuple(streak) if streak[0] else None, today)
+    }
@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Hashable, Optional
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after a fixed time.
+
+    Absent records can be cached as well (negative caching) by storing
+    ``None``; they use their own, usually shorter, time to live.
+
+    Every invalidation bumps a generation counter, so ``get_or_load`` never
+    stores a value loaded before an invalidation that ran while loading.
+
+    Args:
+        max_size (int): Maximum number of entries kept
+        ttl (float): Seconds a present value stays valid
+        negative_ttl (float): Seconds a cached ``None`` stays valid
+    """
+
+    def __init__(
+        self, max_size: int, ttl: float, negative_ttl: Optional[float] = None
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Look up a key.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value (possibly None), or ``MISSING``
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        Args:
+            key: Cache key
+            value: Value to store, None for a negative entry
+        """
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key: Hashable, value: Any):
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value or load and cache it.
+
+        The loaded value is not cached if the cache was invalidated while
+        the loader ran, since it may predate the change.
+
+        Args:
+            key: Cache key
+            loader (callable): Called without arguments on a miss
+
+        Returns:
+            The cached or freshly loaded value
+        """
+        with self._lock:
+            generation = self._generation
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            with self._lock:
+                if self._generation == generation:
+                    self._store(key, value)
+        return value
+
+    def invalidate(self, *keys: Hashable):
+        """Drop the given keys if present."""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every key for which the predicate is true."""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Report usage counters.
+
+        Returns:
+            dict: Entry count, hits, negative hits, misses, evictions and
+            the overall hit rate
+        """
+        with self._lock:
+            found = self.hits + self.negative_hits
+            lookups = found + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": found / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,81 @@
+"""
+Background threads invalidating per-process caches on Postgres notifications.
+
+Writers send ``pg_notify`` inside their transaction, so every worker process
+hears about the change only once it is committed. A listener keeps its own
+autocommit connection; notifications sent while it is reconnecting are
+lost, so ``on_connect`` runs every time it starts listening and should drop
+whatever was cached until then.
+"""
+
+import logging
+import select
+import threading
+from typing import Callable
+
+import psycopg2
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 5.0
+RECONNECT_DELAY = 1.0
+
+
+class NotificationListener(threading.Thread):
+    """
+    Background thread handling the notifications of one channel on one
+    database.
+
+    Args:
+        name (str): Name of the thread
+        settings (dict): Connection parameters of the database
+        listen_sql (str): LISTEN statement of the channel
+        on_payload (callable): Called with the payload of every notification
+        on_connect (callable): Called without arguments each time listening
+            starts
+    """
+
+    def __init__(
+        self,
+        name: str,
+        settings: dict,
+        listen_sql: str,
+        on_payload: Callable[[str], None],
+        on_connect: Callable[[], None],
+    ):
+        super().__init__(name=name, daemon=True)
+        self.settings = settings
+        self.listen_sql = listen_sql
+        self.on_payload = on_payload
+        self.on_connect = on_connect
+        self.connected = threading.Event()
+        self.stopping = threading.Event()
+
+    def _listen(self):
+        connection = psycopg2.connect(**self.settings)
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(self.listen_sql)
+            # Anything cached before this point may have missed a change.
+            self.on_connect()
+            self.connected.set()
+
+            while not self.stopping.is_set():
+                ready, _, _ = select.select([connection], [], [], POLL_TIMEOUT)
+                if not ready:
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    self.on_payload(connection.notifies.pop(0).payload)
+        finally:
+            self.connected.clear()
+            connection.close()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError):
+                logger.exception("Listener %s failed", self.name)
+                self.stopping.wait(RECONNECT_DELAY)
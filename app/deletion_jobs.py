@@ -0,0 +1,247 @@
+"""
+Background deletion of workout plans, workout reports and whole accounts.
+
+Dependent rows are removed in bounded batches, each in its own short
+transaction together with the job's progress, with a pause in between so
+other traffic is not starved of locks. Progress is stored in the
+``deletion_job`` table on the user's shard, so an interrupted job resumes
+from the stage it had reached. A job that keeps failing is marked as failed
+after ``MAX_ATTEMPTS`` runs and is no longer resumed.
+"""
+
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, List, Optional
+
+from fastapi import HTTPException
+
+from app.analytics_repo import recompute_user_streak
+from app.plan_cache import notify_plan_changed
+from app.report_archive import prune_user_archive, remove_user_archive
+from app.sharding import shard_router
+from app.utils import cursor_factory, shard_cursor_factory
+from sql.deletion_job_sql import *
+from sql.sync_sql import SKIP_TOMBSTONES
+from sql.user_sql import DELETE_USER
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5_000
+BATCH_PAUSE = 0.05
+MAX_ATTEMPTS = 5
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="deletion-job")
+
+
+def create_deletion_job(user_id: int, target_type: str, target_id: int) -> int:
+    """
+    Record a deletion job after checking the target belongs to the user.
+
+    Args:
+        user_id (int): ID of the user owning the target
+        target_type (str): "workout_plan", "workout_report" or "user"
+        target_id (int): ID of the row to delete (the user ID for "user")
+
+    Returns:
+        int: ID of the deletion job
+
+    Raises:
+        HTTPException: If the target does not exist or is not the user's
+    """
+    if target_type not in DELETION_STAGES:
+        raise ValueError(f"Unknown deletion target: {target_type}")
+
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            INSERT_DELETION_JOB,
+            {"user_id": user_id, "target_type": target_type, "target_id": target_id},
+        )
+        job = cursor.fetchone()
+        if job is None:
+            raise HTTPException(
+                HTTPStatus.NOT_FOUND, detail="Deletion target not found"
+            )
+        return job[0]
+
+
+def _erase_user_record(user_id: int):
+    # Imported here because user_repo schedules erasures through this module.
+    from app.user_repo import user_cache
+
+    with cursor_factory() as cursor:
+        cursor.execute(DELETE_USER, (user_id,))
+        user = cursor.fetchone()
+    if user:
+        user_cache.invalidate(("id", user[0]), ("email", user[1]))
+    remove_user_archive(user_id)
+
+
+def _run_batch(job_id: int, user_id: int, batch_size: int) -> str:
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(LOCK_DELETION_JOB, (job_id, user_id))
+        job = cursor.fetchone()
+        if job is None:
+            raise HTTPException(HTTPStatus.NOT_FOUND, detail="Deletion job not found")
+
+        target_type, target_id, stage, status = job
+        if status in (DONE, FAILED):
+            return status
+
+        stages = DELETION_STAGES[target_type]
+        deleted = 0
+        if target_type == "user":
+            # Nobody is left to sync the deletions of an erased account.
+            cursor.execute(SKIP_TOMBSTONES)
+        if stage < len(stages):
+            cursor.execute(
+                stages[stage],
+                {"target_id": target_id, "user_id": user_id, "batch_size": batch_size},
+            )
+            deleted = cursor.rowcount
+            if deleted < batch_size:
+                stage += 1
+
+        status = RUNNING if stage < len(stages) else DONE
+        erase_user = status == DONE and target_type == "user"
+        if erase_user:
+            # The job stays running until the shared user record is gone, so
+            # a failure there is retried rather than leaving the user behind.
+            status = RUNNING
+        if status == DONE and target_type == "workout_plan":
+            notify_plan_changed(cursor, user_id, target_id)
+        if status == DONE and target_type != "user":
+            recompute_user_streak(cursor, user_id)
+
+        cursor.execute(UPDATE_DELETION_JOB_PROGRESS, (stage, deleted, status, job_id))
+
+    if status == DONE and target_type != "user":
+        # Archived sets of the deleted plan or report, once it is committed.
+        prune_user_archive(user_id)
+    if not erase_user:
+        return status
+    # Only once the shard's data is committed.
+    _erase_user_record(user_id)
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(UPDATE_DELETION_JOB_PROGRESS, (stage, 0, DONE, job_id))
+    return DONE
+
+
+def run_deletion_job(
+    job_id: int,
+    user_id: int,
+    batch_size: int = BATCH_SIZE,
+    pause: float = BATCH_PAUSE,
+    on_progress: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Run a deletion job to completion, resuming from its recorded stage.
+
+    A failure is counted against the job before being raised; the job is
+    marked as failed once it has failed ``MAX_ATTEMPTS`` times.
+
+    Args:
+        job_id (int): ID of the deletion job
+        user_id (int): ID of the user owning the job
+        batch_size (int): Maximum rows deleted per transaction
+        pause (float): Seconds to sleep between batches
+        on_progress (callable, optional): Called with the job state after
+            every batch
+
+    Returns:
+        dict: Final state of the job
+    """
+    try:
+        while _run_batch(job_id, user_id, batch_size) == RUNNING:
+            if on_progress:
+                on_progress(get_deletion_job(job_id, user_id))
+            time.sleep(pause)
+    except Exception:
+        with cursor_factory(user_id) as cursor:
+            cursor.execute(RECORD_DELETION_JOB_FAILURE, (MAX_ATTEMPTS, job_id, user_id))
+        raise
+    return get_deletion_job(job_id, user_id)
+
+
+def _log_failure(job_id: int, user_id: int, future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            "Deletion job %d of user %d failed",
+            job_id,
+            user_id,
+            exc_info=future.exception(),
+        )
+
+
+def submit_deletion_job(job_id: int, user_id: int) -> Future:
+    """
+    Run a deletion job on the background executor.
+
+    Args:
+        job_id (int): ID of the deletion job
+        user_id (int): ID of the user owning the job
+
+    Returns:
+        Future: Resolves to the final state of the job; failures are also
+            logged
+    """
+    future = _executor.submit(run_deletion_job, job_id, user_id)
+    future.add_done_callback(lambda done: _log_failure(job_id, user_id, done))
+    return future
+
+
+def get_deletion_job(job_id: int, user_id: int) -> dict:
+    """
+    Report the progress of a deletion job.
+
+    Args:
+        job_id (int): ID of the deletion job
+        user_id (int): ID of the user owning the job
+
+    Returns:
+        dict: Job information, including completed and total stages
+
+    Raises:
+        HTTPException: If the job is not found
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_DELETION_JOB, (job_id, user_id))
+        job = cursor.fetchone()
+        if not job:
+            raise HTTPException(HTTPStatus.NOT_FOUND, detail="Deletion job not found")
+        return {
+            "deletion_job_id": job[0],
+            "user_id": job[1],
+            "target_type": job[2],
+            "target_id": job[3],
+            "stage": job[4],
+            "stages": len(DELETION_STAGES[job[2]]),
+            "rows_deleted": job[5],
+            "status": job[6],
+            "attempts": job[7],
+            "created_at": job[8],
+            "updated_at": job[9],
+        }
+
+
+def resume_deletion_jobs() -> List[Future]:
+    """
+    Resubmit every unfinished deletion job found on any shard.
+
+    Meant to be called on startup, after a crash or restart.
+
+    Returns:
+        List[Future]: One future per resubmitted job
+    """
+    futures = []
+    for shard_name in shard_router.shards:
+        with shard_cursor_factory(shard_name) as cursor:
+            cursor.execute(GET_UNFINISHED_DELETION_JOBS)
+            jobs = cursor.fetchall()
+        futures.extend(submit_deletion_job(job_id, user_id) for job_id, user_id in jobs)
+    return futures
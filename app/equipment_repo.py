@@ -1,6 +1,6 @@
 from sql.equipment_sql import *
 from psycopg2 import IntegrityError
-from app.utils import cursor_factory
+from app.utils import cursor_factory, search_catalog
 from fastapi import HTTPException
 from http.client import CONFLICT, INTERNAL_SERVER_ERROR, NOT_FOUND
 
@@ -15,7 +15,7 @@ def create_equipment(equipment_data: dict):
     Returns:
         int: The ID of the created equipment.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(equipment_data["user_id"]) as cursor:
         try:
             cursor.execute(
                 INSERT_EQUIPMENT,
@@ -48,7 +48,7 @@ def update_equipment(equipment_id: int, user_id: int, updates: dict):
     Returns:
         int: The ID of the updated equipment.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(
                 UPDATE_EQUIPMENT,
@@ -83,7 +83,7 @@ def get_equipment_by_id(equipment_id: int, user_id: int):
     Returns:
         dict: A dictionary containing equipment information if found, None otherwise.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_EQUIPMENT_BY_ID, (equipment_id, user_id))
         equipment = cursor.fetchone()
         if equipment:
@@ -108,7 +108,7 @@ def get_equipment_by_name(equipment_name: str, user_id: int):
     Returns:
         dict: A dictionary containing equipment information if found, None otherwise.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_EQUIPMENT_BY_NAME, (equipment_name, user_id))
         equipment = cursor.fetchone()
         if equipment:
@@ -122,6 +122,62 @@ def get_equipment_by_name(equipment_name: str, user_id: int):
         raise HTTPException(NOT_FOUND, detail="Equipment not found")
 
 
+def get_equipment_by_ids(equipment_ids: list, user_id: int) -> dict:
+    """
+    Retrieve several pieces of equipment by their IDs in a single query.
+
+    Args:
+        equipment_ids (list): The IDs of the equipment to retrieve.
+        user_id (int): The ID of the user who owns the equipment.
+
+    Returns:
+        dict: Equipment information keyed by equipment ID. IDs that were
+        not found are left out.
+    """
+    if not equipment_ids:
+        return {}
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_EQUIPMENT_BY_IDS, (list(equipment_ids), user_id))
+        return {
+            row[0]: {
+                "equipment_id": row[0],
+                "user_id": row[1],
+                "group_name": row[2],
+                "equipment_name": row[3],
+                "active": row[4],
+            }
+            for row in cursor.fetchall()
+        }
+
+
+def get_equipment_by_names(equipment_names: list, user_id: int) -> dict:
+    """
+    Retrieve several pieces of equipment by their names in a single query.
+
+    Args:
+        equipment_names (list): The names of the equipment to retrieve.
+        user_id (int): The ID of the user who owns the equipment.
+
+    Returns:
+        dict: Equipment information keyed by equipment name. Names that
+        were not found are left out.
+    """
+    if not equipment_names:
+        return {}
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_EQUIPMENT_BY_NAMES, (list(equipment_names), user_id))
+        return {
+            row[3]: {
+                "equipment_id": row[0],
+                "user_id": row[1],
+                "group_name": row[2],
+                "equipment_name": row[3],
+                "active": row[4],
+            }
+            for row in cursor.fetchall()
+        }
+
+
 def get_all_equipment_by_user(user_id: int, limit: int = 50, offset: int = 0):
     """
     Retrieve all equipment for a specific user.
@@ -132,7 +188,7 @@ def get_all_equipment_by_user(user_id: int, limit: int = 50, offset: int = 0):
     Returns:
         list: A list of dictionaries containing equipment information.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_ALL_EQUIPMENT_BY_USER, (user_id, limit, offset))
         equipment_list = cursor.fetchall()
         if not equipment_list:
@@ -160,9 +216,40 @@ def delete_equipment(equipment_id: int, user_id: int):
     Returns:
         int: The ID of the deleted equipment.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(DELETE_EQUIPMENT, (equipment_id, user_id))
         deleted_id = cursor.fetchone()[0]
         if not deleted_id:
             raise HTTPException(NOT_FOUND, detail="Equipment not found")
         return deleted_id
+
+
+def search_equipment(query: str, user_id: int, limit: int = 10):
+    """
+    Search default and user equipment by name.
+
+    Matching ignores case and accents, ranks prefix matches first and
+    tolerates typos.
+
+    Args:
+        query (str): Text typed by the user.
+        user_id (int): The ID of the user searching.
+        limit (int): Maximum number of results.
+
+    Returns:
+        list: The best matching equipment with their similarity score.
+    """
+    rows = search_catalog(
+        SEARCH_DEFAULT_EQUIPMENT, SEARCH_USER_EQUIPMENT, query, user_id, limit
+    )
+    return [
+        {
+            "equipment_id": eq[0],
+            "user_id": eq[1],
+            "group_name": eq[2],
+            "equipment_name": eq[3],
+            "active": eq[4],
+            "score": eq[6],
+        }
+        for eq in rows
+    ]
@@ -0,0 +1,290 @@
+"""
+In-memory inverted index of exercises by muscle, muscle group and equipment.
+
+Each catalog (the defaults and every user's own exercises) becomes a
+segment: exercises get a position, and every muscle, group and equipment
+maps to an integer used as a bitset of the positions of the exercises bound
+to it. Filters are then a handful of bitwise operations.
+
+Segments are built lazily from the database. The exercise repo calls
+``notify_exercise_index_changed`` in every transaction writing an exercise
+or its bindings, and drops the segment in its own process once committed;
+the listeners started by ``start_exercise_index_listeners`` drop it in
+every other worker process. ``INDEX_TTL`` only bounds staleness when a
+process runs no listener or one misses a notification.
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from app.cache import MISSING, TTLCache
+from app.cache_listener import POLL_TIMEOUT, NotificationListener
+from app.sharding import shard_router
+from app.utils import cursor_factory
+from sql.exercise_index_sql import *
+
+INDEX_TTL = 300
+
+_user_segments = TTLCache(max_size=10_000, ttl=INDEX_TTL)
+_default_segment = TTLCache(max_size=1, ttl=INDEX_TTL)
+_generation = 0
+_generation_lock = threading.Lock()
+_listeners: Dict[str, NotificationListener] = {}
+_listeners_lock = threading.Lock()
+
+
+class IndexSegment:
+    """
+    Bitset index over one catalog of exercises.
+
+    Args:
+        rows (list): Rows of ``GET_*_INDEX_EXERCISES``
+    """
+
+    def __init__(self, rows: list):
+        self.exercises: List[dict] = []
+        # (muscle IDs, muscle groups, equipment IDs) of each exercise.
+        self.features: List[tuple] = []
+        self.by_muscle: Dict[int, int] = {}
+        self.by_group: Dict[str, int] = {}
+        self.by_equipment: Dict[int, int] = {}
+        for position, row in enumerate(rows):
+            bit = 1 << position
+            self.exercises.append(
+                {
+                    "exercise_id": row[0],
+                    "user_id": row[1],
+                    "exercise_name": row[2],
+                    "description": row[3],
+                }
+            )
+            self.features.append((row[4], row[5], row[6]))
+            for facet, keys in (
+                (self.by_muscle, row[4]),
+                (self.by_group, row[5]),
+                (self.by_equipment, row[6]),
+            ):
+                for key in keys:
+                    facet[key] = facet.get(key, 0) | bit
+        self.all = (1 << len(rows)) - 1
+
+    def _all_of(self, facet: dict, keys: Iterable) -> int:
+        mask = self.all
+        for key in keys:
+            mask &= facet.get(key, 0)
+        return mask
+
+    def _any_of(self, facet: dict, keys: Iterable) -> int:
+        mask = 0
+        for key in keys:
+            mask |= facet.get(key, 0)
+        return mask
+
+    def match(
+        self,
+        muscles_all: Iterable[int] = (),
+        muscles_any: Iterable[int] = (),
+        groups_all: Iterable[str] = (),
+        groups_any: Iterable[str] = (),
+        equipment_all: Iterable[int] = (),
+        equipment_any: Iterable[int] = (),
+        available_equipment: Optional[Iterable[int]] = None,
+    ) -> int:
+        """
+        Bitset of the exercises matching every given facet.
+
+        ``*_all`` facets require every listed key, ``*_any`` facets at least
+        one; empty facets are ignored. With ``available_equipment``, only
+        exercises needing nothing outside it (including bodyweight ones)
+        match.
+        """
+        mask = self.all
+        mask &= self._all_of(self.by_muscle, muscles_all)
+        mask &= self._all_of(self.by_group, groups_all)
+        mask &= self._all_of(self.by_equipment, equipment_all)
+        for facet, keys in (
+            (self.by_muscle, muscles_any),
+            (self.by_group, groups_any),
+            (self.by_equipment, equipment_any),
+        ):
+            keys = list(keys)
+            if keys:
+                mask &= self._any_of(facet, keys)
+        if available_equipment is not None:
+            available = set(available_equipment)
+            missing = self._any_of(
+                self.by_equipment,
+                (key for key in self.by_equipment if key not in available),
+            )
+            mask &= ~missing
+        return mask
+
+    def exercises_in(self, mask: int) -> List[dict]:
+        """Exercises whose positions are set in ``mask``."""
+        found = []
+        while mask:
+            lowest = mask & -mask
+            found.append(self.exercises[lowest.bit_length() - 1])
+            mask ^= lowest
+        return found
+
+
+def _load_segment(cache: TTLCache, key, query: str, params: tuple, owner):
+    segment = cache.get(key)
+    if segment is MISSING:
+        generation = _generation
+        with cursor_factory(owner) as cursor:
+            cursor.execute(query, params)
+            segment = IndexSegment(cursor.fetchall())
+        # Skip caching if the catalog changed while it was being read.
+        if generation == _generation:
+            cache.set(key, segment)
+    return segment
+
+
+def get_default_segment() -> IndexSegment:
+    """Index segment of the default catalog."""
+    return _load_segment(
+        _default_segment, None, GET_DEFAULT_INDEX_EXERCISES, (), None
+    )
+
+
+def get_user_segment(user_id: int) -> IndexSegment:
+    """
+    Index segment of a user's own exercises.
+
+    A new segment object is returned after every invalidation, so callers
+    deriving data from a segment can detect changes by identity.
+    """
+    return _load_segment(
+        _user_segments, user_id, GET_USER_INDEX_EXERCISES, (user_id,), user_id
+    )
+
+
+def invalidate_exercise_index(user_id: Optional[int] = None):
+    """
+    Drop the index segment of a user, or the default one.
+
+    Call after the change is committed.
+
+    Args:
+        user_id (int, optional): Owner of the changed exercise, None for the
+            default catalog
+    """
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    if user_id is None:
+        _default_segment.clear()
+    else:
+        _user_segments.invalidate(user_id)
+
+
+def notify_exercise_index_changed(cursor, user_id: Optional[int] = None):
+    """
+    Drop the index segment of a user in every other process once the
+    transaction commits.
+
+    Args:
+        cursor: Cursor of the transaction changing the exercise
+        user_id (int, optional): Owner of the changed exercise, None for the
+            default catalog
+    """
+    payload = "" if user_id is None else str(user_id)
+    cursor.execute(NOTIFY_EXERCISE_INDEX_CHANGED, (payload,))
+
+
+def _handle_payload(payload: str):
+    invalidate_exercise_index(int(payload) if payload else None)
+
+
+def _clear_on_connect():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+    _default_segment.clear()
+    _user_segments.clear()
+
+
+def start_exercise_index_listeners():
+    """
+    Start one listener per database in this process, if not already running.
+
+    The default catalog lives in the shared database and users' exercises in
+    their shards. Should be called in every worker process, for instance on
+    application startup.
+    """
+    databases = {"shared": shard_router.shared}
+    for shard_name, settings in shard_router.shards.items():
+        if settings not in databases.values():
+            databases[shard_name] = settings
+    with _listeners_lock:
+        for name, settings in databases.items():
+            listener = _listeners.get(name)
+            if listener is None or not listener.is_alive():
+                listener = NotificationListener(
+                    f"exercise-index-{name}",
+                    settings,
+                    LISTEN_EXERCISE_INDEX_CHANGED,
+                    _handle_payload,
+                    _clear_on_connect,
+                )
+                listener.start()
+                _listeners[name] = listener
+
+
+def stop_exercise_index_listeners(timeout: float = POLL_TIMEOUT):
+    """Stop the listeners of this process and drop every segment."""
+    with _listeners_lock:
+        for listener in _listeners.values():
+            listener.stopping.set()
+        for listener in _listeners.values():
+            listener.join(timeout)
+        _listeners.clear()
+    _clear_on_connect()
+
+
+def find_exercises(
+    user_id: int,
+    muscles_all: Iterable[int] = (),
+    muscles_any: Iterable[int] = (),
+    groups_all: Iterable[str] = (),
+    groups_any: Iterable[str] = (),
+    equipment_all: Iterable[int] = (),
+    equipment_any: Iterable[int] = (),
+    available_equipment: Optional[Iterable[int]] = None,
+) -> List[dict]:
+    """
+    Find default and user exercises by muscles, muscle groups and equipment.
+
+    Args:
+        user_id (int): ID of the user
+        muscles_all (iterable): Muscle IDs the exercise must all target
+        muscles_any (iterable): Muscle IDs of which it must target one
+        groups_all (iterable): Muscle groups it must all target
+        groups_any (iterable): Muscle groups of which it must target one
+        equipment_all (iterable): Equipment IDs it must all use
+        equipment_any (iterable): Equipment IDs of which it must use one
+        available_equipment (iterable, optional): Equipment the user has;
+            exercises needing anything else are left out
+
+    Returns:
+        list: Matching active exercises, defaults first, by exercise ID
+    """
+    filters = {
+        "muscles_all": list(muscles_all),
+        "muscles_any": list(muscles_any),
+        "groups_all": list(groups_all),
+        "groups_any": list(groups_any),
+        "equipment_all": list(equipment_all),
+        "equipment_any": list(equipment_any),
+        "available_equipment": (
+            None if available_equipment is None else list(available_equipment)
+        ),
+    }
+    segments = (get_default_segment(), get_user_segment(user_id))
+    return [
+        exercise
+        for segment in segments
+        for exercise in segment.exercises_in(segment.match(**filters))
+    ]
@@ -1,7 +1,14 @@
 from sql.exercise_sql import *
 from psycopg2 import IntegrityError
-from app.utils import cursor_factory
+from app.exercise_index import (
+    find_exercises,
+    invalidate_exercise_index,
+    notify_exercise_index_changed,
+)
+from app.plan_cache import notify_plan_changed
+from app.utils import cursor_factory, search_catalog
 from fastapi import HTTPException
+from typing import Optional
 from http.client import CONFLICT, INTERNAL_SERVER_ERROR, NOT_FOUND
 
 
@@ -18,7 +25,7 @@ def create_exercise(exercise_data: dict) -> int:
     Raises:
         HTTPException: If creation fails or exercise already exists
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(exercise_data["user_id"]) as cursor:
         try:
             cursor.execute(
                 INSERT_EXERCISE,
@@ -34,9 +41,55 @@ def create_exercise(exercise_data: dict) -> int:
                 raise HTTPException(
                     INTERNAL_SERVER_ERROR, detail="Failed to create exercise"
                 )
-            return exercise_id
         except IntegrityError as e:
             raise HTTPException(CONFLICT, detail="Exercise already exists") from e
+        notify_exercise_index_changed(cursor, exercise_data["user_id"])
+    invalidate_exercise_index(exercise_data["user_id"])
+    return exercise_id
+
+
+def create_exercise_with_bindings(
+    exercise_data: dict,
+    muscle_ids: list,
+    equipment_ids: list,
+) -> int:
+    """
+    Create an exercise together with its muscles and equipment in one transaction.
+
+    Args:
+        exercise_data (dict): Dictionary containing exercise information
+        muscle_ids (list): IDs of the muscles the exercise targets
+        equipment_ids (list): IDs of the equipment the exercise uses
+
+    Returns:
+        int: ID of the created exercise
+
+    Raises:
+        HTTPException: If the exercise already exists or a muscle or equipment
+            does not exist; nothing is written in that case
+    """
+    with cursor_factory(exercise_data["user_id"]) as cursor:
+        try:
+            cursor.execute(
+                INSERT_EXERCISE,
+                (
+                    exercise_data["user_id"],
+                    exercise_data["exercise_name"],
+                    exercise_data["description"],
+                    exercise_data["active"],
+                ),
+            )
+        except IntegrityError as e:
+            raise HTTPException(CONFLICT, detail="Exercise already exists") from e
+
+        exercise_id = cursor.fetchone()[0]
+        if muscle_ids:
+            _bind_muscles(cursor, exercise_id, muscle_ids)
+        if equipment_ids:
+            _bind_equipment(cursor, exercise_id, equipment_ids)
+        notify_exercise_index_changed(cursor, exercise_data["user_id"])
+    invalidate_exercise_index(exercise_data["user_id"])
+    return exercise_id
 
 
 def update_exercise(exercise_id: int, user_id: int, updates: dict) -> int:
@@ -54,7 +107,7 @@ def update_exercise(exercise_id: int, user_id: int, updates: dict) -> int:
     Raises:
         HTTPException: If update fails or exercise not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(
                 UPDATE_EXERCISE,
@@ -69,11 +122,15 @@ def update_exercise(exercise_id: int, user_id: int, updates: dict) -> int:
             updated_id = cursor.fetchone()[0]
             if not updated_id:
                 raise HTTPException(NOT_FOUND, detail="Exercise not found")
-            return updated_id
+            # Plan trees embed exercise names and descriptions.
+            notify_plan_changed(cursor, user_id)
         except IntegrityError as e:
             raise HTTPException(
                 CONFLICT, detail="Exercise update conflicts with existing data"
             ) from e
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return updated_id
 
 
 def get_default_exercises() -> list:
@@ -112,7 +169,7 @@ def get_exercise_by_id(exercise_id: int, user_id: int) -> dict:
     Raises:
         HTTPException: If exercise not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_EXERCISE_BY_ID, (exercise_id, user_id))
         exercise = cursor.fetchone()
         if not exercise:
@@ -140,7 +197,7 @@ def get_exercise_by_name(exercise_name: str, user_id: int) -> dict:
     Raises:
         HTTPException: If exercise not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_EXERCISE_BY_NAME, (exercise_name, user_id))
         exercise = cursor.fetchone()
         if not exercise:
@@ -154,6 +211,62 @@ def get_exercise_by_name(exercise_name: str, user_id: int) -> dict:
         }
 
 
+def get_exercises_by_ids(exercise_ids: list, user_id: int) -> dict:
+    """
+    Get several exercises by their IDs in a single query.
+
+    Args:
+        exercise_ids (list): IDs of the exercises to retrieve
+        user_id (int): ID of the user who owns the exercises
+
+    Returns:
+        dict: Exercise information keyed by exercise ID. IDs that were
+        not found are left out
+    """
+    if not exercise_ids:
+        return {}
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_EXERCISES_BY_IDS, (list(exercise_ids), user_id))
+        return {
+            row[0]: {
+                "exercise_id": row[0],
+                "user_id": row[1],
+                "exercise_name": row[2],
+                "description": row[3],
+                "active": row[4],
+            }
+            for row in cursor.fetchall()
+        }
+
+
+def get_exercises_by_names(exercise_names: list, user_id: int) -> dict:
+    """
+    Get several exercises by their names in a single query.
+
+    Args:
+        exercise_names (list): Names of the exercises to retrieve
+        user_id (int): ID of the user who owns the exercises
+
+    Returns:
+        dict: Exercise information keyed by exercise name. Names that
+        were not found are left out
+    """
+    if not exercise_names:
+        return {}
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_EXERCISES_BY_NAMES, (list(exercise_names), user_id))
+        return {
+            row[2]: {
+                "exercise_id": row[0],
+                "user_id": row[1],
+                "exercise_name": row[2],
+                "description": row[3],
+                "active": row[4],
+            }
+            for row in cursor.fetchall()
+        }
+
+
 def get_all_exercises_by_user(user_id: int, limit: int = 50, offset: int = 0) -> list:
     """
     Get all exercises for a specific user.
@@ -166,7 +279,7 @@ def get_all_exercises_by_user(user_id: int, limit: int = 50, offset: int = 0) ->
     Returns:
         list: List of dictionaries containing exercise information
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_ALL_EXERCISES_BY_USER, (user_id, limit, offset))
         exercises = cursor.fetchall()
         return [
@@ -181,13 +294,18 @@ def get_all_exercises_by_user(user_id: int, limit: int = 50, offset: int = 0) ->
         ]
 
 
-def bind_muscle_to_exercise(exercise_id: int, muscle_id: int) -> int:
+def bind_muscle_to_exercise(
+    exercise_id: int,
+    muscle_id: int,
+    user_id: int,
+) -> int:
     """
     Associate a muscle with an exercise.
 
     Args:
         exercise_id (int): ID of the exercise
         muscle_id (int): ID of the muscle to bind
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         int: ID of the exercise the muscle was bound to
@@ -195,23 +313,31 @@ def bind_muscle_to_exercise(exercise_id: int, muscle_id: int) -> int:
     Raises:
         HTTPException: If binding fails or already exists
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(BIND_MUSCLE_TO_EXERCISE, (muscle_id, exercise_id))
-            return cursor.fetchone()[0]
+            bound_id = cursor.fetchone()[0]
         except IntegrityError as e:
             raise HTTPException(
                 CONFLICT, detail="Muscle already bound to exercise"
             ) from e
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return bound_id
 
 
-def bind_equipment_to_exercise(exercise_id: int, equipment_id: int) -> int:
+def bind_equipment_to_exercise(
+    exercise_id: int,
+    equipment_id: int,
+    user_id: int,
+) -> int:
     """
     Associate equipment with an exercise.
 
     Args:
         exercise_id (int): ID of the exercise
         equipment_id (int): ID of the equipment to bind
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         int: ID of the exercise the equipment was bound to
@@ -219,27 +345,258 @@ def bind_equipment_to_exercise(exercise_id: int, equipment_id: int) -> int:
     Raises:
         HTTPException: If binding fails or already exists
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(BIND_EQUIPMENT_TO_EXERCISE, (equipment_id, exercise_id))
-            return cursor.fetchone()[0]
+            bound_id = cursor.fetchone()[0]
         except IntegrityError as e:
             raise HTTPException(
                 CONFLICT, detail="Equipment already bound to exercise"
             ) from e
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return bound_id
+
+
+def _bind_muscles(cursor, exercise_id: int, muscle_ids: list) -> list:
+    try:
+        cursor.execute(BIND_MUSCLES_TO_EXERCISE, (exercise_id, list(muscle_ids)))
+        return [row[0] for row in cursor.fetchall()]
+    except IntegrityError as e:
+        raise HTTPException(NOT_FOUND, detail="Exercise or muscle not found") from e
+
+
+def _bind_equipment(cursor, exercise_id: int, equipment_ids: list) -> list:
+    try:
+        cursor.execute(
+            BIND_EQUIPMENT_LIST_TO_EXERCISE, (exercise_id, list(equipment_ids))
+        )
+        return [row[0] for row in cursor.fetchall()]
+    except IntegrityError as e:
+        raise HTTPException(
+            NOT_FOUND, detail="Exercise or equipment not found"
+        ) from e
+
+
+def bind_muscles_to_exercise(
+    exercise_id: int,
+    muscle_ids: list,
+    user_id: int,
+) -> list:
+    """
+    Associate several muscles with an exercise in a single statement.
+
+    Muscles already bound to the exercise are left untouched.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        muscle_ids (list): IDs of the muscles to bind
+        user_id (int): ID of the owning user, used to select its shard
+
+    Returns:
+        list: IDs of the muscles that were newly bound
+
+    Raises:
+        HTTPException: If the exercise or one of the muscles does not exist
+    """
+    if not muscle_ids:
+        return []
+    with cursor_factory(user_id) as cursor:
+        bound = _bind_muscles(cursor, exercise_id, muscle_ids)
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return bound
+
+
+def unbind_muscles_from_exercise(
+    exercise_id: int,
+    muscle_ids: list,
+    user_id: int,
+) -> list:
+    """
+    Remove the association between an exercise and several muscles.
+
+    Only the user's own exercises are changed.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        muscle_ids (list): IDs of the muscles to unbind
+        user_id (int): ID of the owning user, used to select its shard
+
+    Returns:
+        list: IDs of the muscles that were unbound
+    """
+    if not muscle_ids:
+        return []
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            UNBIND_MUSCLES_FROM_EXERCISE, (exercise_id, user_id, list(muscle_ids))
+        )
+        unbound = [row[0] for row in cursor.fetchall()]
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return unbound
+
+
+def replace_exercise_muscles(
+    exercise_id: int,
+    muscle_ids: list,
+    user_id: int,
+) -> dict:
+    """
+    Make the given muscles the exact set bound to an exercise.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        muscle_ids (list): IDs of every muscle the exercise should target
+        user_id (int): ID of the owning user, used to select its shard
+
+    Returns:
+        dict: IDs of the muscles that were "added" and "removed"
+
+    Raises:
+        HTTPException: If the exercise does not exist or is not the user's,
+            or if one of the muscles does not exist
+    """
+    with cursor_factory(user_id) as cursor:
+        try:
+            cursor.execute(
+                REPLACE_EXERCISE_MUSCLES,
+                {
+                    "exercise_id": exercise_id,
+                    "user_id": user_id,
+                    "muscle_ids": list(muscle_ids),
+                },
+            )
+        except IntegrityError as e:
+            raise HTTPException(
+                NOT_FOUND, detail="Exercise or muscle not found"
+            ) from e
+        added, removed, owned = cursor.fetchone()
+        if not owned:
+            raise HTTPException(NOT_FOUND, detail="Exercise or muscle not found")
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return {"added": added, "removed": removed}
+
+
+def bind_equipment_list_to_exercise(
+    exercise_id: int,
+    equipment_ids: list,
+    user_id: int,
+) -> list:
+    """
+    Associate several pieces of equipment with an exercise in a single statement.
+
+    Equipment already bound to the exercise is left untouched.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        equipment_ids (list): IDs of the equipment to bind
+        user_id (int): ID of the owning user, used to select its shard
+
+    Returns:
+        list: IDs of the equipment that was newly bound
 
+    Raises:
+        HTTPException: If the exercise or one of the equipment does not exist
+    """
+    if not equipment_ids:
+        return []
+    with cursor_factory(user_id) as cursor:
+        bound = _bind_equipment(cursor, exercise_id, equipment_ids)
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return bound
+
+
+def unbind_equipment_list_from_exercise(
+    exercise_id: int,
+    equipment_ids: list,
+    user_id: int,
+) -> list:
+    """
+    Remove the association between an exercise and several pieces of equipment.
+
+    Only the user's own exercises are changed.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        equipment_ids (list): IDs of the equipment to unbind
+        user_id (int): ID of the owning user, used to select its shard
 
-def get_exercise_muscles(exercise_id: int) -> list:
+    Returns:
+        list: IDs of the equipment that was unbound
+    """
+    if not equipment_ids:
+        return []
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            UNBIND_EQUIPMENT_LIST_FROM_EXERCISE,
+            (exercise_id, user_id, list(equipment_ids)),
+        )
+        unbound = [row[0] for row in cursor.fetchall()]
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return unbound
+
+
+def replace_exercise_equipment(
+    exercise_id: int,
+    equipment_ids: list,
+    user_id: int,
+) -> dict:
+    """
+    Make the given equipment the exact set bound to an exercise.
+
+    Args:
+        exercise_id (int): ID of the exercise
+        equipment_ids (list): IDs of every piece of equipment the exercise uses
+        user_id (int): ID of the owning user, used to select its shard
+
+    Returns:
+        dict: IDs of the equipment that was "added" and "removed"
+
+    Raises:
+        HTTPException: If the exercise does not exist or is not the user's,
+            or if one of the equipment does not exist
+    """
+    with cursor_factory(user_id) as cursor:
+        try:
+            cursor.execute(
+                REPLACE_EXERCISE_EQUIPMENT,
+                {
+                    "exercise_id": exercise_id,
+                    "user_id": user_id,
+                    "equipment_ids": list(equipment_ids),
+                },
+            )
+        except IntegrityError as e:
+            raise HTTPException(
+                NOT_FOUND, detail="Exercise or equipment not found"
+            ) from e
+        added, removed, owned = cursor.fetchone()
+        if not owned:
+            raise HTTPException(
+                NOT_FOUND, detail="Exercise or equipment not found"
+            )
+        notify_exercise_index_changed(cursor, user_id)
+    invalidate_exercise_index(user_id)
+    return {"added": added, "removed": removed}
+
+
+def get_exercise_muscles(exercise_id: int, user_id: int) -> list:
     """
     Get all muscles associated with an exercise.
 
     Args:
         exercise_id (int): ID of the exercise
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         list: List of dictionaries containing muscle information
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_EXERCISE_MUSCLES, (exercise_id,))
         muscles = cursor.fetchall()
         return [
@@ -248,20 +605,133 @@ def get_exercise_muscles(exercise_id: int) -> list:
         ]
 
 
-def get_exercise_equipment(exercise_id: int) -> list:
+def get_exercise_equipment(exercise_id: int, user_id: int) -> list:
     """
     Get all equipment associated with an exercise.
 
     Args:
         exercise_id (int): ID of the exercise
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         list: List of dictionaries containing equipment information
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_EXERCISE_EQUIPMENT, (exercise_id,))
         equipment = cursor.fetchall()
         return [
             {"equipment_id": e[0], "equipment_name": e[1], "group_name": e[2]}
             for e in equipment
         ]
+
+
+def search_exercises(query: str, user_id: int, limit: int = 10) -> list:
+    """
+    Search default and user exercises by name.
+
+    Matching ignores case and accents, ranks prefix matches first and
+    tolerates typos.
+
+    Args:
+        query (str): Text typed by the user
+        user_id (int): ID of the user searching
+        limit (int): Maximum number of results
+
+    Returns:
+        list: Best matching exercises with their similarity score
+    """
+    rows = search_catalog(
+        SEARCH_DEFAULT_EXERCISES, SEARCH_USER_EXERCISES, query, user_id, limit
+    )
+    return [
+        {
+            "exercise_id": ex[0],
+            "user_id": ex[1],
+            "exercise_name": ex[2],
+            "description": ex[3],
+            "active": ex[4],
+            "score": ex[6],
+        }
+        for ex in rows
+    ]
+
+
+def filter_exercises(
+    user_id: int,
+    muscle_ids: Optional[list] = None,
+    muscle_groups: Optional[list] = None,
+    equipment_ids: Optional[list] = None,
+    available_equipment: Optional[list] = None,
+    match_all: bool = False,
+) -> list:
+    """
+    Find default and user exercises by muscle, muscle group and equipment.
+
+    Answered from the in-memory index in app.exercise_index.
+
+    Args:
+        user_id (int): ID of the user
+        muscle_ids (list, optional): Muscles the exercise should target
+        muscle_groups (list, optional): Muscle groups it should target
+        equipment_ids (list, optional): Equipment it should use
+        available_equipment (list, optional): Equipment the user has;
+            exercises needing anything else are left out
+        match_all (bool): Require every listed muscle, group and equipment
+            instead of at least one of each
+
+    Returns:
+        list: Matching active exercises
+    """
+    suffix = "all" if match_all else "any"
+    return find_exercises(
+        user_id,
+        available_equipment=available_equipment,
+        **{
+            f"muscles_{suffix}": muscle_ids or (),
+            f"groups_{suffix}": muscle_groups or (),
+            f"equipment_{suffix}": equipment_ids or (),
+        },
+    )
+
+
+def search_exercise_descriptions(
+    query: str, user_id: int, limit: int = 20, offset: int = 0
+) -> list:
+    """
+    Full-text search over the names and descriptions of default and user
+    exercises.
+
+    Args:
+        query (str): Text to search for, in web search syntax
+        user_id (int): ID of the user searching
+        limit (int): Maximum number of exercises to return
+        offset (int): Number of exercises to skip
+
+    Returns:
+        list: Matching exercises, best match first, with their "rank"
+    """
+    if not query.strip():
+        return []
+    # Defaults and user exercises live in different databases; each returns
+    # enough rows to fill the page and the results are merged by rank.
+    params = {"query": query, "user_id": user_id, "limit": limit + offset}
+    rows = []
+    for owner, sql in (
+        (None, SEARCH_DEFAULT_EXERCISE_DESCRIPTIONS),
+        (user_id, SEARCH_USER_EXERCISE_DESCRIPTIONS),
+    ):
+        with cursor_factory(owner) as cursor:
+            cursor.execute(sql, params)
+            rows.extend(cursor.fetchall())
+    rows.sort(key=lambda ex: (-ex[5], ex[2]))
+    return [
+        {
+            "exercise_id": ex[0],
+            "user_id": ex[1],
+            "exercise_name": ex[2],
+            "description": ex[3],
+            "active": ex[4],
+            "rank": ex[5],
+        }
+        for ex in rows[offset:offset + limit]
+    ]
@@ -0,0 +1,228 @@
+"""
+Exercise alternatives by muscle and equipment similarity.
+
+Every exercise is described by a weighted one-hot vector of the muscles,
+muscle groups and equipment bound to it, and compared by cosine similarity.
+The default catalog is shared by every user, so its top-k neighbours are
+precomputed once; a user's own exercises only add a small block compared
+against it, rebuilt when that user's catalog changes.
+
+Models are derived from the segments of app.exercise_index and rebuilt
+whenever the index hands out a new segment, i.e. after any exercise or
+binding change.
+"""
+
+import threading
+from typing import Iterable, List, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from http.client import NOT_FOUND
+
+from app.cache import MISSING, TTLCache
+from app.exercise_index import IndexSegment, get_default_segment, get_user_segment
+
+MUSCLE_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+EQUIPMENT_WEIGHT = 0.25
+
+# Neighbours kept per exercise, more than are returned so that enough
+# remain after filtering by available equipment.
+TOP_K = 25
+
+# Rows of the default similarity matrix computed at a time, bounding memory
+# to BLOCK_SIZE x catalog size.
+BLOCK_SIZE = 1_024
+
+_user_models = TTLCache(max_size=10_000, ttl=3_600)
+_default_model = None
+_default_lock = threading.Lock()
+
+
+def _feature_keys(features: tuple) -> list:
+    muscles, groups, equipment = features
+    return (
+        [(("muscle", key), MUSCLE_WEIGHT) for key in muscles]
+        + [(("group", key), GROUP_WEIGHT) for key in groups]
+        + [(("equipment", key), EQUIPMENT_WEIGHT) for key in equipment]
+    )
+
+
+def _vectors(features: List[tuple], vocabulary: dict) -> np.ndarray:
+    """
+    Unit-length feature vectors, adding unseen keys to the vocabulary.
+    """
+    for row in features:
+        for key, _ in _feature_keys(row):
+            vocabulary.setdefault(key, len(vocabulary))
+
+    matrix = np.zeros((len(features), len(vocabulary)), dtype=np.float32)
+    for position, row in enumerate(features):
+        for key, weight in _feature_keys(row):
+            matrix[position, vocabulary[key]] = weight
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> tuple:
+    """Column indices and scores of the k best columns of each row."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return (
+        np.take_along_axis(best, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+class DefaultModel:
+    """
+    Vectors and precomputed neighbours of the default catalog.
+
+    Args:
+        segment (IndexSegment): Index segment of the default catalog
+    """
+
+    def __init__(self, segment: IndexSegment):
+        self.segment = segment
+        self.rows = {
+            exercise["exercise_id"]: row
+            for row, exercise in enumerate(segment.exercises)
+        }
+        self.vocabulary = {}
+        self.vectors = _vectors(segment.features, self.vocabulary)
+
+        count = len(segment.exercises)
+        self.neighbours = np.empty((count, min(TOP_K, count)), dtype=np.int64)
+        self.scores = np.empty(self.neighbours.shape, dtype=np.float32)
+        for start in range(0, count, BLOCK_SIZE):
+            block = self.vectors[start:start + BLOCK_SIZE] @ self.vectors.T
+            rows = np.arange(block.shape[0])
+            block[rows, rows + start] = -np.inf
+            neighbours, scores = _top_k(block, TOP_K)
+            self.neighbours[start:start + BLOCK_SIZE] = neighbours
+            self.scores[start:start + BLOCK_SIZE] = scores
+
+
+class UserModel:
+    """
+    Vectors of a user's exercises and their neighbours among the default
+    and the user's own exercises.
+
+    Args:
+        segment (IndexSegment): Index segment of the user's exercises
+        default (DefaultModel): Model of the default catalog
+    """
+
+    def __init__(self, segment: IndexSegment, default: DefaultModel):
+        self.segment = segment
+        self.default = default
+        self.rows = {
+            exercise["exercise_id"]: row
+            for row, exercise in enumerate(segment.exercises)
+        }
+        # User exercises may bind user muscles and equipment, which extend
+        # the default vocabulary; default vectors are zero on those columns.
+        vocabulary = dict(default.vocabulary)
+        self.vectors = _vectors(segment.features, vocabulary)
+        shared = self.vectors[:, :len(default.vocabulary)]
+
+        # Columns: default exercises first, then the user's.
+        scores = np.hstack([shared @ default.vectors.T, self.vectors @ self.vectors.T])
+        offset = len(default.segment.exercises)
+        rows = np.arange(len(segment.exercises))
+        scores[rows, rows + offset] = -np.inf
+        self.neighbours, self.scores = _top_k(scores, TOP_K)
+        self.shared = shared
+
+
+def _get_default_model() -> DefaultModel:
+    global _default_model
+    segment = get_default_segment()
+    with _default_lock:
+        if _default_model is None or _default_model.segment is not segment:
+            _default_model = DefaultModel(segment)
+        return _default_model
+
+
+def _get_user_model(user_id: int) -> UserModel:
+    default = _get_default_model()
+    segment = get_user_segment(user_id)
+    model = _user_models.get(user_id)
+    if model is MISSING or model.segment is not segment or model.default is not default:
+        model = UserModel(segment, default)
+        _user_models.set(user_id, model)
+    return model
+
+
+def _candidates(model: UserModel, exercise_id: int) -> tuple:
+    """Candidate exercises and scores, best first, for an exercise."""
+    default = model.default
+    offset = len(default.segment.exercises)
+
+    def exercise_at(column: int) -> tuple:
+        if column < offset:
+            return default.segment.exercises[column], default.segment.features[column]
+        column -= offset
+        return model.segment.exercises[column], model.segment.features[column]
+
+    row = model.rows.get(exercise_id)
+    if row is not None:
+        pairs = zip(model.neighbours[row], model.scores[row])
+        return [(*exercise_at(column), score) for column, score in pairs]
+
+    row = default.rows.get(exercise_id)
+    if row is None:
+        raise HTTPException(NOT_FOUND, detail="Exercise not found")
+
+    candidates = [
+        (*exercise_at(column), score)
+        for column, score in zip(default.neighbours[row], default.scores[row])
+    ]
+    # The precomputed neighbours only cover the defaults; the user's own
+    # exercises are few and scored on the fly.
+    user_scores = model.shared @ default.vectors[row]
+    candidates.extend(
+        (model.segment.exercises[column], model.segment.features[column], score)
+        for column, score in enumerate(user_scores)
+    )
+    candidates.sort(key=lambda candidate: candidate[2], reverse=True)
+    return candidates
+
+
+def get_exercise_alternatives(
+    exercise_id: int,
+    user_id: int,
+    available_equipment: Optional[Iterable[int]] = None,
+    limit: int = 5,
+) -> List[dict]:
+    """
+    Suggest exercises working the same muscles as a given one.
+
+    Args:
+        exercise_id (int): ID of the exercise to replace, default or the user's
+        user_id (int): ID of the user
+        available_equipment (iterable, optional): Equipment that is free;
+            alternatives needing anything else are left out
+        limit (int): Maximum number of alternatives
+
+    Returns:
+        List[dict]: Alternative exercises, most similar first, each with its
+            "similarity" between 0 and 1
+
+    Raises:
+        HTTPException: If the exercise is not found
+    """
+    available = None if available_equipment is None else set(available_equipment)
+    alternatives = []
+    for exercise, features, score in _candidates(_get_user_model(user_id), exercise_id):
+        if score <= 0 or len(alternatives) == limit:
+            break
+        if available is not None and not available.issuperset(features[2]):
+            continue
+        alternatives.append(dict(exercise, similarity=round(float(score), 4)))
+    return alternatives
@@ -0,0 +1,364 @@
+"""
+Fleet-wide recomputations run in parallel processes.
+
+The users of every shard are split into partitions by ID (``user_id``
+modulo the number of partitions), so a large shard is shared by several
+processes. A job walks the users of each partition in ID order,
+``batch_size`` at a time, each batch in its own transaction on the shard.
+Worker processes are spawned fresh and open their own connection pools.
+After every batch the partition's progress is written to
+``job_checkpoint`` on the shared database, so a run that stops halfway
+resumes after the last finished batch; jobs must therefore be safe to
+repeat on a batch. Jobs that only make sense over a whole shard run in a
+single transaction instead and are checkpointed once per shard, when done.
+
+Run a job with ``python -m app.jobs <job name>``.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional
+
+from app.analytics_repo import recompute_user_streak
+from app.leaderboard import reconcile_shard_leaderboards
+from app.overload_suggestions import SUGGESTION_WINDOW_DAYS, suggest_for_users
+from app.sharding import shard_router
+from app.utils import cursor_factory, shard_cursor_factory
+from sql.jobs_sql import *
+from sql.overload_sql import GET_SUGGESTION_USERS
+
+logger = logging.getLogger(__name__)
+
+USER_BATCH_SIZE = 500
+
+RUNNING = "running"
+DONE = "done"
+
+
+class Job:
+    """
+    A recomputation run on every shard.
+
+    Exactly one of ``process_batch`` and ``process_shard`` must be given.
+    Both receive a cursor of the shard and the parameters of the run, and
+    return the number of rows they wrote.
+
+    Args:
+        name (str): Name of the job, used for its checkpoints
+        process_batch (callable, optional): Called as
+            ``process_batch(cursor, user_ids, params)`` for each batch of users
+        process_shard (callable, optional): Called as
+            ``process_shard(cursor, params)`` once per shard
+        users_query (str): Lists the users to process, with the
+            %(after)s, %(limit)s, %(partition_index)s and %(partition_count)s
+            placeholders and any run parameter
+        params (callable): Returns the parameters of a run; called once in
+            the parent so that every shard uses the same values
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process_batch: Optional[Callable] = None,
+        process_shard: Optional[Callable] = None,
+        users_query: str = GET_SHARD_USERS,
+        params: Callable[[], dict] = dict,
+    ):
+        if (process_batch is None) == (process_shard is None):
+            raise ValueError("A job needs either process_batch or process_shard")
+        self.name = name
+        self.process_batch = process_batch
+        self.process_shard = process_shard
+        self.users_query = users_query
+        self.params = params
+
+
+def _recompute_streaks(cursor, user_ids: List[int], params: dict) -> int:
+    for user_id in user_ids:
+        recompute_user_streak(cursor, user_id)
+    return len(user_ids)
+
+
+JOBS: Dict[str, Job] = {
+    job.name: job
+    for job in (
+        Job(
+            "overload_suggestions",
+            process_batch=lambda cursor, user_ids, params: suggest_for_users(
+                cursor, user_ids, params["since"]
+            ),
+            users_query=GET_SUGGESTION_USERS,
+            params=lambda: {
+                "since": date.today() - timedelta(days=SUGGESTION_WINDOW_DAYS)
+            },
+        ),
+        Job("user_streaks", process_batch=_recompute_streaks),
+        Job(
+            "leaderboards",
+            process_shard=lambda cursor, params: reconcile_shard_leaderboards(cursor),
+        ),
+    )
+}
+
+
+def _init_worker():
+    # Connections cannot be shared with the parent process.
+    shard_router.reset_pools()
+
+
+def _checkpoint(*args):
+    with cursor_factory() as cursor:
+        cursor.execute(*args)
+
+
+def run_job_shard(
+    job_name: str,
+    shard_name: str,
+    params: dict,
+    batch_size: int = USER_BATCH_SIZE,
+    resume: bool = True,
+    partition_index: int = 0,
+    partition_count: int = 1,
+) -> dict:
+    """
+    Run a job on one partition of the users of a shard, resuming from its
+    checkpoint.
+
+    Args:
+        job_name (str): Name of the job in ``JOBS``
+        shard_name (str): Name of the shard
+        params (dict): Parameters of the run
+        batch_size (int): Users processed per transaction
+        resume (bool): Continue an unfinished run instead of starting over
+        partition_index (int): Partition processed, from 0
+        partition_count (int): Number of partitions of the shard's users;
+            jobs run per shard have a single one
+
+    Returns:
+        dict: The partition's "users" and "items" processed by this call,
+            and the "seconds" it took
+    """
+    job = JOBS[job_name]
+    started = time.monotonic()
+    _checkpoint(
+        START_JOB_PARTITION,
+        {
+            "job_name": job_name,
+            "shard_name": shard_name,
+            "partition_index": partition_index,
+            "partition_count": partition_count,
+            "resume": resume,
+        },
+    )
+    with cursor_factory() as cursor:
+        cursor.execute(GET_JOB_CHECKPOINT, (job_name, shard_name, partition_index))
+        last_user_id, _, _ = cursor.fetchone()
+
+    users = items = 0
+    if job.process_shard is not None:
+        with shard_cursor_factory(shard_name) as cursor:
+            items = job.process_shard(cursor, params)
+        _checkpoint(FINISH_JOB_SHARD, (items, job_name, shard_name))
+
+    while job.process_batch is not None:
+        with shard_cursor_factory(shard_name) as cursor:
+            cursor.execute(
+                job.users_query,
+                dict(
+                    params,
+                    after=last_user_id,
+                    limit=batch_size,
+                    partition_index=partition_index,
+                    partition_count=partition_count,
+                ),
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if not user_ids:
+                break
+            processed = job.process_batch(cursor, user_ids, params)
+
+        last_user_id = user_ids[-1]
+        users += len(user_ids)
+        items += processed
+        _checkpoint(
+            ADVANCE_JOB_CHECKPOINT,
+            (
+                last_user_id,
+                len(user_ids),
+                processed,
+                job_name,
+                shard_name,
+                partition_index,
+            ),
+        )
+
+    if job.process_batch is not None:
+        _checkpoint(FINISH_JOB_PARTITION, (job_name, shard_name, partition_index))
+    seconds = time.monotonic() - started
+    logger.info(
+        "%s on %s (%d/%d): %d users, %d items in %.1fs",
+        job_name, shard_name, partition_index + 1, partition_count,
+        users, items, seconds,
+    )
+    return {
+        "shard_name": shard_name,
+        "partition_index": partition_index,
+        "users": users,
+        "items": items,
+        "seconds": seconds,
+    }
+
+
+def run_job(
+    job_name: str,
+    max_workers: Optional[int] = None,
+    batch_size: int = USER_BATCH_SIZE,
+    resume: bool = True,
+    partitions: Optional[int] = None,
+) -> dict:
+    """
+    Run a job on every shard, in parallel processes.
+
+    Args:
+        job_name (str): Name of the job in ``JOBS``
+        max_workers (int, optional): Maximum number of processes, defaults
+            to the number of CPUs
+        batch_size (int): Users processed per transaction
+        resume (bool): If a previous run was interrupted, continue it with
+            the same partitions: unfinished partitions resume from their
+            checkpoint and finished ones are skipped
+        partitions (int, optional): Partitions of the users of each shard,
+            defaults to enough to keep every process busy; ignored by jobs
+            run per shard
+
+    Returns:
+        dict: Totals of "users" and "items", wall-clock "seconds",
+            "users_per_second" and the per-partition results in "shards"
+
+    Raises:
+        ValueError: If the job is unknown
+    """
+    if job_name not in JOBS:
+        raise ValueError(f"Unknown job: {job_name}")
+
+    job = JOBS[job_name]
+    params = job.params()
+    shard_names = list(shard_router.shards)
+    workers = max_workers or os.cpu_count() or 1
+    if job.process_shard is not None:
+        partition_count = 1
+    else:
+        partition_count = partitions or max(1, -(-workers // len(shard_names)))
+
+    done = set()
+    checkpoints = get_job_status(job_name) if resume else []
+    if any(checkpoint["status"] == RUNNING for checkpoint in checkpoints):
+        # Partitions already done in an interrupted run are not run again.
+        partition_count = checkpoints[0]["partition_count"]
+        done = {
+            (checkpoint["shard_name"], checkpoint["partition_index"])
+            for checkpoint in checkpoints
+            if checkpoint["status"] == DONE
+        }
+    else:
+        # Start over, dropping partitions of earlier runs split differently.
+        _checkpoint(DELETE_JOB_CHECKPOINTS, (job_name,))
+    units = [
+        (shard_name, partition_index)
+        for shard_name in shard_names
+        for partition_index in range(partition_count)
+        if (shard_name, partition_index) not in done
+    ]
+
+    started = time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=max(min(workers, len(units)), 1),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        futures = [
+            executor.submit(
+                run_job_shard,
+                job_name,
+                shard_name,
+                params,
+                batch_size,
+                resume,
+                partition_index,
+                partition_count,
+            )
+            for shard_name, partition_index in units
+        ]
+        shards = [future.result() for future in futures]
+
+    seconds = time.monotonic() - started
+    users = sum(shard["users"] for shard in shards)
+    return {
+        "job_name": job_name,
+        "users": users,
+        "items": sum(shard["items"] for shard in shards),
+        "seconds": seconds,
+        "users_per_second": users / seconds if seconds else 0.0,
+        "shards": shards,
+    }
+
+
+def get_job_status(job_name: str) -> List[dict]:
+    """
+    Get the progress of each partition in the current or last run of a job.
+
+    Args:
+        job_name (str): Name of the job
+
+    Returns:
+        List[dict]: One entry per shard and partition that has run the job
+    """
+    with cursor_factory() as cursor:
+        cursor.execute(GET_JOB_CHECKPOINTS, (job_name,))
+        return [
+            {
+                "shard_name": checkpoint[0],
+                "partition_index": checkpoint[1],
+                "partition_count": checkpoint[2],
+                "status": checkpoint[3],
+                "last_user_id": checkpoint[4],
+                "users_processed": checkpoint[5],
+                "items_processed": checkpoint[6],
+                "started_at": checkpoint[7],
+                "updated_at": checkpoint[8],
+                "finished_at": checkpoint[9],
+            }
+            for checkpoint in cursor.fetchall()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a batch job on every shard")
+    parser.add_argument("job_name", choices=sorted(JOBS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=USER_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true")
+    parser.add_argument("--partitions", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = run_job(
+        args.job_name,
+        args.workers,
+        args.batch_size,
+        not args.restart,
+        args.partitions,
+    )
+    print(
+        f"{result['job_name']}: {result['users']} users, {result['items']} items "
+        f"in {result['seconds']:.1f}s ({result['users_per_second']:.1f} users/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Community leaderboards of the default exercises.
+
+Each shard keeps, in ``leaderboard_entry``, its own top ``LEADERBOARD_SIZE``
+users per default exercise, metric and period. The report repo calls
+``record_leaderboard_sets`` in the transaction storing new sets, which
+rescores only that user's sets of the affected exercises and months.
+Edits and deletions are not followed; the "leaderboards" job of app.jobs
+rebuilds the recent monthly boards from the reports and should run daily.
+All-time bests are never rebuilt, only raised, so they survive the
+archiving of old sets. Reads merge the per-shard boards and never touch
+the report tables.
+"""
+
+import heapq
+from datetime import date
+from http import HTTPStatus
+from typing import Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.analytics_repo import E1RM_MAX_REPS
+from app.cache import TTLCache
+from app.sharding import shard_router
+from app.utils import cursor_factory, shard_cursor_factory
+from sql.leaderboard_sql import *
+
+LEADERBOARD_SIZE = 100
+LEADERBOARD_METRICS = ("e1rm", "volume")
+ALL_TIME = "all"
+
+# Months of monthly boards rebuilt by a reconciliation; older months are
+# left as they are and their sets are not read.
+RECONCILE_MONTHS = 2
+
+# Merged boards are shared by every user, so a short TTL absorbs most reads.
+leaderboard_cache = TTLCache(max_size=2_000, ttl=60)
+
+
+def record_leaderboard_sets(
+    cursor, user_id: int, sets: Iterable[Tuple[int, date]]
+):
+    """
+    Update the shard's leaderboards with newly stored sets of a user.
+
+    Meant to run in the transaction that stored the sets. Sets of the
+    user's own exercises are ignored.
+
+    Args:
+        cursor: Cursor of the transaction that stored the sets
+        user_id (int): ID of the user owning the sets
+        sets (iterable): (exercise_id, report_date) of each new set
+    """
+    sets = list(sets)
+    if not sets:
+        return
+
+    cursor.execute(
+        RECORD_LEADERBOARD_SCORES,
+        {
+            "user_id": user_id,
+            "exercise_ids": [exercise_id for exercise_id, _ in sets],
+            "report_dates": [report_date for _, report_date in sets],
+            "e1rm_max_reps": E1RM_MAX_REPS,
+            "size": LEADERBOARD_SIZE
+        }
+    )
+    boards = set(cursor.fetchall())
+    if boards:
+        metrics, exercise_ids, periods = zip(*boards)
+        cursor.execute(
+            TRIM_LEADERBOARD,
+            (list(metrics), list(exercise_ids), list(periods), LEADERBOARD_SIZE)
+        )
+
+
+def _reconcile_since(today: date) -> date:
+    month = today.year * 12 + today.month - RECONCILE_MONTHS
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def reconcile_shard_leaderboards(cursor, since: Optional[date] = None) -> int:
+    """
+    Rebuild a shard's recent monthly leaderboards from its set reports.
+
+    Only sets from ``since`` on are read. Their bests also raise the
+    all-time entries, which are kept otherwise. Run by the "leaderboards"
+    job of app.jobs.
+
+    Args:
+        cursor: Cursor of the shard
+        since (date, optional): First day of the monthly boards rebuilt,
+            defaults to the start of the month ``RECONCILE_MONTHS`` ago
+
+    Returns:
+        int: Number of leaderboard entries stored or raised
+    """
+    since = since or _reconcile_since(date.today())
+    cursor.execute(DELETE_RECONCILED_LEADERBOARDS, (since,))
+    cursor.execute(
+        RECONCILE_LEADERBOARDS,
+        {"since": since, "e1rm_max_reps": E1RM_MAX_REPS, "size": LEADERBOARD_SIZE}
+    )
+    stored = cursor.rowcount
+    cursor.execute(TRIM_ALL_TIME_LEADERBOARDS, (LEADERBOARD_SIZE,))
+    return stored
+
+
+def _load_board(metric: str, exercise_id: int, period: str) -> List[dict]:
+    boards = []
+    for shard_name in shard_router.shards:
+        with shard_cursor_factory(shard_name) as cursor:
+            cursor.execute(
+                GET_LEADERBOARD, (metric, exercise_id, period, LEADERBOARD_SIZE)
+            )
+            boards.append(cursor.fetchall())
+
+    # Each shard's board is sorted the same way, so merging keeps the order.
+    merged = heapq.merge(
+        *boards, key=lambda entry: (-entry[1], entry[2], entry[0])
+    )
+    entries = list(merged)[:LEADERBOARD_SIZE]
+
+    with cursor_factory() as cursor:
+        cursor.execute(
+            GET_LEADERBOARD_USER_NAMES, ([entry[0] for entry in entries],)
+        )
+        names = dict(cursor.fetchall())
+
+    return [
+        {
+            "rank": rank,
+            "user_id": user_id,
+            "name": names.get(user_id),
+            "score": float(score),
+            "achieved_on": achieved_on
+        }
+        for rank, (user_id, score, achieved_on) in enumerate(entries, start=1)
+    ]
+
+
+def get_leaderboard(
+    exercise_id: int,
+    metric: str = "e1rm",
+    period: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> dict:
+    """
+    Get a page of the leaderboard of a default exercise.
+
+    Args:
+        exercise_id (int): ID of the default exercise
+        metric (str): "e1rm" for the best estimated 1RM or "volume" for the
+            total weight x reps
+        period (str, optional): Month as "YYYY-MM", or "all" for the
+            all-time e1rm board; defaults to the current month
+        limit (int): Maximum number of entries returned
+        offset (int): Number of entries to skip
+
+    Returns:
+        dict: "metric", "period" and "entries", each with its rank, user ID,
+            user name, score and the day it was achieved; only the top
+            ``LEADERBOARD_SIZE`` entries are ranked
+
+    Raises:
+        HTTPException: If the metric or period is invalid
+    """
+    period = period or date.today().strftime("%Y-%m")
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(HTTPStatus.BAD_REQUEST, detail="Invalid metric")
+    if period == ALL_TIME and metric != "e1rm":
+        raise HTTPException(
+            HTTPStatus.BAD_REQUEST, detail="All-time boards only rank e1rm"
+        )
+    if period != ALL_TIME:
+        try:
+            period = date.fromisoformat(f"{period}-01").strftime("%Y-%m")
+        except ValueError:
+            raise HTTPException(HTTPStatus.BAD_REQUEST, detail="Invalid period")
+
+    entries = leaderboard_cache.get_or_load(
+        (metric, exercise_id, period),
+        lambda: _load_board(metric, exercise_id, period)
+    )
+    return {
+        "metric": metric,
+        "period": period,
+        "entries": entries[offset:offset + limit]
+    }
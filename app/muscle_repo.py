@@ -1,6 +1,6 @@
 from sql.muscle_sql import *
 from psycopg2 import IntegrityError
-from app.utils import cursor_factory
+from app.utils import cursor_factory, search_catalog
 from fastapi import HTTPException
 from http.client import CONFLICT, INTERNAL_SERVER_ERROR, NOT_FOUND
 
@@ -15,7 +15,7 @@ def create_muscle(muscle_data: dict):
     Returns:
         int: The ID of the created muscle.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(muscle_data["user_id"]) as cursor:
         try:
             cursor.execute(
                 INSERT_MUSCLE,
@@ -48,7 +48,7 @@ def update_muscle(muscle_id: int, user_id: int, updates: dict):
     Returns:
         int: The ID of the updated muscle.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(
                 UPDATE_MUSCLE,
@@ -108,7 +108,7 @@ def get_all_muscles_by_user(user_id: int, limit: int = 50, offset: int = 0):
     Returns:
         list: A list of dictionaries containing muscle information.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_ALL_MUSCLES_BY_USER, (user_id, limit, offset))
         muscles = cursor.fetchall()
         if not muscles:
@@ -136,7 +136,7 @@ def delete_muscle(muscle_id: int, user_id: int):
     Returns:
         int: The ID of the deleted muscle.
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(DELETE_MUSCLE, (muscle_id, user_id))
         deleted_id = cursor.fetchone()[0]
         if not deleted_id:
@@ -158,7 +158,7 @@ def get_muscle_by_id(muscle_id: int, user_id: int):
     Raises:
         HTTPException: If muscle is not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_MUSCLE_BY_ID, (muscle_id, user_id))
         muscle = cursor.fetchone()
         if not muscle:
@@ -186,7 +186,7 @@ def get_muscle_by_name(muscle_name: str, user_id: int):
     Raises:
         HTTPException: If muscle is not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_MUSCLE_BY_NAME, (muscle_name, user_id))
         muscle = cursor.fetchone()
         if not muscle:
@@ -198,3 +198,90 @@ def get_muscle_by_name(muscle_name: str, user_id: int):
             "muscle_name": muscle[3],
             "active": muscle[4],
         }
+
+
+def get_muscles_by_ids(muscle_ids: list, user_id: int) -> dict:
+    """
+    Retrieve several muscles by their IDs in a single query.
+
+    Args:
+        muscle_ids (list): IDs of the muscles to retrieve
+        user_id (int): ID of the user who owns the muscles
+
+    Returns:
+        dict: Muscle information keyed by muscle ID. IDs that were not
+        found are left out
+    """
+    if not muscle_ids:
+        return {}
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_MUSCLES_BY_IDS, (list(muscle_ids), user_id))
+        return {
+            row[0]: {
+                "muscle_id": row[0],
+                "user_id": row[1],
+                "group_name": row[2],
+                "muscle_name": row[3],
+                "active": row[4],
+            }
+            for row in cursor.fetchall()
+        }
+
+
+def get_muscles_by_names(muscle_names: list, user_id: int) -> dict:
+    """
+    Retrieve several muscles by their names in a single query.
+
+    Args:
+        muscle_names (list): Names of the muscles to retrieve
+        user_id (int): ID of the user who owns the muscles
+
+    Returns:
+        dict: Muscle information keyed by muscle name. Names that were
+        not found are left out
+    """
+    if not muscle_names:
+        return {}
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_MUSCLES_BY_NAMES, (list(muscle_names), user_id))
+        return {
+            row[3]: {
+                "muscle_id": row[0],
+                "user_id": row[1],
+                "group_name": row[2],
+                "muscle_name": row[3],
+                "active": row[4],
+            }
+            for row in cursor.fetchall()
+        }
+
+
+def search_muscles(query: str, user_id: int, limit: int = 10) -> list:
+    """
+    Search default and user muscles by name.
+
+    Matching ignores case and accents, ranks prefix matches first and
+    tolerates typos.
+
+    Args:
+        query (str): Text typed by the user
+        user_id (int): ID of the user searching
+        limit (int): Maximum number of results
+
+    Returns:
+        list: Best matching muscles with their similarity score
+    """
+    rows = search_catalog(
+        SEARCH_DEFAULT_MUSCLES, SEARCH_USER_MUSCLES, query, user_id, limit
+    )
+    return [
+        {
+            "muscle_id": muscle[0],
+            "user_id": muscle[1],
+            "group_name": muscle[2],
+            "muscle_name": muscle[3],
+            "active": muscle[4],
+            "score": muscle[6],
+        }
+        for muscle in rows
+    ]
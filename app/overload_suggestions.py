@@ -0,0 +1,183 @@
+"""
+Progressive-overload suggestions for the next session of each split exercise.
+
+A nightly batch looks at the last ``SUGGESTION_SESSIONS`` sessions of every
+active split exercise and applies double progression against the
+exercise's target sets and rep range:
+
+* every target set done at the top weight with the top of the range:
+  increase the weight by ``INCREASE_RATIO`` and go back to the bottom of the
+  range (bodyweight exercises add a rep instead);
+* the bottom of the range missed at the same weight in all of the last
+  ``SUGGESTION_SESSIONS`` sessions: deload to ``DELOAD_RATIO`` of the weight;
+* otherwise keep the weight and add a rep, within the range.
+
+The rules run vectorized over a batch of users at a time, as the
+"overload_suggestions" job of app.jobs, and results are stored in
+``overload_suggestion`` so opening a session is a single indexed read.
+The job also visits users who stopped training, so suggestions without a
+session in the last ``SUGGESTION_WINDOW_DAYS`` days are deleted.
+"""
+
+import re
+from datetime import date
+from typing import List
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from app.utils import cursor_factory
+from sql.overload_sql import *
+
+SUGGESTION_SESSIONS = 3
+SUGGESTION_WINDOW_DAYS = 56
+INCREASE_RATIO = 0.025
+DELOAD_RATIO = 0.9
+
+_TARGET_REPS = re.compile(r"^\s*(\d+)(?:\s*(?:-|a|to)\s*(\d+))?", re.IGNORECASE)
+
+
+def _target_range(reps: str) -> tuple:
+    """Bottom and top of a target such as "8-12" or "10", NaN if not numeric."""
+    match = _TARGET_REPS.match(reps or "")
+    if match is None:
+        return np.nan, np.nan
+    low = int(match.group(1))
+    return low, int(match.group(2) or low)
+
+
+def _optional(value) -> float:
+    return np.nan if value is None else value
+
+
+def compute_suggestions(rows: list) -> List[tuple]:
+    """
+    Apply the progression rules to the history of a batch of split exercises.
+
+    Args:
+        rows (list): Rows of ``GET_OVERLOAD_HISTORY``, ordered by split
+            exercise and recency
+
+    Returns:
+        List[tuple]: Values of ``INSERT_SUGGESTIONS``, one per split exercise
+            with a numeric rep target
+    """
+    targets = []
+    positions = {}
+    for row in rows:
+        key = row[1:5]
+        if key not in positions:
+            positions[key] = len(targets)
+            targets.append(row)
+    if not targets:
+        return []
+
+    shape = (len(targets), SUGGESTION_SESSIONS)
+    weight = np.full(shape, np.nan)
+    sets_done = np.full(shape, np.nan)
+    min_reps = np.full(shape, np.nan)
+    target_index = np.array([positions[row[1:5]] for row in rows])
+    session_index = np.array([row[7] - 1 for row in rows])
+    weight[target_index, session_index] = [row[9] for row in rows]
+    sets_done[target_index, session_index] = [row[10] for row in rows]
+    min_reps[target_index, session_index] = [_optional(row[11]) for row in rows]
+
+    target_sets = np.array([row[5] for row in targets], dtype=float)
+    low, high = np.array([_target_range(row[6]) for row in targets], dtype=float).T
+
+    last_weight = weight[:, 0]
+    last_reps = min_reps[:, 0]
+    increase = (sets_done[:, 0] >= target_sets) & (last_reps >= high)
+    stalled = (weight == last_weight[:, None]) & (min_reps < low[:, None])
+    deload = ~increase & np.all(stalled, axis=1)
+    loaded = last_weight > 0
+
+    step = np.maximum(1, np.round(last_weight * INCREASE_RATIO))
+    new_weight = np.select(
+        [increase & loaded, deload],
+        [last_weight + step, np.floor(last_weight * DELOAD_RATIO)],
+        last_weight,
+    )
+    next_rep = np.nan_to_num(last_reps, nan=0) + 1
+    new_reps = np.select(
+        [increase & loaded, increase, deload],
+        [low, next_rep, low],
+        np.clip(next_rep, low, high),
+    )
+    action = np.select([increase, deload], ["increase", "deload"], "hold")
+
+    return [
+        (
+            *row[1:5],
+            row[0],
+            str(action[i]),
+            row[5],
+            int(new_reps[i]),
+            int(new_weight[i]),
+            int(last_weight[i]),
+            None if np.isnan(last_reps[i]) else int(last_reps[i]),
+            row[8],
+        )
+        for i, row in enumerate(targets)
+        if not np.isnan(low[i])
+    ]
+
+
+def suggest_for_users(cursor, user_ids: List[int], since: date) -> int:
+    """
+    Recompute and store the suggestions of a batch of users on one shard.
+
+    The users' previous suggestions are replaced, so split exercises without
+    a session since ``since`` lose theirs.
+
+    Args:
+        cursor: Cursor of the users' shard
+        user_ids (List[int]): IDs of the users
+        since (date): Oldest session considered
+
+    Returns:
+        int: Number of suggestions stored
+    """
+    cursor.execute(
+        GET_OVERLOAD_HISTORY,
+        {"user_ids": user_ids, "since": since, "sessions": SUGGESTION_SESSIONS},
+    )
+    suggestions = compute_suggestions(cursor.fetchall())
+    cursor.execute(DELETE_USERS_SUGGESTIONS, (user_ids,))
+    if suggestions:
+        execute_values(cursor, INSERT_SUGGESTIONS, suggestions)
+    return len(suggestions)
+
+
+def get_split_suggestions(workout_plan_id: int, split: str, user_id: int) -> List[dict]:
+    """
+    Get the stored suggestions for the next session of a split.
+
+    Args:
+        workout_plan_id (int): ID of the workout plan
+        split (str): Split identifier
+        user_id (int): ID of the user owning the plan
+
+    Returns:
+        List[dict]: One suggestion per exercise with history, in execution
+            order, with the action ("increase", "hold" or "deload"), the
+            suggested sets, reps and weight, and the last session's weight
+            and fewest reps
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_SPLIT_SUGGESTIONS, (workout_plan_id, split, user_id))
+        return [
+            {
+                "exercise_id": suggestion[0],
+                "execution_order": suggestion[1],
+                "action": suggestion[2],
+                "suggested_sets": suggestion[3],
+                "suggested_reps": suggestion[4],
+                "suggested_weight": suggestion[5],
+                "last_weight": suggestion[6],
+                "last_reps": suggestion[7],
+                "based_on": suggestion[8],
+                "computed_at": suggestion[9],
+            }
+            for suggestion in cursor.fetchall()
+        ]
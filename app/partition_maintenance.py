@@ -0,0 +1,30 @@
+from datetime import date
+
+from app.sharding import shard_router
+from app.utils import shard_cursor_factory
+from database.partitions import MONTHS_AHEAD, create_month_partitions, missing_months
+
+
+def ensure_report_partitions(months_ahead: int = MONTHS_AHEAD) -> int:
+    """
+    Create the missing monthly report partitions on every shard.
+
+    Covers the upcoming months and any past month whose reports still sit in
+    the default partition, moving those reports into their month. Each month
+    is created in its own transaction, so one failure does not undo the
+    others. Meant to run on startup and then daily.
+
+    Args:
+        months_ahead (int): Number of future months to prepare
+
+    Returns:
+        int: Number of rows moved out of the default partitions
+    """
+    moved = 0
+    for shard_name in shard_router.shards:
+        with shard_cursor_factory(shard_name) as cursor:
+            months = missing_months(cursor, date.today(), months_ahead)
+        for month in months:
+            with shard_cursor_factory(shard_name) as cursor:
+                moved += create_month_partitions(cursor, month)
+    return moved
@@ -0,0 +1,189 @@
+"""
+Password hashing off the request path.
+
+Hashes are computed with scrypt, which is memory-hard and takes tens of
+milliseconds of CPU by design. The work runs in a process pool so it neither
+blocks the event loop nor serializes on the GIL, and a bounded number of
+pending jobs keeps bursts of logins from queueing without limit.
+
+Hashes are stored as ``scrypt$<n>$<r>$<p>$<salt>$<digest>`` so the cost
+parameters travel with them and older hashes can be upgraded on login.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.client import SERVICE_UNAVAILABLE
+from threading import BoundedSemaphore, Lock
+from typing import Optional
+
+from fastapi import HTTPException
+
+SCRYPT_N = 2**14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+DIGEST_BYTES = 64
+
+# Worker processes and the number of jobs allowed to wait for one.
+POOL_WORKERS = os.cpu_count() or 1
+MAX_PENDING = POOL_WORKERS * 8
+QUEUE_TIMEOUT = 2.0
+
+_PREFIX = "scrypt"
+
+_executor = None
+_executor_lock = Lock()
+_pending = BoundedSemaphore(MAX_PENDING)
+
+
+def configure(
+    n: Optional[int] = None, r: Optional[int] = None, p: Optional[int] = None
+):
+    """
+    Change the cost parameters used for new hashes.
+
+    Existing hashes keep verifying with the parameters they were created
+    with and are reported by ``needs_rehash`` until upgraded.
+
+    Args:
+        n (int): CPU/memory cost, a power of two
+        r (int): Block size
+        p (int): Parallelization factor
+    """
+    global SCRYPT_N, SCRYPT_R, SCRYPT_P
+    SCRYPT_N = n or SCRYPT_N
+    SCRYPT_R = r or SCRYPT_R
+    SCRYPT_P = p or SCRYPT_P
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=256 * n * r * p,
+        dklen=DIGEST_BYTES,
+    )
+
+
+def _hash_job(password: str, n: int, r: int, p: int) -> str:
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    return "$".join(
+        (
+            _PREFIX,
+            str(n),
+            str(r),
+            str(p),
+            base64.b64encode(salt).decode(),
+            base64.b64encode(digest).decode(),
+        )
+    )
+
+
+def _verify_job(password: str, encoded: str) -> bool:
+    if not encoded.startswith(_PREFIX + "$"):
+        # Passwords stored before hashing was introduced.
+        return hmac.compare_digest(password.encode(), encoded.encode())
+
+    _, n, r, p, salt, digest = encoded.split("$")
+    computed = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(computed, base64.b64decode(digest))
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS)
+    return _executor
+
+
+def _submit(fn, args: tuple, timeout: float = QUEUE_TIMEOUT) -> Future:
+    # Coroutines must not wait for a slot, so they pass a zero timeout.
+    if not _pending.acquire(timeout=timeout):
+        raise HTTPException(
+            SERVICE_UNAVAILABLE, detail="Too many authentication requests"
+        )
+    try:
+        future = _get_executor().submit(fn, *args)
+    except Exception:
+        _pending.release()
+        raise
+    future.add_done_callback(lambda _: _pending.release())
+    return future
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password with the current cost parameters.
+
+    Blocks until the hash is ready, so it must not run while a pooled
+    connection is held; coroutines use ``hash_password_async`` instead.
+
+    Args:
+        password (str): The plain text password
+
+    Returns:
+        str: The encoded hash
+
+    Raises:
+        HTTPException: If the hashing queue is full
+    """
+    return _submit(_hash_job, (password, SCRYPT_N, SCRYPT_R, SCRYPT_P)).result()
+
+
+def verify_password(password: str, encoded: str) -> bool:
+    """
+    Check a password against a stored hash.
+
+    Blocks like ``hash_password``; coroutines use ``verify_password_async``.
+
+    Args:
+        password (str): The plain text password
+        encoded (str): The stored hash
+
+    Returns:
+        bool: True if the password matches
+
+    Raises:
+        HTTPException: If the hashing queue is full
+    """
+    return _submit(_verify_job, (password, encoded)).result()
+
+
+async def hash_password_async(password: str) -> str:
+    """Awaitable version of ``hash_password``."""
+    return await asyncio.wrap_future(
+        _submit(_hash_job, (password, SCRYPT_N, SCRYPT_R, SCRYPT_P), timeout=0)
+    )
+
+
+async def verify_password_async(password: str, encoded: str) -> bool:
+    """Awaitable version of ``verify_password``."""
+    return await asyncio.wrap_future(
+        _submit(_verify_job, (password, encoded), timeout=0)
+    )
+
+
+def needs_rehash(encoded: str) -> bool:
+    """
+    Tell whether a stored hash is plain text or uses outdated parameters.
+
+    Args:
+        encoded (str): The stored hash
+
+    Returns:
+        bool: True if the password should be hashed again
+    """
+    if not encoded.startswith(_PREFIX + "$"):
+        return True
+    _, n, r, p, _, _ = encoded.split("$")
+    return (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
@@ -0,0 +1,220 @@
+"""
+Per-process cache of assembled workout plan trees.
+
+A tree is a plan with its splits and their active exercises, keyed by
+(user_id, workout_plan_id). Writers call ``notify_plan_changed`` inside
+their transaction; Postgres delivers the notification on commit to a
+listener thread in every worker process, which drops the entry. Trees are
+only cached while the listener of the user's shard is connected, and the
+cache is cleared whenever a listener reconnects, since notifications sent
+in between are lost.
+"""
+
+import copy
+import threading
+from http import HTTPStatus
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from app.cache import MISSING, TTLCache
+from app.cache_listener import POLL_TIMEOUT, NotificationListener
+from app.sharding import shard_router
+from app.utils import cursor_factory
+from sql.plan_cache_sql import *
+from sql.workout_plan_sql import GET_WORKOUT_PLAN_BY_ID, GET_WORKOUT_PLAN_SPLITS
+
+# The TTL only bounds staleness if a notification is ever missed.
+plan_tree_cache = TTLCache(max_size=5_000, ttl=3_600)
+
+_listeners: Dict[str, "PlanCacheListener"] = {}
+_listeners_lock = threading.Lock()
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _bump_generation():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+
+
+def invalidate_plan(user_id: Optional[int], workout_plan_id: Optional[int]):
+    """
+    Drop cached trees in this process.
+
+    Args:
+        user_id (int, optional): Owner of the plan, None if unknown
+        workout_plan_id (int, optional): ID of the plan, None for every plan
+            of the user
+    """
+    _bump_generation()
+    if user_id is not None and workout_plan_id is not None:
+        plan_tree_cache.invalidate((user_id, workout_plan_id))
+    elif workout_plan_id is not None:
+        plan_tree_cache.invalidate_where(lambda key: key[1] == workout_plan_id)
+    else:
+        plan_tree_cache.invalidate_where(lambda key: key[0] == user_id)
+
+
+def notify_plan_changed(
+    cursor, user_id: Optional[int], workout_plan_id: Optional[int] = None
+):
+    """
+    Invalidate a plan tree here and, once the transaction commits, in every
+    other process.
+
+    Args:
+        cursor: Cursor of the transaction changing the plan
+        user_id (int, optional): Owner of the plan, None if unknown
+        workout_plan_id (int, optional): ID of the plan, None for every plan
+            of the user
+    """
+    invalidate_plan(user_id, workout_plan_id)
+    payload = f"{'' if user_id is None else user_id}:{workout_plan_id or ''}"
+    cursor.execute(NOTIFY_WORKOUT_PLAN_CHANGED, (payload,))
+
+
+def _handle_payload(payload: str):
+    user_id, _, workout_plan_id = payload.partition(":")
+    invalidate_plan(
+        int(user_id) if user_id else None,
+        int(workout_plan_id) if workout_plan_id else None
+    )
+
+
+def _clear_on_connect():
+    plan_tree_cache.clear()
+    _bump_generation()
+
+
+class PlanCacheListener(NotificationListener):
+    """
+    Background thread listening for plan changes on one shard.
+
+    Args:
+        shard_name (str): Name of the shard to listen on
+    """
+
+    def __init__(self, shard_name: str):
+        super().__init__(
+            f"plan-cache-{shard_name}",
+            shard_router.shards[shard_name],
+            LISTEN_WORKOUT_PLAN_CHANGED,
+            _handle_payload,
+            _clear_on_connect
+        )
+        self.shard_name = shard_name
+
+
+def start_plan_cache_listeners():
+    """
+    Start one listener per shard in this process, if not already running.
+
+    Must be called in every worker process (for instance on application
+    startup); until then trees are not cached.
+    """
+    with _listeners_lock:
+        for shard_name in shard_router.shards:
+            listener = _listeners.get(shard_name)
+            if listener is None or not listener.is_alive():
+                listener = PlanCacheListener(shard_name)
+                listener.start()
+                _listeners[shard_name] = listener
+
+
+def stop_plan_cache_listeners(timeout: float = POLL_TIMEOUT):
+    """Stop the listeners of this process and clear the cache."""
+    with _listeners_lock:
+        for listener in _listeners.values():
+            listener.stopping.set()
+        for listener in _listeners.values():
+            listener.join(timeout)
+        _listeners.clear()
+    plan_tree_cache.clear()
+
+
+def _load_plan_tree(workout_plan_id: int, user_id: int) -> dict:
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_WORKOUT_PLAN_BY_ID, (workout_plan_id, user_id))
+        plan = cursor.fetchone()
+        if not plan:
+            raise HTTPException(
+                HTTPStatus.NOT_FOUND,
+                detail="Workout plan not found"
+            )
+        cursor.execute(GET_WORKOUT_PLAN_SPLITS, (workout_plan_id,))
+        splits = {
+            split[0]: {"split": split[0], "active": split[2], "exercises": []}
+            for split in cursor.fetchall()
+        }
+        cursor.execute(GET_PLAN_TREE_EXERCISES, (workout_plan_id,))
+        for ex in cursor.fetchall():
+            splits[ex[0]]["exercises"].append(
+                {
+                    "exercise_id": ex[1],
+                    "execution_order": ex[2],
+                    "sets": ex[3],
+                    "reps": ex[4],
+                    "advanced_technique": ex[5],
+                    "rest_time": ex[6],
+                    "active": ex[7],
+                    "exercise_name": ex[8],
+                    "description": ex[9]
+                }
+            )
+
+    return {
+        "workout_plan_id": plan[0],
+        "user_id": plan[1],
+        "workout_plan_name": plan[2],
+        "workout_plan_goal": plan[3],
+        "active": plan[4],
+        "splits": list(splits.values())
+    }
+
+
+def get_workout_plan_tree(workout_plan_id: int, user_id: int) -> dict:
+    """
+    Get a workout plan with its splits and their active exercises.
+
+    Args:
+        workout_plan_id (int): ID of the workout plan
+        user_id (int): ID of the user owning the plan
+
+    Returns:
+        dict: Plan information with a "splits" list, each split holding its
+            "exercises" in execution order
+
+    Raises:
+        HTTPException: If plan not found
+    """
+    key = (user_id, workout_plan_id)
+    listener = _listeners.get(shard_router.shard_for(user_id))
+    if listener is None or not listener.connected.is_set():
+        return _load_plan_tree(workout_plan_id, user_id)
+
+    tree = plan_tree_cache.get(key)
+    if tree is MISSING:
+        generation = _generation
+        tree = _load_plan_tree(workout_plan_id, user_id)
+        # A change notified while loading may not be reflected in the tree.
+        if generation == _generation:
+            plan_tree_cache.set(key, tree)
+    return copy.deepcopy(tree)
+
+
+def get_plan_cache_stats() -> dict:
+    """
+    Report plan tree cache usage.
+
+    Returns:
+        dict: Cache counters and the shards with a connected listener
+    """
+    return dict(
+        plan_tree_cache.stats(),
+        listening=sorted(
+            name for name, listener in _listeners.items()
+            if listener.connected.is_set()
+        )
+    )
@@ -0,0 +1,343 @@
+"""
+Archival of cold set reports into per-user, per-year Parquet files.
+
+Set reports older than ``COLD_AFTER_DAYS`` are rarely read except for full
+exports, so they are moved out of the database into
+``ARCHIVE_ROOT/<user_id>/<year>.parquet``. The ``report_archive`` table keeps
+a manifest of the files and the date before which a user's history lives in
+the archive, so readers know when to look there. ``ARCHIVE_ROOT`` is read
+from the ``FITTUDE_ARCHIVE_ROOT`` environment variable and is always
+absolute, so it does not depend on the working directory.
+
+Archived sets keep their ``workout_report`` row in the database. Readers
+skip archived sets whose report is gone, and ``prune_user_archive`` rewrites
+the files once a deletion has committed.
+
+Writing Parquet requires the optional ``pyarrow`` dependency (the
+``archive`` extra).
+"""
+
+import os
+import shutil
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from app.sharding import shard_router
+from app.utils import cursor_factory, shard_cursor_factory
+from sql.archive_sql import *
+from sql.sync_sql import SKIP_TOMBSTONES
+
+ARCHIVE_ROOT = Path(
+    os.environ.get(
+        "FITTUDE_ARCHIVE_ROOT", Path(__file__).resolve().parent.parent / "archive"
+    )
+).resolve()
+COLD_AFTER_DAYS = 730
+
+_COLUMNS = (
+    "workout_report_id",
+    "report_date",
+    "exercise_id",
+    "split",
+    "workout_plan_id",
+    "execution_order",
+    "set_number",
+    "reps",
+    "weight",
+    "notes",
+)
+_KEY = (
+    "workout_report_id",
+    "exercise_id",
+    "split",
+    "workout_plan_id",
+    "set_number",
+)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError(
+            "Report archival requires pyarrow, install the 'archive' extra"
+        ) from e
+    return pyarrow, pyarrow.parquet
+
+
+def _schema(pa):
+    return pa.schema(
+        [
+            ("workout_report_id", pa.int32()),
+            ("report_date", pa.date32()),
+            ("exercise_id", pa.int32()),
+            ("split", pa.string()),
+            ("workout_plan_id", pa.int32()),
+            ("execution_order", pa.int32()),
+            ("set_number", pa.int32()),
+            ("reps", pa.string()),
+            ("weight", pa.int32()),
+            ("notes", pa.string()),
+        ]
+    )
+
+
+def _write_file(path: Path, rows: List[dict]) -> tuple:
+    pa, pq = _pyarrow()
+    ordered = sorted(rows, key=lambda row: row["report_date"])
+    temporary = path.with_suffix(".parquet.tmp")
+    pq.write_table(
+        pa.Table.from_pylist(ordered, schema=_schema(pa)),
+        temporary,
+        compression="zstd",
+    )
+    os.replace(temporary, path)
+    dates = (ordered[0]["report_date"], ordered[-1]["report_date"])
+    return (str(path), len(ordered), *dates)
+
+
+def _write_year(user_id: int, year: int, rows: List[dict]) -> tuple:
+    _, pq = _pyarrow()
+    path = ARCHIVE_ROOT / str(user_id) / f"{year}.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Merge with what a previous run archived; rows left behind by a run
+    # that crashed before committing are deduplicated by primary key.
+    merged = {}
+    if path.exists():
+        for row in pq.read_table(path).to_pylist():
+            merged[tuple(row[column] for column in _KEY)] = row
+    for row in rows:
+        merged[tuple(row[column] for column in _KEY)] = row
+    return _write_file(path, list(merged.values()))
+
+
+def _archived_report_ids(user_id: int, boundary: date) -> set:
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_ARCHIVED_REPORT_IDS, (user_id, boundary))
+        return {row[0] for row in cursor.fetchall()}
+
+
+def archive_user_reports(user_id: int, before: Optional[date] = None) -> int:
+    """
+    Move a user's set reports older than a date into the archive.
+
+    Files are written first; the manifest update and the deletion of the
+    archived rows then happen in one transaction.
+
+    Args:
+        user_id (int): ID of the user
+        before (date, optional): Archive sets strictly older than this date,
+            defaults to ``COLD_AFTER_DAYS`` ago
+
+    Returns:
+        int: Number of set reports moved to the archive
+    """
+    before = before or date.today() - timedelta(days=COLD_AFTER_DAYS)
+
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_COLD_SET_REPORTS, (user_id, before))
+        rows = [dict(zip(_COLUMNS, row)) for row in cursor.fetchall()]
+        if not rows:
+            return 0
+
+        by_year = {}
+        for row in rows:
+            by_year.setdefault(row["report_date"].year, []).append(row)
+
+        for year, year_rows in by_year.items():
+            file_path, row_count, min_date, max_date = _write_year(
+                user_id, year, year_rows
+            )
+            cursor.execute(
+                UPSERT_ARCHIVE_MANIFEST,
+                (user_id, year, file_path, row_count, min_date, max_date, before),
+            )
+
+        # Archived sets are still part of the history, not deletions to sync.
+        cursor.execute(SKIP_TOMBSTONES)
+        cursor.execute(DELETE_COLD_SET_REPORTS, (user_id, before))
+        return len(rows)
+
+
+def archive_cold_reports(before: Optional[date] = None) -> int:
+    """
+    Archive the cold set reports of every user on every shard.
+
+    Args:
+        before (date, optional): Archive sets strictly older than this date,
+            defaults to ``COLD_AFTER_DAYS`` ago
+
+    Returns:
+        int: Number of set reports moved to the archive
+    """
+    before = before or date.today() - timedelta(days=COLD_AFTER_DAYS)
+    archived = 0
+    for shard_name in shard_router.shards:
+        with shard_cursor_factory(shard_name) as cursor:
+            cursor.execute(GET_USERS_WITH_COLD_REPORTS, (before,))
+            user_ids = [row[0] for row in cursor.fetchall()]
+        for user_id in user_ids:
+            archived += archive_user_reports(user_id, before)
+    return archived
+
+
+def get_archive_manifest(user_id: int) -> List[dict]:
+    """
+    List a user's archive files, newest year first.
+
+    Args:
+        user_id (int): ID of the user
+
+    Returns:
+        List[dict]: One entry per archived year
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_ARCHIVE_MANIFEST, (user_id,))
+        return [
+            {
+                "archive_year": entry[0],
+                "file_path": entry[1],
+                "row_count": entry[2],
+                "min_date": entry[3],
+                "max_date": entry[4],
+                "archived_before": entry[5],
+            }
+            for entry in cursor.fetchall()
+        ]
+
+
+def archive_boundary(manifest: List[dict]) -> Optional[date]:
+    """
+    Date before which a user's history lives in the archive.
+
+    Args:
+        manifest (List[dict]): Result of ``get_archive_manifest``
+
+    Returns:
+        date: The boundary, or None when nothing was archived
+    """
+    return max((entry["archived_before"] for entry in manifest), default=None)
+
+
+def read_archived_set_reports(
+    user_id: int,
+    exercise_id: Optional[int] = None,
+    since: Optional[date] = None,
+    manifest: Optional[List[dict]] = None,
+) -> List[dict]:
+    """
+    Read archived set reports, newest first.
+
+    Args:
+        user_id (int): ID of the user
+        exercise_id (int, optional): Only return sets of this exercise
+        since (date, optional): Only return sets from this date on
+        manifest (List[dict], optional): Manifest already fetched by the
+            caller
+
+    Returns:
+        List[dict]: Set reports in the same shape as the database queries
+    """
+    if manifest is None:
+        manifest = get_archive_manifest(user_id)
+    boundary = archive_boundary(manifest)
+    if boundary is None or (since and since >= boundary):
+        return []
+
+    _, pq = _pyarrow()
+    # Files may still hold sets of reports deleted since they were written.
+    report_ids = _archived_report_ids(user_id, boundary)
+    filters = [("exercise_id", "=", exercise_id)] if exercise_id else None
+    reports = []
+    for entry in manifest:
+        if since and entry["max_date"] < since:
+            continue
+        table = pq.read_table(entry["file_path"], filters=filters)
+        for row in table.to_pylist():
+            day = row["report_date"]
+            if (
+                day < boundary
+                and (not since or day >= since)
+                and row["workout_report_id"] in report_ids
+            ):
+                reports.append(row)
+
+    reports.sort(key=lambda row: row["set_number"])
+    reports.sort(key=lambda row: row["report_date"], reverse=True)
+    return reports
+
+
+def prune_user_archive(
+    user_id: int, workout_report_ids: Iterable[int] = ()
+) -> int:
+    """
+    Remove deleted sets from a user's archive files.
+
+    Drops the archived sets whose workout report no longer exists, and those
+    of the given reports. Meant to run after the deletion has committed;
+    files left without sets are removed along with their manifest entry.
+
+    Args:
+        user_id (int): ID of the user
+        workout_report_ids (iterable, optional): Reports whose archived sets
+            were deleted although the report itself was kept
+
+    Returns:
+        int: Number of archived sets removed
+    """
+    manifest = get_archive_manifest(user_id)
+    boundary = archive_boundary(manifest)
+    if boundary is None:
+        return 0
+
+    _, pq = _pyarrow()
+    keep = _archived_report_ids(user_id, boundary) - set(workout_report_ids)
+    removed = 0
+    emptied = []
+    with cursor_factory(user_id) as cursor:
+        for entry in manifest:
+            rows = pq.read_table(entry["file_path"]).to_pylist()
+            kept = [row for row in rows if row["workout_report_id"] in keep]
+            if len(kept) == len(rows):
+                continue
+
+            removed += len(rows) - len(kept)
+            if not kept:
+                cursor.execute(
+                    DELETE_ARCHIVE_MANIFEST_ENTRY, (user_id, entry["archive_year"])
+                )
+                emptied.append(Path(entry["file_path"]))
+                continue
+            file_path, row_count, min_date, max_date = _write_file(
+                Path(entry["file_path"]), kept
+            )
+            cursor.execute(
+                UPSERT_ARCHIVE_MANIFEST,
+                (
+                    user_id,
+                    entry["archive_year"],
+                    file_path,
+                    row_count,
+                    min_date,
+                    max_date,
+                    entry["archived_before"],
+                ),
+            )
+
+    # Only once no manifest entry points at them anymore.
+    for path in emptied:
+        path.unlink(missing_ok=True)
+    return removed
+
+
+def remove_user_archive(user_id: int):
+    """
+    Delete every archive file of a user, as part of account erasure.
+
+    Args:
+        user_id (int): ID of the user
+    """
+    shutil.rmtree(ARCHIVE_ROOT / str(user_id), ignore_errors=True)
@@ -1,17 +1,37 @@
+from datetime import date
 from fastapi import HTTPException
 from http import HTTPStatus
-from typing import List
-from utils import cursor_factory
+from psycopg2.errors import UniqueViolation
+from typing import List, Optional
+from app.analytics_repo import recompute_user_streak, record_training_day
+from app.deletion_jobs import create_deletion_job, submit_deletion_job
+from app.leaderboard import record_leaderboard_sets
+from app.report_archive import (
+    archive_boundary,
+    get_archive_manifest,
+    prune_user_archive,
+    read_archived_set_reports,
+)
+from app.utils import cursor_factory
 from sql.report_sql import *
 
 
-def create_workout_report(workout_plan_id: int, report_data: dict) -> bool:
+def create_workout_report(
+    workout_plan_id: int,
+    report_data: dict,
+    user_id: int
+) -> bool:
     """
     Create a new workout report.
 
+    Repeating the call with the same "idempotency_key" does not create a
+    second report.
+
     Args:
         workout_plan_id (int): ID of the workout plan
-        report_data (dict): Report data containing date and split
+        report_data (dict): Report data containing date, split and
+            optionally an idempotency_key
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         bool: True if report was created successfully
@@ -19,20 +39,24 @@ def create_workout_report(workout_plan_id: int, report_data: dict) -> bool:
     Raises:
         HTTPException: If creation fails
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(
             INSERT_WORKOUT_REPORT,
-            (
-                workout_plan_id,
-                report_data["report_date"],
-                report_data["split"]
-            )
+            {
+                "report_date": report_data["report_date"],
+                "split": report_data["split"],
+                "idempotency_key": report_data.get("idempotency_key"),
+                "workout_plan_id": workout_plan_id,
+                "user_id": user_id
+            }
         )
-        if cursor.fetchone() is None:
+        report = cursor.fetchone()
+        if report is None:
             raise HTTPException(
                 HTTPStatus.INTERNAL_SERVER_ERROR,
                 detail="Failed to create workout report"
             )
+        record_training_day(cursor, user_id, report[1])
         return True
 
 
@@ -50,7 +74,7 @@ def get_workout_report_by_id(workout_report_id: int, user_id: int) -> dict:
     Raises:
         HTTPException: If report not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_WORKOUT_REPORT_BY_ID, (workout_report_id, user_id))
         report = cursor.fetchone()
         if not report:
@@ -72,7 +96,8 @@ def get_workout_reports_by_plan(
     workout_plan_id: int,
     user_id: int,
     limit: int = 10,
-    offset: int = 0
+    offset: int = 0,
+    since: Optional[date] = None
 ) -> List[dict]:
     """
     Get all workout reports for a plan with pagination.
@@ -82,14 +107,16 @@ def get_workout_reports_by_plan(
         user_id (int): ID of the user owning the plan
         limit (int): Maximum number of reports to return
         offset (int): Number of reports to skip
+        since (date, optional): Only return reports from this date on, which
+            lets the database skip older monthly partitions
 
     Returns:
         List[dict]: List of workout reports
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(
             GET_WORKOUT_REPORTS_BY_PLAN,
-            (workout_plan_id, user_id, limit, offset)
+            (workout_plan_id, user_id, since, limit, offset)
         )
         return [
             {
@@ -106,6 +133,8 @@ def delete_workout_report(workout_report_id: int, user_id: int) -> bool:
     """
     Delete a workout report.
 
+    Its sets already moved to the archive are removed from its files.
+
     Args:
         workout_report_id (int): ID of the workout report to delete
         user_id (int): ID of the user owning the report
@@ -116,51 +145,301 @@ def delete_workout_report(workout_report_id: int, user_id: int) -> bool:
     Raises:
         HTTPException: If report not found or deletion fails
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(DELETE_WORKOUT_REPORT, (workout_report_id, user_id))
-        if cursor.fetchone() is None:
+        report = cursor.fetchone()
+        if report is None:
             raise HTTPException(
                 HTTPStatus.INTERNAL_SERVER_ERROR,
                 detail="Failed to delete workout report"
             )
-        return True
+        recompute_user_streak(cursor, user_id)
+
+    boundary = archive_boundary(get_archive_manifest(user_id))
+    if boundary is not None and report[1] < boundary:
+        prune_user_archive(user_id)
+    return True
+
+
+def schedule_workout_report_deletion(workout_report_id: int, user_id: int) -> int:
+    """
+    Delete a workout report and its set reports in the background.
+
+    Args:
+        workout_report_id (int): ID of the workout report to delete
+        user_id (int): ID of the user owning the report
 
+    Returns:
+        int: ID of the deletion job, to follow its progress
 
-def create_set_report(workout_report_id: int, set_data: dict) -> bool:
+    Raises:
+        HTTPException: If report not found
+    """
+    job_id = create_deletion_job(user_id, "workout_report", workout_report_id)
+    submit_deletion_job(job_id, user_id)
+    return job_id
+
+
+def create_set_report(
+    workout_report_id: int,
+    set_data: dict,
+    user_id: int
+) -> bool:
     """
     Create a new set report.
 
+    The split and plan are those of the report; the exercise must be part
+    of the report's split at the given execution order. Repeating the call
+    with the same "idempotency_key" updates the stored set instead of
+    failing; the row is only written if its values changed.
+
     Args:
         workout_report_id (int): ID of the workout report
-        set_data (dict): Set information
+        set_data (dict): Set information, optionally with an idempotency_key
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         bool: True if set report was created successfully
 
     Raises:
-        HTTPException: If creation fails
+        HTTPException: If the report is not found or the exercise is not part
+            of its split, or if the set number is already taken in the workout
     """
-    with cursor_factory() as cursor:
+    idempotency_key = set_data.get("idempotency_key")
+    try:
+        with cursor_factory(user_id) as cursor:
+            cursor.execute(
+                INSERT_SET_REPORT,
+                {
+                    "exercise_id": set_data["exercise_id"],
+                    "execution_order": set_data["execution_order"],
+                    "set_number": set_data["set_number"],
+                    "reps": set_data["reps"],
+                    "weight": set_data["weight"],
+                    "notes": set_data.get("notes"),
+                    "idempotency_key": idempotency_key,
+                    "workout_report_id": workout_report_id,
+                    "user_id": user_id
+                }
+            )
+            report = cursor.fetchone()
+            if report is not None:
+                record_leaderboard_sets(cursor, user_id, [report[1:]])
+                return True
+            if idempotency_key is not None:
+                # Replay of an unchanged set: nothing was written.
+                cursor.execute(
+                    GET_SET_REPORT_BY_KEY,
+                    (idempotency_key, workout_report_id, user_id)
+                )
+                if cursor.fetchone() is not None:
+                    return True
+    except UniqueViolation:
+        raise HTTPException(
+            HTTPStatus.CONFLICT,
+            detail="Set number already taken in this workout"
+        )
+    raise HTTPException(
+        HTTPStatus.NOT_FOUND,
+        detail="Workout report not found or exercise not in its split"
+    )
+
+
+def _set_report_from_row(report: tuple) -> dict:
+    return {
+        "workout_report_id": report[0],
+        "exercise_id": report[1],
+        "split": report[2],
+        "workout_plan_id": report[3],
+        "execution_order": report[4],
+        "set_number": report[5],
+        "reps": report[6],
+        "weight": report[7],
+        "notes": report[8],
+        "report_date": report[9]
+    }
+
+
+def log_next_set(
+    workout_report_id: int,
+    exercise_id: int,
+    user_id: int,
+    reps: str,
+    weight: int,
+    notes: Optional[str] = None,
+    execution_order: Optional[int] = None,
+    idempotency_key: Optional[str] = None
+) -> dict:
+    """
+    Log a set, numbering it after the sets already logged for the exercise
+    in the workout.
+
+    The split, plan and execution order are taken from the report's split,
+    so clients do not need to read the history first. The report row is
+    locked while the set is numbered, so concurrent calls for the same
+    report get consecutive numbers. Repeating the call with the same
+    idempotency_key returns the set stored by the first call.
+
+    Args:
+        workout_report_id (int): ID of the workout report
+        exercise_id (int): ID of the exercise
+        user_id (int): ID of the user owning the report
+        reps (str): Repetitions performed
+        weight (int): Weight used
+        notes (str, optional): Notes about the set
+        execution_order (int, optional): Position of the exercise in the
+            split, needed only when it appears more than once
+        idempotency_key (str, optional): Client-generated key of the set
+
+    Returns:
+        dict: The stored set report
+
+    Raises:
+        HTTPException: If the report is not found or the exercise is not part
+            of its split, or if the number was taken by a set stored with an
+            explicit number
+    """
+    params = {
+        "workout_report_id": workout_report_id,
+        "exercise_id": exercise_id,
+        "user_id": user_id,
+        "reps": reps,
+        "weight": weight,
+        "notes": notes,
+        "execution_order": execution_order,
+        "idempotency_key": idempotency_key
+    }
+    try:
+        with cursor_factory(user_id) as cursor:
+            cursor.execute(LOCK_WORKOUT_REPORT, params)
+            report = None
+            if cursor.fetchone() is not None:
+                cursor.execute(LOG_NEXT_SET, params)
+                report = cursor.fetchone()
+                if report is not None:
+                    record_leaderboard_sets(
+                        cursor, user_id, [(report[1], report[9])]
+                    )
+                elif idempotency_key is not None:
+                    cursor.execute(
+                        GET_SET_REPORT_BY_KEY,
+                        (idempotency_key, workout_report_id, user_id)
+                    )
+                    report = cursor.fetchone()
+    except UniqueViolation:
+        raise HTTPException(
+            HTTPStatus.CONFLICT,
+            detail="Set number already taken, try again"
+        )
+    if report is None:
+        raise HTTPException(
+            HTTPStatus.NOT_FOUND,
+            detail="Workout report not found or exercise not in its split"
+        )
+    return _set_report_from_row(report)
+
+
+def _dedupe_by_key(rows: List[dict]) -> List[dict]:
+    # ON CONFLICT cannot touch the same row twice in one statement, so only
+    # the last write of each key is sent.
+    deduped = {}
+    for row in rows:
+        if not row.get("idempotency_key"):
+            raise HTTPException(
+                HTTPStatus.BAD_REQUEST,
+                detail="Every replayed write needs an idempotency_key"
+            )
+        deduped[str(row["idempotency_key"])] = row
+    return list(deduped.values())
+
+
+def replay_workout_reports(user_id: int, reports: List[dict]) -> dict:
+    """
+    Store workout reports and their sets queued by an offline client.
+
+    Every report and set carries a client-generated idempotency_key, so the
+    whole batch can be replayed any number of times: reports already stored
+    are reused as they are and sets already stored are updated when their
+    values changed. All rows are written in two statements within one
+    transaction. A set that cannot be stored, because its exercise is not
+    part of the report's split at its execution order, its number is already
+    taken in the workout, its key belongs to another workout or its report
+    was not stored, is reported back instead of failing the batch.
+
+    Args:
+        user_id (int): ID of the user owning the reports
+        reports (List[dict]): Reports with workout_plan_id, report_date,
+            split, idempotency_key and a "sets" list of dicts with
+            exercise_id, execution_order, set_number, reps, weight, notes
+            and idempotency_key
+
+    Returns:
+        dict: "workout_reports" maps each stored report key to its
+            workout_report_id, "set_reports" lists the stored set keys and
+            "rejected_sets" the keys of sets that were not stored
+
+    Raises:
+        HTTPException: If a report or set has no idempotency_key
+    """
+    reports = _dedupe_by_key(reports)
+    if not reports:
+        return {"workout_reports": {}, "set_reports": [], "rejected_sets": []}
+
+    with cursor_factory(user_id) as cursor:
         cursor.execute(
-            INSERT_SET_REPORT,
+            UPSERT_WORKOUT_REPORTS,
             (
-                workout_report_id,
-                set_data["exercise_id"],
-                set_data["split"],
-                set_data["workout_plan_id"],
-                set_data["execution_order"],
-                set_data["set_number"],
-                set_data["reps"],
-                set_data["weight"],
-                set_data.get("notes")
+                [report["workout_plan_id"] for report in reports],
+                [report["report_date"] for report in reports],
+                [report["split"] for report in reports],
+                [str(report["idempotency_key"]) for report in reports],
+                user_id
             )
         )
-        if cursor.fetchone() is None:
-            raise HTTPException(
-                HTTPStatus.INTERNAL_SERVER_ERROR,
-                detail="Failed to create set report"
+        stored = {key: (report_id, day) for key, report_id, day in cursor.fetchall()}
+        # In date order, so consecutive days extend the streak in place.
+        for day in sorted({day for _, day in stored.values()}):
+            record_training_day(cursor, user_id, day)
+
+        sets = _dedupe_by_key([
+            dict(set_data, report_key=str(report["idempotency_key"]))
+            for report in reports
+            for set_data in report.get("sets", [])
+        ])
+        keys = [str(set_data["idempotency_key"]) for set_data in sets]
+        sets = [set_data for set_data in sets if set_data["report_key"] in stored]
+
+        stored_sets = []
+        if sets:
+            cursor.execute(
+                UPSERT_SET_REPORTS,
+                (
+                    [stored[s["report_key"]][0] for s in sets],
+                    [stored[s["report_key"]][1] for s in sets],
+                    [s["exercise_id"] for s in sets],
+                    [s["execution_order"] for s in sets],
+                    [s["set_number"] for s in sets],
+                    [s["reps"] for s in sets],
+                    [s["weight"] for s in sets],
+                    [s.get("notes") for s in sets],
+                    [str(s["idempotency_key"]) for s in sets],
+                    user_id
+                )
             )
-        return True
+            rows = cursor.fetchall()
+            stored_sets = [row[0] for row in rows]
+            record_leaderboard_sets(
+                cursor, user_id, [row[1:3] for row in rows if row[3]]
+            )
+
+        stored_keys = set(stored_sets)
+        return {
+            "workout_reports": {
+                key: report_id for key, (report_id, _) in stored.items()
+            },
+            "set_reports": stored_sets,
+            "rejected_sets": [key for key in keys if key not in stored_keys]
+        }
 
 
 def get_set_reports_by_workout(workout_report_id: int, user_id: int) -> List[dict]:
@@ -174,8 +453,11 @@ def get_set_reports_by_workout(workout_report_id: int, user_id: int) -> List[dic
     Returns:
         List[dict]: List of set reports
     """
-    with cursor_factory() as cursor:
-        cursor.execute(GET_SET_REPORTS_BY_WORKOUT, (workout_report_id, user_id))
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            GET_SET_REPORTS_BY_WORKOUT,
+            (workout_report_id, workout_report_id, user_id)
+        )
         return [
             {
                 "workout_report_id": report[0],
@@ -198,46 +480,182 @@ def get_set_reports_by_exercise(
     exercise_id: int,
     user_id: int,
     limit: int = 10,
-    offset: int = 0
+    offset: int = 0,
+    since: Optional[date] = None
 ) -> List[dict]:
     """
     Get exercise history with pagination.
 
+    Pages reaching past the sets still in the database continue into the
+    user's Parquet archive.
+
     Args:
         exercise_id (int): ID of the exercise
         user_id (int): ID of the user owning the exercise
         limit (int): Maximum number of reports to return
         offset (int): Number of reports to skip
+        since (date, optional): Only return sets from this date on, which
+            lets the database skip older monthly partitions
 
     Returns:
         List[dict]: List of set reports for the exercise
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(
             GET_SET_REPORTS_BY_EXERCISE,
-            (exercise_id, user_id, limit, offset)
+            (exercise_id, user_id, since, limit, offset)
         )
-        return [
+        reports = [_set_report_from_row(report) for report in cursor.fetchall()]
+        if len(reports) == limit:
+            return reports
+
+        archive_offset = 0
+        if not reports:
+            cursor.execute(
+                COUNT_SET_REPORTS_BY_EXERCISE, (exercise_id, user_id, since)
+            )
+            archive_offset = max(offset - cursor.fetchone()[0], 0)
+
+    manifest = get_archive_manifest(user_id)
+    boundary = archive_boundary(manifest)
+    if boundary is None or (since and since >= boundary):
+        return reports
+
+    archived = read_archived_set_reports(user_id, exercise_id, since, manifest)
+    remaining = limit - len(reports)
+    return reports + archived[archive_offset:archive_offset + remaining]
+
+
+def export_set_reports(user_id: int, since: Optional[date] = None) -> List[dict]:
+    """
+    Export every set report of a user, including archived ones, newest first.
+
+    Args:
+        user_id (int): ID of the user
+        since (date, optional): Only export sets from this date on
+
+    Returns:
+        List[dict]: List of set reports
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_SET_REPORTS_BY_USER, (user_id, since))
+        reports = [_set_report_from_row(report) for report in cursor.fetchall()]
+    return reports + read_archived_set_reports(user_id, since=since)
+
+
+def search_set_notes(
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    since: Optional[date] = None
+) -> List[dict]:
+    """
+    Full-text search over the notes of a user's sets.
+
+    The query accepts web search syntax: quoted phrases, "or" and "-word".
+    Matching ignores case and accents but does not stem words.
+    Sets moved to the report archive are not searched.
+
+    Args:
+        user_id (int): ID of the user
+        query (str): Text to search for
+        limit (int): Maximum number of sets to return
+        offset (int): Number of sets to skip
+        since (date, optional): Only search sets from this date on
+
+    Returns:
+        List[dict]: Matching set reports, best match first, with the
+            exercise name, the "rank" and a "headline" marking the matches
+    """
+    if not query.strip():
+        return []
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            SEARCH_SET_NOTES,
             {
-                "workout_report_id": report[0],
-                "exercise_id": report[1],
-                "split": report[2],
-                "workout_plan_id": report[3],
-                "execution_order": report[4],
-                "set_number": report[5],
-                "reps": report[6],
-                "weight": report[7],
-                "notes": report[8],
-                "report_date": report[9]
+                "query": query,
+                "user_id": user_id,
+                "since": since,
+                "limit": limit,
+                "offset": offset
             }
+        )
+        return [
+            dict(
+                _set_report_from_row(report),
+                exercise_name=report[10],
+                rank=report[11],
+                headline=report[12]
+            )
             for report in cursor.fetchall()
         ]
 
 
+def compare_with_previous_session(workout_report_id: int, user_id: int) -> dict:
+    """
+    Compare each exercise of a workout with the previous session of the same
+    plan and split.
+
+    Args:
+        workout_report_id (int): ID of the workout report
+        user_id (int): ID of the user owning the report
+
+    Returns:
+        dict: The report and previous report IDs, the previous report date
+            and "exercises", each with its sets, reps, top weight and volume
+            (weight x reps) in both sessions and the differences. Exercises
+            only done last time have None as current values.
+
+    Raises:
+        HTTPException: If the report is not found
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            COMPARE_WITH_PREVIOUS_SESSION,
+            {"workout_report_id": workout_report_id, "user_id": user_id}
+        )
+        rows = cursor.fetchall()
+    if not rows:
+        raise HTTPException(
+            HTTPStatus.NOT_FOUND,
+            detail="Workout report not found"
+        )
+
+    return {
+        "workout_report_id": rows[0][0],
+        "previous_workout_report_id": rows[0][1],
+        "previous_report_date": rows[0][2],
+        "exercises": [
+            {
+                "exercise_id": row[3],
+                "exercise_name": row[4],
+                "execution_order": row[5],
+                "sets": row[6],
+                "reps": row[7],
+                "top_weight": row[8],
+                "volume": row[9],
+                "previous_sets": row[10],
+                "previous_reps": row[11],
+                "previous_top_weight": row[12],
+                "previous_volume": row[13],
+                "sets_delta": row[14],
+                "reps_delta": row[15],
+                "top_weight_delta": row[16],
+                "volume_delta": row[17]
+            }
+            for row in rows
+            if row[3] is not None
+        ]
+    }
+
+
 def delete_set_report(workout_report_id: int, user_id: int) -> bool:
     """
     Delete set reports for a workout.
 
+    Sets already moved to the archive are removed from its files.
+
     Args:
         workout_report_id (int): ID of the workout report
         user_id (int): ID of the user owning the report
@@ -248,11 +666,15 @@ def delete_set_report(workout_report_id: int, user_id: int) -> bool:
     Raises:
         HTTPException: If deletion fails
     """
-    with cursor_factory() as cursor:
-        cursor.execute(DELETE_SET_REPORT, (workout_report_id, user_id))
-        if cursor.fetchone() is None:
-            raise HTTPException(
-                HTTPStatus.INTERNAL_SERVER_ERROR,
-                detail="Failed to delete set report"
-            )
-        return True
\ No newline at end of file
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            DELETE_SET_REPORT,
+            (workout_report_id, workout_report_id, user_id)
+        )
+        deleted = cursor.fetchone() is not None
+    if not deleted and not prune_user_archive(user_id, [workout_report_id]):
+        raise HTTPException(
+            HTTPStatus.INTERNAL_SERVER_ERROR,
+            detail="Failed to delete set report"
+        )
+    return True
\ No newline at end of file
@@ -0,0 +1,323 @@
+"""
+User-id based sharding of the repo layer.
+
+Every user-owned row (plans, splits, reports, custom catalog entries) lives on
+exactly one shard, chosen by the user's ID. The shared database keeps the
+``user`` table, the default catalog (rows with ``user_id IS NULL``) and the
+``shard_assignment`` table with per-user overrides written by the rebalance
+tool. Shards also carry a copy of the default catalog so foreign keys from
+user rows to default muscles, equipment and exercises stay valid.
+
+Identity columns must be provisioned with interleaved sequences on each shard
+(``START WITH <shard index> INCREMENT BY <shard count>``) so IDs remain
+unique across shards and rows can be moved without renumbering.
+"""
+
+import argparse
+import hashlib
+import time
+from bisect import bisect_right
+from http.client import SERVICE_UNAVAILABLE
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from sql.sharding_sql import *
+from sql.sync_sql import DELETE_USER_TOMBSTONES, SKIP_TOMBSTONES
+
+SHARED_DATABASE = {
+    "user": "your_user",
+    "password": "your_password",
+    "database": "your_database",
+    "host": "localhost",
+    "port": 5432,
+}
+
+SHARDS = {
+    "shard_0": SHARED_DATABASE,
+}
+
+# Upper bounds (exclusive) of user_id ranges when using the "range" strategy.
+SHARD_RANGES: List[Tuple[int, str]] = []
+
+SHARD_STRATEGY = "hash"
+
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+
+# Seconds a process may serve a stale shard assignment before reloading it.
+ASSIGNMENT_TTL = 30
+
+ACTIVE = "active"
+MOVING = "moving"
+
+
+class ShardMap:
+    """
+    Maps user IDs to shard names by hash or by ID range.
+
+    Args:
+        shard_names (list): Names of the available shards.
+        strategy (str): Either "hash" or "range".
+        ranges (list): Sorted (upper_bound, shard_name) pairs, required for
+            the "range" strategy. The last bound should cover every ID.
+    """
+
+    def __init__(self, shard_names: List[str], strategy: str = "hash", ranges=None):
+        if strategy not in ("hash", "range"):
+            raise ValueError(f"Unknown sharding strategy: {strategy}")
+        if strategy == "range" and not ranges:
+            raise ValueError("The range strategy requires shard ranges")
+
+        self.shard_names = sorted(shard_names)
+        self.strategy = strategy
+        self.bounds = [bound for bound, _ in ranges or ()]
+        self.range_shards = [name for _, name in ranges or ()]
+
+    def shard_for(self, user_id: int) -> str:
+        """
+        Resolve the shard holding a user's data.
+
+        Args:
+            user_id (int): ID of the user
+
+        Returns:
+            str: Name of the shard
+        """
+        if self.strategy == "range":
+            index = bisect_right(self.bounds, user_id)
+            if index == len(self.range_shards):
+                raise ValueError(f"No shard range covers user {user_id}")
+            return self.range_shards[index]
+
+        digest = hashlib.md5(str(user_id).encode()).digest()
+        bucket = int.from_bytes(digest[:8], "big") % len(self.shard_names)
+        return self.shard_names[bucket]
+
+
+class ShardRouter:
+    """
+    Selects the connection pool to use for a given user.
+
+    Pools are created lazily, one per database. Assignments written by the
+    rebalance tool take precedence over the shard map and are reloaded from
+    the shared database every ``ASSIGNMENT_TTL`` seconds.
+    """
+
+    def __init__(self, shared: dict, shards: Dict[str, dict], shard_map: ShardMap):
+        self.shared = shared
+        self.shards = shards
+        self.shard_map = shard_map
+        self._pools: Dict[str, ThreadedConnectionPool] = {}
+        self._assignments: Dict[int, Tuple[str, str]] = {}
+        self._assignments_loaded_at = 0.0
+        self._lock = Lock()
+
+    def _pool(self, name: Optional[str]) -> ThreadedConnectionPool:
+        key = name or "__shared__"
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    settings = self.shards[name] if name else self.shared
+                    pool = ThreadedConnectionPool(
+                        POOL_MIN_CONNECTIONS, POOL_MAX_CONNECTIONS, **settings
+                    )
+                    self._pools[key] = pool
+        return pool
+
+    def _load_assignments(self):
+        if time.monotonic() - self._assignments_loaded_at < ASSIGNMENT_TTL:
+            return
+        pool = self._pool(None)
+        connection = pool.getconn()
+        try:
+            with connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(GET_SHARD_ASSIGNMENTS)
+                    assignments = {
+                        row[0]: (row[1], row[2]) for row in cursor.fetchall()
+                    }
+        finally:
+            pool.putconn(connection)
+        self._assignments = assignments
+        self._assignments_loaded_at = time.monotonic()
+
+    def shard_for(self, user_id: int) -> str:
+        """
+        Resolve the shard currently holding a user's data.
+
+        Args:
+            user_id (int): ID of the user
+
+        Returns:
+            str: Name of the shard
+
+        Raises:
+            HTTPException: If the user is being moved between shards
+        """
+        self._load_assignments()
+        assignment = self._assignments.get(user_id)
+        if assignment is None:
+            return self.shard_map.shard_for(user_id)
+
+        shard_name, status = assignment
+        if status == MOVING:
+            raise HTTPException(
+                SERVICE_UNAVAILABLE,
+                detail="User data is being moved, retry shortly",
+            )
+        return shard_name
+
+    def pool_for(self, user_id: Optional[int] = None) -> ThreadedConnectionPool:
+        """
+        Get the connection pool for a user, or the shared pool.
+
+        Args:
+            user_id (int, optional): ID of the user whose data is accessed.
+                None selects the shared database.
+
+        Returns:
+            ThreadedConnectionPool: The pool to borrow a connection from
+        """
+        if user_id is None:
+            return self._pool(None)
+        return self._pool(self.shard_for(user_id))
+
+    def shard_pool(self, shard_name: str) -> ThreadedConnectionPool:
+        """
+        Get the connection pool of a shard by name.
+
+        Args:
+            shard_name (str): Name of the shard
+
+        Returns:
+            ThreadedConnectionPool: The shard's pool
+        """
+        if shard_name not in self.shards:
+            raise ValueError(f"Unknown shard: {shard_name}")
+        return self._pool(shard_name)
+
+    def forget_assignments(self):
+        """Force the next lookup to reload assignments from the database."""
+        self._assignments_loaded_at = 0.0
+
+    def reset_pools(self):
+        """
+        Drop every pool without closing its connections.
+
+        Must be called in child processes, which cannot share the parent's
+        sockets.
+        """
+        with self._lock:
+            self._pools = {}
+        self.forget_assignments()
+
+
+shard_router = ShardRouter(
+    SHARED_DATABASE, SHARDS, ShardMap(list(SHARDS), SHARD_STRATEGY, SHARD_RANGES)
+)
+
+
+def _write_assignment(user_id: int, shard_name: str, status: str):
+    pool = shard_router.pool_for(None)
+    connection = pool.getconn()
+    try:
+        with connection:
+            with connection.cursor() as cursor:
+                cursor.execute(UPSERT_SHARD_ASSIGNMENT, (user_id, shard_name, status))
+    finally:
+        pool.putconn(connection)
+    shard_router.forget_assignments()
+
+
+def rebalance_user(
+    user_id: int,
+    target_shard: str,
+    settle_seconds: float = ASSIGNMENT_TTL
+) -> int:
+    """
+    Move every row of a user to another shard.
+
+    The user is marked as moving (requests get 503) and, once every process
+    has seen the mark, rows are copied to the target in one transaction, the
+    assignment is switched and the source rows are removed.
+
+    Args:
+        user_id (int): ID of the user to move
+        target_shard (str): Name of the destination shard
+        settle_seconds (float): Time to wait for other processes to reload
+            assignments between steps
+
+    Returns:
+        int: Number of rows moved
+    """
+    source_shard = shard_router.shard_for(user_id)
+    if source_shard == target_shard:
+        return 0
+
+    source_pool = shard_router.shard_pool(source_shard)
+    target_pool = shard_router.shard_pool(target_shard)
+
+    _write_assignment(user_id, source_shard, MOVING)
+    time.sleep(settle_seconds)
+
+    moved = 0
+    source = source_pool.getconn()
+    target = target_pool.getconn()
+    try:
+        try:
+            with source, target:
+                with source.cursor() as read, target.cursor() as write:
+                    for table, columns, predicate in USER_DATA_TABLES:
+                        read.execute(
+                            f"SELECT {columns} FROM {table} WHERE {predicate}",
+                            (user_id,),
+                        )
+                        rows = read.fetchall()
+                        if rows:
+                            execute_values(
+                                write,
+                                f"INSERT INTO {table} ({columns}) VALUES %s",
+                                rows,
+                            )
+                        moved += len(rows)
+        except Exception:
+            _write_assignment(user_id, source_shard, ACTIVE)
+            raise
+
+        _write_assignment(user_id, target_shard, ACTIVE)
+        time.sleep(settle_seconds)
+
+        with source:
+            with source.cursor() as cursor:
+                # Tokens issued by the source shard force a full sync, so its
+                # tombstones are dropped rather than moved.
+                cursor.execute(SKIP_TOMBSTONES)
+                for table, _, predicate in reversed(USER_DATA_TABLES):
+                    cursor.execute(f"DELETE FROM {table} WHERE {predicate}", (user_id,))
+                cursor.execute(DELETE_USER_TOMBSTONES, (user_id,))
+    finally:
+        source_pool.putconn(source)
+        target_pool.putconn(target)
+
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move a user between shards")
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("target_shard", choices=sorted(SHARDS))
+    parser.add_argument("--settle-seconds", type=float, default=ASSIGNMENT_TTL)
+    args = parser.parse_args()
+
+    moved = rebalance_user(args.user_id, args.target_shard, args.settle_seconds)
+    print(f"Moved {moved} rows of user {args.user_id} to {args.target_shard}")
+
+
+if __name__ == "__main__":
+    main()
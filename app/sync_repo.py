@@ -0,0 +1,182 @@
+import time
+from typing import Optional
+from app.sharding import shard_router
+from app.utils import cursor_factory, shard_cursor_factory
+from sql.sync_sql import *
+
+# Deleted rows are reported for this long; clients that have not synced
+# within it get a full snapshot instead.
+TOMBSTONE_RETENTION_DAYS = 30
+
+
+def _parse_token(token: Optional[str], shard_name: str) -> Optional[str]:
+    """
+    Extract the transaction horizon from a sync token.
+
+    Tokens look like "<shard>:<xid>:<issued epoch>". Transaction IDs only
+    make sense on the shard that issued them and tombstones are only kept
+    for TOMBSTONE_RETENTION_DAYS, so tokens from another shard (the user was
+    moved), older ones or malformed ones yield None, meaning a full sync.
+    """
+    try:
+        token_shard, horizon, issued = token.split(":")
+        issued = float(issued)
+        int(horizon)
+    except (AttributeError, ValueError):
+        return None
+
+    if token_shard != shard_name:
+        return None
+    if time.time() - issued > TOMBSTONE_RETENTION_DAYS * 86_400:
+        return None
+    return horizon
+
+
+def get_changes_since(user_id: int, token: Optional[str] = None) -> dict:
+    """
+    Get the plans, splits, exercises and reports of a user changed since a
+    previous sync.
+
+    Args:
+        user_id (int): ID of the user
+        token (str, optional): Token returned by the previous call; omit it
+            for a first (full) sync
+
+    Returns:
+        dict: "token" to send on the next call, "full_sync" telling whether
+            the client must replace its local copy, the changed rows of each
+            table and "deleted", a list of {"table", "key"} entries (always
+            empty on a full sync)
+    """
+    shard_name = shard_router.shard_for(user_id)
+    horizon = _parse_token(token, shard_name)
+    full_sync = horizon is None
+    since = "0" if full_sync else horizon
+
+    with cursor_factory(user_id) as cursor:
+        # Taken before reading, so changes committed while reading are
+        # returned again on the next call rather than missed.
+        cursor.execute(GET_SYNC_HORIZON)
+        new_token = f"{shard_name}:{cursor.fetchone()[0]}:{time.time():.0f}"
+
+        cursor.execute(GET_CHANGED_WORKOUT_PLANS, (user_id, since))
+        workout_plans = [
+            {
+                "workout_plan_id": plan[0],
+                "user_id": plan[1],
+                "workout_plan_name": plan[2],
+                "workout_plan_goal": plan[3],
+                "active": plan[4],
+                "updated_at": plan[5]
+            }
+            for plan in cursor.fetchall()
+        ]
+
+        cursor.execute(GET_CHANGED_WORKOUT_SPLITS, (user_id, since))
+        workout_splits = [
+            {
+                "split": split[0],
+                "workout_plan_id": split[1],
+                "active": split[2],
+                "updated_at": split[3]
+            }
+            for split in cursor.fetchall()
+        ]
+
+        cursor.execute(GET_CHANGED_SPLIT_EXERCISES, (user_id, since))
+        split_exercises = [
+            {
+                "workout_plan_id": ex[0],
+                "split": ex[1],
+                "exercise_id": ex[2],
+                "execution_order": ex[3],
+                "sets": ex[4],
+                "reps": ex[5],
+                "advanced_technique": ex[6],
+                "rest_time": ex[7],
+                "active": ex[8],
+                "updated_at": ex[9]
+            }
+            for ex in cursor.fetchall()
+        ]
+
+        cursor.execute(GET_CHANGED_EXERCISES, (user_id, since))
+        exercises = [
+            {
+                "exercise_id": ex[0],
+                "user_id": ex[1],
+                "exercise_name": ex[2],
+                "description": ex[3],
+                "active": ex[4],
+                "updated_at": ex[5]
+            }
+            for ex in cursor.fetchall()
+        ]
+
+        cursor.execute(GET_CHANGED_WORKOUT_REPORTS, (user_id, since))
+        workout_reports = [
+            {
+                "workout_report_id": report[0],
+                "workout_plan_id": report[1],
+                "report_date": report[2],
+                "split": report[3],
+                "updated_at": report[4]
+            }
+            for report in cursor.fetchall()
+        ]
+
+        cursor.execute(GET_CHANGED_SET_REPORTS, (user_id, since))
+        set_reports = [
+            {
+                "workout_report_id": report[0],
+                "exercise_id": report[1],
+                "split": report[2],
+                "workout_plan_id": report[3],
+                "execution_order": report[4],
+                "set_number": report[5],
+                "reps": report[6],
+                "weight": report[7],
+                "notes": report[8],
+                "report_date": report[9],
+                "updated_at": report[10]
+            }
+            for report in cursor.fetchall()
+        ]
+
+        deleted = []
+        if not full_sync:
+            cursor.execute(GET_TOMBSTONES_SINCE, (user_id, since))
+            deleted = [
+                {"table": table_name, "key": row_key}
+                for table_name, row_key in cursor.fetchall()
+            ]
+
+    return {
+        "token": new_token,
+        "full_sync": full_sync,
+        "workout_plans": workout_plans,
+        "workout_splits": workout_splits,
+        "split_exercises": split_exercises,
+        "exercises": exercises,
+        "workout_reports": workout_reports,
+        "set_reports": set_reports,
+        "deleted": deleted
+    }
+
+
+def prune_tombstones(retention_days: int = TOMBSTONE_RETENTION_DAYS) -> int:
+    """
+    Remove tombstones older than the retention period on every shard.
+
+    Args:
+        retention_days (int): Age in days after which tombstones are removed
+
+    Returns:
+        int: Number of tombstones removed
+    """
+    pruned = 0
+    for shard_name in shard_router.shards:
+        with shard_cursor_factory(shard_name) as cursor:
+            cursor.execute(PRUNE_TOMBSTONES, (retention_days,))
+            pruned += cursor.rowcount
+    return pruned
@@ -1,15 +1,56 @@
 from sql.user_sql import *
+from app.cache import TTLCache
+from app.deletion_jobs import create_deletion_job, submit_deletion_job
+from app.password_hashing import (
+    hash_password,
+    hash_password_async,
+    needs_rehash,
+    verify_password,
+    verify_password_async,
+)
 from app.utils import cursor_factory
 from psycopg2.errors import IntegrityError
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from http.client import CONFLICT, INTERNAL_SERVER_ERROR
 from pydantic import EmailStr
 
+# User records keyed by ("email", email) and ("id", user_id). Absent users are
+# cached briefly so repeated lookups of unknown emails skip the database too.
+# Password hashes are never cached: each worker has its own cache, so a
+# changed password must not keep working in the others until the TTL expires.
+user_cache = TTLCache(max_size=10_000, ttl=300, negative_ttl=30)
+
+
+def _insert_user(user_data, password_hash: str) -> bool:
+    # Hashing happens before a pooled connection is borrowed, never inside.
+    with cursor_factory() as cursor:
+        try:
+            cursor.execute(
+                INSERT_USER,
+                (user_data["email"], user_data["name"], password_hash),
+            )
+
+            created_id = cursor.fetchone()[0]
+
+            if not created_id:
+                raise HTTPException(
+                    INTERNAL_SERVER_ERROR, detail="Failed to create user"
+                )
+        except IntegrityError as e:
+            raise HTTPException(CONFLICT, detail="User already exists") from e
+
+    # Dropped once committed, so no lookup can cache the user as absent again.
+    user_cache.invalidate(("email", user_data["email"]), ("id", created_id))
+    return True
+
 
 def create_user(user_data) -> bool:
     """
     Create a new user in the database.
 
+    The password is hashed before being stored.
+
     Args:
         user_data (dict): A dictionary containing user information.
 
@@ -20,30 +61,39 @@ def create_user(user_data) -> bool:
         HTTPException: If the user already exists or if the creation fails.
     """
 
+    return _insert_user(user_data, hash_password(user_data["password"]))
+
+
+async def create_user_async(user_data) -> bool:
+    """Awaitable version of ``create_user``, for use in coroutines."""
+
+    password_hash = await hash_password_async(user_data["password"])
+    return await run_in_threadpool(_insert_user, user_data, password_hash)
+
+
+def _update_password(email: EmailStr, password_hash: str) -> bool:
     with cursor_factory() as cursor:
         try:
-            cursor.execute(
-                INSERT_USER,
-                user_data["email"],
-                user_data["name"],
-                user_data["password"],
-            )
+            cursor.execute(UPDATE_USER_PASSWORD, (password_hash, email))
 
-            created_id = cursor.fetchone()[0]
+            updated = cursor.fetchone()
 
-            if not created_id:
+            if not updated:
                 raise HTTPException(
-                    INTERNAL_SERVER_ERROR, detail="Failed to create user"
+                    INTERNAL_SERVER_ERROR, detail="Failed to update user password"
                 )
-            return True
         except IntegrityError as e:
-            raise HTTPException(CONFLICT, detail="User already exists") from e
+            raise HTTPException(CONFLICT, detail="User does not exist") from e
+
+    return True
 
 
-def change_user_password(email: EmailStr, new_password: EmailStr) -> bool:
+def change_user_password(email: EmailStr, new_password: str) -> bool:
     """
     Change the password of an existing user.
 
+    The new password is hashed before being stored.
+
     Args:
         email (str): The email of the user whose password is to be changed.
         new_password (str): The new password for the user.
@@ -55,64 +105,139 @@ def change_user_password(email: EmailStr, new_password: EmailStr) -> bool:
         HTTPException: If the user does not exist or if the update fails.
     """
 
+    return _update_password(email, hash_password(new_password))
+
+
+async def change_user_password_async(email: EmailStr, new_password: str) -> bool:
+    """Awaitable version of ``change_user_password``, for use in coroutines."""
+
+    password_hash = await hash_password_async(new_password)
+    return await run_in_threadpool(_update_password, email, password_hash)
+
+
+def _user_from_row(user) -> dict:
+    return {
+        "id": user[0],
+        "email": user[1],
+        "name": user[2],
+    }
+
+
+def _load_user(query: str, value) -> dict:
     with cursor_factory() as cursor:
-        try:
-            cursor.execute(UPDATE_USER_PASSWORD, new_password, email)
+        cursor.execute(query, (value,))
+        user = cursor.fetchone()
+        return _user_from_row(user) if user else None
 
-            updated = cursor.fetchone()[0]
 
-            if not updated:
-                raise HTTPException(
-                    INTERNAL_SERVER_ERROR, detail="Failed to update user password"
-                )
-            return True
-        except IntegrityError as e:
-            raise HTTPException(CONFLICT, detail="User does not exist") from e
+def _load_credentials(email: EmailStr) -> tuple:
+    with cursor_factory() as cursor:
+        cursor.execute(GET_USER_CREDENTIALS, (email,))
+        return cursor.fetchone()
+
+
+def _cached_user(key: tuple, query: str) -> dict:
+    user = user_cache.get_or_load(key, lambda: _load_user(query, key[1]))
+    # Callers get their own copy so they cannot change the cached record.
+    return dict(user) if user else None
 
 
 def get_user_by_email(email: EmailStr) -> dict:
     """
     Retrieve a user by their email.
 
+    Lookups are served from ``user_cache`` when possible.
+
     Args:
         email (str): The email of the user to retrieve.
 
     Returns:
-        dict: A dictionary containing user information if found, None otherwise.
+        dict: The user's ID, email and name if found, None otherwise.
     """
 
-    with cursor_factory() as cursor:
-        cursor.execute(GET_USER_BY_EMAIL, (email,))
-        user = cursor.fetchone()
-        if user:
-            return {
-                "id": user[0],
-                "email": user[1],
-                "name": user[2],
-                "password": user[3],
-            }
-        return None
+    return _cached_user(("email", email), GET_USER_BY_EMAIL)
 
 
 def get_user_by_id(user_id: int) -> dict:
     """
     Retrieve a user by their ID.
 
+    Lookups are served from ``user_cache`` when possible.
+
     Args:
         user_id (int): The ID of the user to retrieve.
 
     Returns:
-        dict: A dictionary containing user information if found, None otherwise.
+        dict: The user's ID, email and name if found, None otherwise.
     """
 
-    with cursor_factory() as cursor:
-        cursor.execute(GET_USER_BY_ID, (user_id,))
-        user = cursor.fetchone()
-        if user:
-            return {
-                "id": user[0],
-                "email": user[1],
-                "name": user[2],
-                "password": user[3],
-            }
+    return _cached_user(("id", user_id), GET_USER_BY_ID)
+
+
+def authenticate_user(email: EmailStr, password: str) -> dict:
+    """
+    Check a user's credentials.
+
+    The stored hash is always read from the database, never from
+    ``user_cache``. Hashes created with outdated cost parameters, or passwords
+    stored before hashing was introduced, are upgraded after a successful
+    check.
+
+    Args:
+        email (str): The email of the user.
+        password (str): The plain text password to check.
+
+    Returns:
+        dict: A dictionary containing user information if the credentials are
+        valid, None otherwise.
+    """
+
+    user = _load_credentials(email)
+    if not user or not verify_password(password, user[3]):
         return None
+
+    if needs_rehash(user[3]):
+        change_user_password(email, password)
+    return _user_from_row(user)
+
+
+async def authenticate_user_async(email: EmailStr, password: str) -> dict:
+    """Awaitable version of ``authenticate_user``, for use in coroutines."""
+
+    user = await run_in_threadpool(_load_credentials, email)
+    if not user or not await verify_password_async(password, user[3]):
+        return None
+
+    if needs_rehash(user[3]):
+        await change_user_password_async(email, password)
+    return _user_from_row(user)
+
+
+def erase_user(user_id: int) -> int:
+    """
+    Erase a user's account and every row they own.
+
+    The data on the user's shard is removed in batches by a background
+    deletion job, which deletes the user record itself as its last step.
+
+    Args:
+        user_id (int): The ID of the user to erase.
+
+    Returns:
+        int: The ID of the deletion job, to follow its progress.
+    """
+
+    job_id = create_deletion_job(user_id, "user", user_id)
+    submit_deletion_job(job_id, user_id)
+    return job_id
+
+
+def get_user_cache_stats() -> dict:
+    """
+    Report hit and miss counters of the user lookup cache.
+
+    Returns:
+        dict: Cache size, hits, negative hits, misses, evictions and hit rate.
+    """
+
+    return user_cache.stats()
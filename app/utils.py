@@ -1,17 +1,98 @@
-from psycopg2 import connect
+from contextlib import contextmanager
+from typing import Optional
 
+from app.sharding import shard_router
+from sql.search_sql import SET_SIMILARITY_THRESHOLD
 
-def cursor_factory():
+
+@contextmanager
+def _borrow_cursor(pool):
+    connection = pool.getconn()
+    try:
+        with connection:
+            with connection.cursor() as cursor:
+                yield cursor
+    finally:
+        pool.putconn(connection, close=bool(connection.closed))
+
+
+def cursor_factory(user_id: Optional[int] = None):
+    """
+    Context manager lending a cursor from the database holding a user's data.
+
+    Args:
+        user_id (int, optional): ID of the user whose data will be accessed.
+            When omitted, the shared database (users and default catalog)
+            is used.
+
+    Returns:
+        A context manager yielding a psycopg2 cursor whose transaction is
+        committed when the block exits normally and rolled back on error.
+    """
+    return _borrow_cursor(shard_router.pool_for(user_id))
+
+
+def shard_cursor_factory(shard_name: str):
+    """
+    Context manager lending a cursor from a shard chosen by name.
+
+    Used by maintenance code that works on every shard rather than on the
+    data of one user.
+
+    Args:
+        shard_name (str): Name of the shard
+
+    Returns:
+        A context manager yielding a psycopg2 cursor, committed on success.
+    """
+    return _borrow_cursor(shard_router.shard_pool(shard_name))
+
+
+# Minimum word similarity for a typo-tolerant catalog search match.
+SEARCH_SIMILARITY_THRESHOLD = 0.4
+
+
+def search_catalog(
+    default_query: str, user_query: str, query: str, user_id: int, limit: int
+) -> list:
     """
-    Factory function to create a database connection.
+    Run a catalog name search over the default and the user's own rows.
+
+    The default catalog lives in the shared database and the user's rows on
+    its shard, so both are searched and the results merged by rank.
+
+    Args:
+        default_query (str): Search over the default catalog
+        user_query (str): Search over the user's rows
+        query (str): Text typed by the user
+        user_id (int): ID of the user
+        limit (int): Maximum number of results
 
     Returns:
-        psycopg2.cursor: A cursor to the PostgreSQL database.
+        list: Best rows, each ending with its prefix_match flag and score
     """
-    return connect(
-        user="your_user",
-        password="your_password",
-        database="your_database",
-        host="localhost",
-        port=5432,
-    ).cursor()
+    query = query.strip()
+    if not query:
+        return []
+
+    escaped = (
+        query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    )
+    params = {
+        "query": query,
+        "prefix": f"{escaped}%",
+        "contains": f"%{escaped}%",
+        "user_id": user_id,
+        "limit": limit,
+    }
+    rows = []
+    for owner, sql in ((None, default_query), (user_id, user_query)):
+        with cursor_factory(owner) as cursor:
+            cursor.execute(
+                SET_SIMILARITY_THRESHOLD, (str(SEARCH_SIMILARITY_THRESHOLD),)
+            )
+            cursor.execute(sql, params)
+            rows.extend(cursor.fetchall())
+
+    rows.sort(key=lambda row: (row[-2], row[-1]), reverse=True)
+    return rows[:limit]
@@ -1,10 +1,17 @@
+from collections import defaultdict
 from fastapi import HTTPException
 from http import HTTPStatus
-from psycopg2.errors import UniqueViolation
-from typing import List
-from utils import cursor_factory
+from psycopg2.errors import ForeignKeyViolation, UniqueViolation
+from typing import Dict, List, Optional
+from app.deletion_jobs import create_deletion_job, submit_deletion_job
+from app.plan_cache import notify_plan_changed
+from app.sharding import shard_router
+from app.utils import cursor_factory
 from sql.workout_plan_sql import *
 
+# Users receiving a template per transaction when cloning in batch.
+CLONE_BATCH_SIZE = 500
+
 
 def create_workout_plan(user_id: int, plan_data: dict) -> bool:
     """
@@ -20,7 +27,7 @@ def create_workout_plan(user_id: int, plan_data: dict) -> bool:
     Raises:
         HTTPException: If plan with same name already exists
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(
                 INSERT_WORKOUT_PLAN,
@@ -59,7 +66,7 @@ def update_workout_plan(workout_plan_id: int, user_id: int, plan_data: dict) ->
     Raises:
         HTTPException: If plan not found or update fails
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(
             UPDATE_WORKOUT_PLAN,
             (
@@ -75,6 +82,7 @@ def update_workout_plan(workout_plan_id: int, user_id: int, plan_data: dict) ->
                 HTTPStatus.INTERNAL_SERVER_ERROR,
                 detail="Failed to update workout plan"
             )
+        notify_plan_changed(cursor, user_id, workout_plan_id)
         return True
 
 
@@ -92,7 +100,7 @@ def get_workout_plan_by_id(workout_plan_id: int, user_id: int) -> dict:
     Raises:
         HTTPException: If plan not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_WORKOUT_PLAN_BY_ID, (workout_plan_id, user_id))
         plan = cursor.fetchone()
         if not plan:
@@ -125,7 +133,7 @@ def get_workout_plans_by_user(
     Returns:
         List[dict]: List of workout plans
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_ALL_WORKOUT_PLANS_BY_USER, (user_id, limit, offset))
         return [
             {
@@ -153,27 +161,54 @@ def delete_workout_plan(workout_plan_id: int, user_id: int) -> bool:
     Raises:
         HTTPException: If plan not found
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(DELETE_WORKOUT_PLAN, (workout_plan_id, user_id))
         if cursor.fetchone() is None:
             raise HTTPException(
                 HTTPStatus.INTERNAL_SERVER_ERROR,
                 detail="Failed to delete workout plan"
             )
+        notify_plan_changed(cursor, user_id, workout_plan_id)
         return True
 
 
-def get_workout_plan_splits(workout_plan_id: int) -> List[dict]:
+def schedule_workout_plan_deletion(workout_plan_id: int, user_id: int) -> int:
+    """
+    Delete a workout plan and its whole history in the background.
+
+    Reports, set reports, splits and split exercises are removed in small
+    batches before the plan itself; see app.deletion_jobs.
+
+    Args:
+        workout_plan_id (int): ID of the workout plan to delete
+        user_id (int): ID of the user owning the plan
+
+    Returns:
+        int: ID of the deletion job, to follow its progress
+
+    Raises:
+        HTTPException: If plan not found
+    """
+    job_id = create_deletion_job(user_id, "workout_plan", workout_plan_id)
+    submit_deletion_job(job_id, user_id)
+    return job_id
+
+
+def get_workout_plan_splits(
+    workout_plan_id: int,
+    user_id: int
+) -> List[dict]:
     """
     Get all splits for a workout plan.
 
     Args:
         workout_plan_id (int): ID of the workout plan
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         List[dict]: List of splits in the workout plan
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(GET_WORKOUT_PLAN_SPLITS, (workout_plan_id,))
         return [
             {
@@ -185,13 +220,18 @@ def get_workout_plan_splits(workout_plan_id: int) -> List[dict]:
         ]
 
 
-def add_split_to_workout_plan(workout_plan_id: int, split_data: dict) -> bool:
+def add_split_to_workout_plan(
+    workout_plan_id: int,
+    split_data: dict,
+    user_id: int
+) -> bool:
     """
     Add a new split to a workout plan.
 
     Args:
         workout_plan_id (int): ID of the workout plan
         split_data (dict): Split information
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         bool: True if split was added successfully
@@ -199,7 +239,7 @@ def add_split_to_workout_plan(workout_plan_id: int, split_data: dict) -> bool:
     Raises:
         HTTPException: If split already exists
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(
                 INSERT_WORKOUT_SPLIT,
@@ -214,6 +254,7 @@ def add_split_to_workout_plan(workout_plan_id: int, split_data: dict) -> bool:
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     detail="Failed to add split to workout plan"
                 )
+            notify_plan_changed(cursor, user_id, workout_plan_id)
             return True
         except UniqueViolation:
             raise HTTPException(
@@ -238,7 +279,7 @@ def get_split_exercises(
     Returns:
         List[dict]: List of exercises in the split
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         cursor.execute(
             GET_SPLIT_EXERCISES,
             (workout_plan_id, split, user_id)
@@ -261,13 +302,62 @@ def get_split_exercises(
         ]
 
 
-def add_exercise_to_split(workout_plan_id: int, exercise_data: dict) -> bool:
+def get_split_session_context(
+    workout_plan_id: int,
+    split: str,
+    user_id: int
+) -> List[dict]:
+    """
+    Get the exercises of a split together with the sets logged for each of
+    them the last time it was trained, in a single query.
+
+    Args:
+        workout_plan_id (int): ID of the workout plan
+        split (str): Name of the split
+        user_id (int): ID of the user owning the exercises
+
+    Returns:
+        List[dict]: Exercises in the split, each with "last_report_id",
+            "last_report_date" and "last_sets" (empty if never logged)
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            GET_SPLIT_SESSION_CONTEXT,
+            {"workout_plan_id": workout_plan_id, "split": split, "user_id": user_id}
+        )
+        return [
+            {
+                "workout_plan_id": ex[0],
+                "split": ex[1],
+                "exercise_id": ex[2],
+                "execution_order": ex[3],
+                "sets": ex[4],
+                "reps": ex[5],
+                "advanced_technique": ex[6],
+                "rest_time": ex[7],
+                "active": ex[8],
+                "exercise_name": ex[9],
+                "description": ex[10],
+                "last_report_id": ex[11],
+                "last_report_date": ex[12],
+                "last_sets": ex[13]
+            }
+            for ex in cursor.fetchall()
+        ]
+
+
+def add_exercise_to_split(
+    workout_plan_id: int,
+    exercise_data: dict,
+    user_id: int
+) -> bool:
     """
     Add an exercise to a split.
 
     Args:
         workout_plan_id (int): ID of the workout plan
         exercise_data (dict): Exercise information
+        user_id (int): ID of the owning user, used to select its shard
 
     Returns:
         bool: True if exercise was added successfully
@@ -275,7 +365,7 @@ def add_exercise_to_split(workout_plan_id: int, exercise_data: dict) -> bool:
     Raises:
         HTTPException: If exercise already exists in split
     """
-    with cursor_factory() as cursor:
+    with cursor_factory(user_id) as cursor:
         try:
             cursor.execute(
                 INSERT_SPLIT_EXERCISE,
@@ -296,9 +386,232 @@ def add_exercise_to_split(workout_plan_id: int, exercise_data: dict) -> bool:
                     HTTPStatus.INTERNAL_SERVER_ERROR,
                     detail="Failed to add exercise to split"
                 )
+            notify_plan_changed(cursor, user_id, workout_plan_id)
             return True
         except UniqueViolation:
             raise HTTPException(
                 HTTPStatus.CONFLICT,
                 detail="Exercise already exists in this split"
-            )
\ No newline at end of file
+            )
+
+
+def reorder_split_exercises(
+    workout_plan_id: int,
+    split: str,
+    ordering: List[int],
+    user_id: int
+) -> List[dict]:
+    """
+    Apply a full new execution order to the exercises of a split at once.
+
+    Args:
+        workout_plan_id (int): ID of the workout plan
+        split (str): Name of the split
+        ordering (List[int]): Exercise IDs of every active exercise in the
+            split, in their new order. An exercise listed more than once in
+            the split keeps the relative order of its occurrences.
+        user_id (int): ID of the user owning the plan
+
+    Returns:
+        List[dict]: Active exercises of the split with their new positions
+
+    Raises:
+        HTTPException: If the ordering does not list exactly the split's
+            active exercises
+    """
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(
+            REORDER_SPLIT_EXERCISES,
+            {
+                "workout_plan_id": workout_plan_id,
+                "split": split,
+                "ordering": list(ordering),
+                "user_id": user_id
+            }
+        )
+        reordered = cursor.fetchall()
+        if not reordered[0][0]:
+            raise HTTPException(
+                HTTPStatus.BAD_REQUEST,
+                detail="Ordering must list every active exercise of the split"
+            )
+        notify_plan_changed(cursor, user_id, workout_plan_id)
+        return [
+            {"exercise_id": ex[1], "execution_order": ex[2]}
+            for ex in reordered
+            if ex[1] is not None
+        ]
+
+
+def _read_plan_template(workout_plan_id: int, user_id: int) -> dict:
+    with cursor_factory(user_id) as cursor:
+        cursor.execute(GET_WORKOUT_PLAN_BY_ID, (workout_plan_id, user_id))
+        plan = cursor.fetchone()
+        if not plan:
+            raise HTTPException(
+                HTTPStatus.NOT_FOUND,
+                detail="Workout plan not found"
+            )
+        cursor.execute(GET_WORKOUT_PLAN_SPLITS, (workout_plan_id,))
+        splits = cursor.fetchall()
+        cursor.execute(GET_PLAN_SPLIT_EXERCISES, (workout_plan_id,))
+        exercises = cursor.fetchall()
+
+    return {
+        "workout_plan_goal": plan[3],
+        "active": plan[4],
+        "splits": [split[0] for split in splits],
+        "split_active": [split[2] for split in splits],
+        "exercise_splits": [ex[0] for ex in exercises],
+        "exercise_ids": [ex[1] for ex in exercises],
+        "execution_orders": [ex[2] for ex in exercises],
+        "sets": [ex[3] for ex in exercises],
+        "reps": [ex[4] for ex in exercises],
+        "advanced_techniques": [ex[5] for ex in exercises],
+        "rest_times": [ex[6] for ex in exercises],
+        "exercise_active": [ex[7] for ex in exercises],
+        "custom_exercise_owners": {ex[8] for ex in exercises} - {None}
+    }
+
+
+def _other_users_exercises_error() -> HTTPException:
+    # A copy would point at exercises the target user neither owns nor has
+    # on their shard, and would block the owner's erasure.
+    return HTTPException(
+        HTTPStatus.CONFLICT,
+        detail="Workout plan uses custom exercises of another user"
+    )
+
+
+def _clone_from_template(
+    template: dict,
+    target_user_ids: List[int],
+    new_name: str
+) -> Dict[int, int]:
+    target_user_ids = list(dict.fromkeys(target_user_ids))
+    if any(
+        template["custom_exercise_owners"] - {user_id}
+        for user_id in target_user_ids
+    ):
+        raise _other_users_exercises_error()
+
+    users_by_shard = defaultdict(list)
+    for user_id in target_user_ids:
+        users_by_shard[shard_router.shard_for(user_id)].append(user_id)
+
+    cloned = {}
+    for user_ids in users_by_shard.values():
+        for start in range(0, len(user_ids), CLONE_BATCH_SIZE):
+            batch = user_ids[start:start + CLONE_BATCH_SIZE]
+            with cursor_factory(batch[0]) as cursor:
+                try:
+                    cursor.execute(
+                        CLONE_WORKOUT_PLAN_TEMPLATE,
+                        {**template, "user_ids": batch, "new_name": new_name}
+                    )
+                except ForeignKeyViolation:
+                    raise HTTPException(
+                        HTTPStatus.CONFLICT,
+                        detail="Workout plan uses exercises unavailable to the user"
+                    )
+                cloned.update(dict(cursor.fetchall()))
+    return cloned
+
+
+def clone_workout_plan(
+    source_id: int,
+    target_user_id: int,
+    new_name: str,
+    source_user_id: Optional[int] = None
+) -> int:
+    """
+    Copy a workout plan with its splits and split exercises to a user.
+
+    The copy is made with INSERT ... SELECT in a single transaction. The
+    cloned split exercises keep referencing the same exercises, so a plan
+    using custom exercises can only be cloned by their owner.
+
+    Args:
+        source_id (int): ID of the workout plan to copy
+        target_user_id (int): ID of the user receiving the copy
+        new_name (str): Name of the new workout plan
+        source_user_id (int, optional): ID of the user owning the source
+            plan, defaults to target_user_id
+
+    Returns:
+        int: ID of the new workout plan
+
+    Raises:
+        HTTPException: If the source plan is not found, uses another user's
+            custom exercises or the target user already has a plan with that
+            name
+    """
+    if source_user_id is None:
+        source_user_id = target_user_id
+
+    if shard_router.shard_for(source_user_id) != shard_router.shard_for(target_user_id):
+        template = _read_plan_template(source_id, source_user_id)
+        cloned = _clone_from_template(template, [target_user_id], new_name)
+        if target_user_id not in cloned:
+            raise HTTPException(
+                HTTPStatus.CONFLICT,
+                detail="Workout plan with this name already exists"
+            )
+        return cloned[target_user_id]
+
+    with cursor_factory(target_user_id) as cursor:
+        cursor.execute(PLAN_USES_OTHER_USERS_EXERCISES, (source_id, target_user_id))
+        if cursor.fetchone()[0]:
+            raise _other_users_exercises_error()
+        try:
+            cursor.execute(
+                CLONE_WORKOUT_PLAN,
+                {
+                    "source_id": source_id,
+                    "source_user_id": source_user_id,
+                    "target_user_id": target_user_id,
+                    "new_name": new_name
+                }
+            )
+        except UniqueViolation:
+            raise HTTPException(
+                HTTPStatus.CONFLICT,
+                detail="Workout plan with this name already exists"
+            )
+        plan = cursor.fetchone()
+        if plan is None:
+            raise HTTPException(
+                HTTPStatus.NOT_FOUND,
+                detail="Workout plan not found"
+            )
+        return plan[0]
+
+
+def clone_workout_plan_to_users(
+    source_id: int,
+    source_user_id: int,
+    target_user_ids: List[int],
+    new_name: str
+) -> Dict[int, int]:
+    """
+    Push one workout plan template to many users.
+
+    The template is read once and written with one statement per shard and
+    batch of ``CLONE_BATCH_SIZE`` users, each in its own transaction.
+
+    Args:
+        source_id (int): ID of the workout plan to copy
+        source_user_id (int): ID of the user owning the source plan
+        target_user_ids (List[int]): IDs of the users receiving the copy
+        new_name (str): Name of the new workout plans
+
+    Returns:
+        Dict[int, int]: New workout plan ID by user ID. Users that already
+        had a plan with that name are left out.
+
+    Raises:
+        HTTPException: If the source plan is not found or uses custom
+            exercises of a user other than a target
+    """
+    template = _read_plan_template(source_id, source_user_id)
+    return _clone_from_template(template, target_user_ids, new_name)
@@ -71,12 +71,12 @@ INSERT INTO workout_split (split, workout_plan_id, active) VALUES
 ('Lower Body', 4, true);
 
 -- Workout Reports
-INSERT INTO workout_report (workout_plan_id, report_date, split) VALUES
-(1, '2025-06-01', 'Push'),
-(1, '2025-06-02', 'Pull'),
-(2, '2025-06-01', 'Legs'),
-(3, '2025-06-01', 'Upper Body'),
-(4, '2025-06-01', 'Lower Body');
+INSERT INTO workout_report (workout_report_id, workout_plan_id, report_date, split) VALUES
+(1, 1, '2025-06-01', 'Push'),
+(2, 1, '2025-06-02', 'Pull'),
+(3, 2, '2025-06-01', 'Legs'),
+(4, 3, '2025-06-01', 'Upper Body'),
+(5, 4, '2025-06-01', 'Lower Body');
 
 -- Split Exercises
 INSERT INTO split_exercise (workout_plan_id, split, exercise_id, execution_order, sets, reps, advanced_technique, rest_time, active) VALUES
@@ -87,9 +87,9 @@ INSERT INTO split_exercise (workout_plan_id, split, exercise_id, execution_order
 (4, 'Lower Body', 2, 1, 5, '5', 'Super Set', 180, true);
 
 -- Set Reports
-INSERT INTO set_report (workout_report_id, exercise_id, split, workout_plan_id, execution_order, set_number, reps, weight, notes) VALUES
-(1, 1, 'Push', 1, 1, 1, '10', 135, 'Felt strong'),
-(2, 5, 'Pull', 1, 1, 1, '8', 0, 'Body weight only'),
-(3, 2, 'Legs', 2, 1, 1, '12', 225, 'Good form'),
-(4, 4, 'Upper Body', 3, 1, 1, '15', 30, 'Light weight'),
-(5, 2, 'Lower Body', 4, 1, 1, '5', 315, 'New PR');
\ No newline at end of file
+INSERT INTO set_report (workout_report_id, report_date, exercise_id, split, workout_plan_id, execution_order, set_number, reps, weight, notes) VALUES
+(1, '2025-06-01', 1, 'Push', 1, 1, 1, '10', 135, 'Felt strong'),
+(2, '2025-06-02', 5, 'Pull', 1, 1, 1, '8', 0, 'Body weight only'),
+(3, '2025-06-01', 2, 'Legs', 2, 1, 1, '12', 225, 'Good form'),
+(4, '2025-06-01', 4, 'Upper Body', 3, 1, 1, '15', 30, 'Light weight'),
+(5, '2025-06-01', 2, 'Lower Body', 4, 1, 1, '5', 315, 'New PR');
\ No newline at end of file
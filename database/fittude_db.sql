@@ -1,3 +1,17 @@
+-- Used by the name search and full-text search indexes and generated columns.
+-- unaccent() is only STABLE because its dictionary can change; pinning the
+-- dictionary makes it safe to use in index expressions. btree_gin lets the
+-- notes index lead with a plain column.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE FUNCTION immutable_unaccent(TEXT) RETURNS TEXT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
+-- Only the shared database holds users; shards store user_id without a
+-- foreign key since the referenced row lives on another server.
 CREATE TABLE "user" (
     user_id     INTEGER         GENERATED BY DEFAULT AS IDENTITY,
     email       VARCHAR(100)    NOT NULL,
@@ -19,9 +33,6 @@ CREATE TABLE muscle_group (
     CONSTRAINT pk_muscle_group
         PRIMARY KEY (group_name),
 
-    CONSTRAINT fk_muscle_group_user
-        FOREIGN KEY (user_id) REFERENCES "user" (user_id),
-    
     CONSTRAINT uq_muscle_group_name
         UNIQUE (user_id, group_name)
 );
@@ -36,9 +47,6 @@ CREATE TABLE equipment (
     CONSTRAINT pk_equipment
         PRIMARY KEY (equipment_id),
 
-    CONSTRAINT fk_equipment_user
-        FOREIGN KEY (user_id) REFERENCES "user" (user_id),
-
     CONSTRAINT fk_equipment_muscle_group
         FOREIGN KEY (group_name) REFERENCES muscle_group (group_name),
     
@@ -56,9 +64,6 @@ CREATE TABLE muscle (
     CONSTRAINT pk_muscle
         PRIMARY KEY (muscle_id),
 
-    CONSTRAINT fk_muscle_user
-        FOREIGN KEY (user_id) REFERENCES "user" (user_id),
-
     CONSTRAINT fk_muscle_muscle_group
         FOREIGN KEY (group_name) REFERENCES muscle_group (group_name),
     
@@ -72,13 +77,18 @@ CREATE TABLE exercise (
     exercise_name   VARCHAR(50)     NOT NULL,
     description     VARCHAR(120)    NULL,
     active          BOOLEAN         DEFAULT true,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+    search_document     TSVECTOR        GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', immutable_unaccent(exercise_name)), 'A')
+        || setweight(
+            to_tsvector('simple', immutable_unaccent(COALESCE(description, ''))), 'B'
+        )
+    ) STORED,
 
     CONSTRAINT pk_exercise
         PRIMARY KEY (exercise_id),
 
-    CONSTRAINT fk_exercise_user
-        FOREIGN KEY (user_id) REFERENCES "user" (user_id),
-    
     CONSTRAINT uq_exercise_name
         UNIQUE (user_id, exercise_name)
 );
@@ -117,13 +127,12 @@ CREATE TABLE workout_plan (
     workout_plan_name      VARCHAR(20)     NOT NULL,
     workout_plan_goal      VARCHAR(50)     NOT NULL,
     active                 BOOLEAN         DEFAULT true,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
 
     CONSTRAINT pk_workout_plan
         PRIMARY KEY (workout_plan_id),
 
-    CONSTRAINT fk_workout_plan_user
-        FOREIGN KEY (user_id) REFERENCES "user" (user_id),
-    
     CONSTRAINT uq_workout_plan_name
         UNIQUE (user_id, workout_plan_name)
 );
@@ -132,6 +141,8 @@ CREATE TABLE workout_split (
     split               VARCHAR(20)     NOT NULL,
     workout_plan_id     INTEGER         NOT NULL,
     active              BOOLEAN         DEFAULT true,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
 
     CONSTRAINT pk_workout_split
         PRIMARY KEY (split, workout_plan_id),
@@ -145,14 +156,26 @@ CREATE TABLE workout_report (
     workout_plan_id     INTEGER         NOT NULL,
     report_date         DATE            NOT NULL,
     split              VARCHAR(20)      NOT NULL,
+    idempotency_key     UUID            NULL,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
 
     CONSTRAINT pk_workout_report
-        PRIMARY KEY (workout_report_id),
+        PRIMARY KEY (workout_report_id, report_date),
+
+    -- Client-generated key making replayed writes upserts. Unique
+    -- constraints on a partitioned table must include the partition key.
+    CONSTRAINT uq_workout_report_idempotency_key
+        UNIQUE (idempotency_key, report_date),
 
     CONSTRAINT fk_workout_report_workout_split
         FOREIGN KEY (workout_plan_id, split) 
         REFERENCES workout_split (workout_plan_id, split)
-);
+) PARTITION BY RANGE (report_date);
+
+-- Monthly partitions are created ahead of time by database/partitions.py;
+-- the default partition only catches dates outside of them.
+CREATE TABLE workout_report_default PARTITION OF workout_report DEFAULT;
 
 CREATE TABLE split_exercise (
     workout_plan_id     INTEGER         NOT NULL,
@@ -164,9 +187,13 @@ CREATE TABLE split_exercise (
     advanced_technique VARCHAR(30)      NULL,
     rest_time         INTEGER         NOT NULL,
     active            BOOLEAN         DEFAULT true,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
 
+    -- Deferrable so a reorder can swap positions within one statement.
     CONSTRAINT pk_split_exercise
-        PRIMARY KEY (workout_plan_id, split, exercise_id, execution_order),
+        PRIMARY KEY (workout_plan_id, split, exercise_id, execution_order)
+        DEFERRABLE INITIALLY IMMEDIATE,
 
     CONSTRAINT fk_split_exercise_workout_split
         FOREIGN KEY (workout_plan_id, split) 
@@ -178,6 +205,7 @@ CREATE TABLE split_exercise (
 
 CREATE TABLE set_report (
     workout_report_id   INTEGER         NOT NULL,
+    report_date         DATE            NOT NULL,
     exercise_id        INTEGER         NOT NULL,
     split              VARCHAR(20)      NOT NULL,
     workout_plan_id     INTEGER         NOT NULL,
@@ -186,16 +214,187 @@ CREATE TABLE set_report (
     reps              VARCHAR(20)      NOT NULL,
     weight            INTEGER         NOT NULL,
     notes             VARCHAR(255)     NULL,
+    idempotency_key     UUID            NULL,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+    -- Leading number of reps ("8", "8-10", "10+2" all count their first
+    -- number), for volume computations.
+    -- At most six ASCII digits, so the cast can never overflow; longer
+    -- numbers are not parsed.
+    reps_count          INTEGER         GENERATED ALWAYS AS (
+        substring(reps FROM '^\s*([0-9]{1,6})(?![0-9])')::INTEGER
+    ) STORED,
+    notes_document      TSVECTOR        GENERATED ALWAYS AS (
+        to_tsvector('simple', immutable_unaccent(COALESCE(notes, '')))
+    ) STORED,
 
     CONSTRAINT pk_set_report
-        PRIMARY KEY (workout_report_id, exercise_id, split, workout_plan_id, set_number),
+        PRIMARY KEY (workout_report_id, exercise_id, split, workout_plan_id, set_number, report_date),
+
+    CONSTRAINT uq_set_report_idempotency_key
+        UNIQUE (idempotency_key, report_date),
 
-    CONSTRAINT fk_set_report_split_exercise
-        FOREIGN KEY (workout_plan_id, split, exercise_id, execution_order) 
-        REFERENCES split_exercise (workout_plan_id, split, exercise_id, execution_order),
+    -- execution_order records the position at the time of the set, so sets
+    -- reference the split and exercise rather than the split_exercise row,
+    -- whose position can be reordered later.
+    CONSTRAINT fk_set_report_workout_split
+        FOREIGN KEY (workout_plan_id, split)
+        REFERENCES workout_split (workout_plan_id, split),
+
+    CONSTRAINT fk_set_report_exercise
+        FOREIGN KEY (exercise_id) REFERENCES exercise (exercise_id),
 
     CONSTRAINT fk_set_report_workout_report
-        FOREIGN KEY (workout_report_id) REFERENCES workout_report (workout_report_id)
+        FOREIGN KEY (workout_report_id, report_date)
+        REFERENCES workout_report (workout_report_id, report_date)
+) PARTITION BY RANGE (report_date);
+
+CREATE TABLE set_report_default PARTITION OF set_report DEFAULT;
+
+CREATE TABLE deletion_job (
+    deletion_job_id     INTEGER         GENERATED BY DEFAULT AS IDENTITY,
+    user_id             INTEGER         NOT NULL,
+    target_type         VARCHAR(20)     NOT NULL,
+    target_id           INTEGER         NOT NULL,
+    stage               INTEGER         NOT NULL    DEFAULT 0,
+    rows_deleted        BIGINT          NOT NULL    DEFAULT 0,
+    status              VARCHAR(10)     NOT NULL    DEFAULT 'pending',
+    attempts            INTEGER         NOT NULL    DEFAULT 0,
+    created_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+
+    CONSTRAINT pk_deletion_job
+        PRIMARY KEY (deletion_job_id),
+
+    CONSTRAINT ck_deletion_job_target_type
+        CHECK (target_type IN ('workout_plan', 'workout_report', 'user')),
+
+    CONSTRAINT ck_deletion_job_status
+        CHECK (status IN ('pending', 'running', 'done', 'failed'))
+);
+
+-- Rows deleted from the synced tables, kept for TOMBSTONE_RETENTION_DAYS so
+-- clients can drop them on their next delta sync.
+CREATE TABLE change_tombstone (
+    change_tombstone_id BIGINT          GENERATED BY DEFAULT AS IDENTITY,
+    user_id             INTEGER         NOT NULL,
+    table_name          VARCHAR(30)     NOT NULL,
+    row_key             JSONB           NOT NULL,
+    row_version         XID8            NOT NULL    DEFAULT pg_current_xact_id(),
+    deleted_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+
+    CONSTRAINT pk_change_tombstone
+        PRIMARY KEY (change_tombstone_id)
+);
+
+-- Manifest of the per-user, per-year Parquet files holding archived set
+-- reports; sets older than archived_before live only in the archive.
+CREATE TABLE report_archive (
+    user_id             INTEGER         NOT NULL,
+    archive_year        INTEGER         NOT NULL,
+    file_path           VARCHAR(255)    NOT NULL,
+    row_count           INTEGER         NOT NULL,
+    min_date            DATE            NOT NULL,
+    max_date            DATE            NOT NULL,
+    archived_before     DATE            NOT NULL,
+    archived_at         TIMESTAMP       NOT NULL    DEFAULT now(),
+
+    CONSTRAINT pk_report_archive
+        PRIMARY KEY (user_id, archive_year)
+);
+
+-- Current and longest run of consecutive training days, kept up to date as
+-- reports are created so the home screen does not scan the report history.
+CREATE TABLE user_streak (
+    user_id             INTEGER         NOT NULL,
+    current_start       DATE            NOT NULL,
+    last_date           DATE            NOT NULL,
+    current_length      INTEGER         NOT NULL,
+    longest_length      INTEGER         NOT NULL,
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+
+    CONSTRAINT pk_user_streak
+        PRIMARY KEY (user_id)
+);
+
+-- Per-shard top LEADERBOARD_SIZE users of each default exercise, metric and
+-- period ("YYYY-MM" or "all"); boards are merged across shards when read.
+CREATE TABLE leaderboard_entry (
+    metric              VARCHAR(10)     NOT NULL,
+    exercise_id         INTEGER         NOT NULL,
+    period              VARCHAR(7)      NOT NULL,
+    user_id             INTEGER         NOT NULL,
+    score               NUMERIC(12, 2)  NOT NULL,
+    achieved_on         DATE            NOT NULL,
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+
+    CONSTRAINT pk_leaderboard_entry
+        PRIMARY KEY (metric, exercise_id, period, user_id),
+
+    CONSTRAINT ck_leaderboard_entry_metric
+        CHECK (metric IN ('e1rm', 'volume')),
+
+    CONSTRAINT ck_leaderboard_entry_period
+        CHECK (period = 'all' OR period ~ '^\d{4}-\d{2}$')
+);
+
+-- Next-session targets of each active split exercise, recomputed nightly by
+-- app.overload_suggestions from the recent set reports.
+CREATE TABLE overload_suggestion (
+    workout_plan_id     INTEGER         NOT NULL,
+    split               VARCHAR(20)     NOT NULL,
+    exercise_id         INTEGER         NOT NULL,
+    execution_order     INTEGER         NOT NULL,
+    user_id             INTEGER         NOT NULL,
+    action              VARCHAR(10)     NOT NULL,
+    suggested_sets      INTEGER         NOT NULL,
+    suggested_reps      INTEGER         NOT NULL,
+    suggested_weight    INTEGER         NOT NULL,
+    last_weight         INTEGER         NOT NULL,
+    last_reps           INTEGER,
+    based_on            DATE            NOT NULL,
+    computed_at         TIMESTAMP       NOT NULL    DEFAULT now(),
+
+    CONSTRAINT pk_overload_suggestion
+        PRIMARY KEY (workout_plan_id, split, exercise_id, execution_order),
+
+    CONSTRAINT ck_overload_suggestion_action
+        CHECK (action IN ('increase', 'hold', 'deload'))
+);
+
+-- Lives only on the shared database: overrides of the user-id shard map.
+CREATE TABLE shard_assignment (
+    user_id     INTEGER         NOT NULL,
+    shard_name  VARCHAR(50)     NOT NULL,
+    status      VARCHAR(10)     NOT NULL    DEFAULT 'active',
+
+    CONSTRAINT pk_shard_assignment
+        PRIMARY KEY (user_id),
+
+    CONSTRAINT ck_shard_assignment_status
+        CHECK (status IN ('active', 'moving'))
+);
+
+-- Lives only on the shared database: progress of each partition of the users
+-- of each shard in the current or last run of every app.jobs job.
+CREATE TABLE job_checkpoint (
+    job_name            VARCHAR(50)     NOT NULL,
+    shard_name          VARCHAR(50)     NOT NULL,
+    partition_index     INTEGER         NOT NULL    DEFAULT 0,
+    partition_count     INTEGER         NOT NULL    DEFAULT 1,
+    status              VARCHAR(10)     NOT NULL    DEFAULT 'running',
+    last_user_id        INTEGER         NOT NULL    DEFAULT 0,
+    users_processed     INTEGER         NOT NULL    DEFAULT 0,
+    items_processed     BIGINT          NOT NULL    DEFAULT 0,
+    started_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+    updated_at          TIMESTAMP       NOT NULL    DEFAULT now(),
+    finished_at         TIMESTAMP,
+
+    CONSTRAINT pk_job_checkpoint
+        PRIMARY KEY (job_name, shard_name, partition_index),
+
+    CONSTRAINT ck_job_checkpoint_status
+        CHECK (status IN ('running', 'done'))
 );
 
 CREATE INDEX idx_email_user ON "user" (email);
@@ -217,4 +416,129 @@ CREATE INDEX idx_exercise_equipment_exercise_id ON exercise_equipment (exercise_
 CREATE INDEX idx_workout_plan_user_id ON workout_plan (user_id);
 
 CREATE INDEX idx_split_exercise_workout_plan_id ON split_exercise (workout_plan_id);
-CREATE INDEX idx_set_report_workout_plan_workout_report ON set_report (workout_plan_id, workout_report_id);
\ No newline at end of file
+
+CREATE INDEX idx_workout_report_workout_plan_id_report_date
+    ON workout_report (workout_plan_id, report_date DESC);
+
+CREATE INDEX idx_set_report_exercise_id_report_date
+    ON set_report (exercise_id, report_date DESC, workout_report_id DESC);
+
+-- Serves the "last session" lookup of get_split_session_context: the newest
+-- report of an exercise in one of the user's plans is the first entry of its
+-- range, whatever other users logged for the same default exercise.
+CREATE INDEX idx_set_report_workout_plan_exercise_report_date
+    ON set_report (workout_plan_id, exercise_id, report_date DESC, workout_report_id DESC);
+
+CREATE INDEX idx_deletion_job_unfinished ON deletion_job (deletion_job_id)
+    WHERE status IN ('pending', 'running');
+CREATE INDEX idx_set_report_workout_plan_workout_report ON set_report (workout_plan_id, workout_report_id);
+
+CREATE INDEX idx_change_tombstone_user_id_row_version
+    ON change_tombstone (user_id, row_version);
+
+-- Delta sync reads the rows of a user's plans at or above a row_version.
+CREATE INDEX idx_workout_plan_user_id_row_version ON workout_plan (user_id, row_version);
+CREATE INDEX idx_exercise_user_id_row_version ON exercise (user_id, row_version);
+CREATE INDEX idx_workout_split_workout_plan_id_row_version
+    ON workout_split (workout_plan_id, row_version);
+CREATE INDEX idx_split_exercise_workout_plan_id_row_version
+    ON split_exercise (workout_plan_id, row_version);
+CREATE INDEX idx_workout_report_workout_plan_id_row_version
+    ON workout_report (workout_plan_id, row_version);
+CREATE INDEX idx_set_report_workout_plan_id_row_version
+    ON set_report (workout_plan_id, row_version);
+CREATE INDEX idx_change_tombstone_deleted_at ON change_tombstone (deleted_at);
+CREATE INDEX idx_leaderboard_entry_ranking
+    ON leaderboard_entry (metric, exercise_id, period, score DESC, achieved_on, user_id);
+CREATE INDEX idx_leaderboard_entry_user_id ON leaderboard_entry (user_id);
+CREATE INDEX idx_overload_suggestion_user_id ON overload_suggestion (user_id);
+
+-- Change tracking for delta sync (app/sync_repo.py). row_version holds the
+-- ID of the last transaction that wrote the row; a sync token is the oldest
+-- transaction still running when it was issued, so anything committed
+-- afterwards has a row_version at or above it.
+CREATE FUNCTION touch_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.row_version := pg_current_xact_id();
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger arguments are the key columns of the table. Deletions that are
+-- not user edits (archival, shard moves, account erasure) run with
+-- fittude.skip_tombstones set and leave no tombstones.
+CREATE FUNCTION record_tombstone() RETURNS trigger AS $$
+DECLARE
+    old_row JSONB := to_jsonb(OLD);
+    owner INTEGER := (old_row ->> 'user_id')::INTEGER;
+    key JSONB := '{}'::JSONB;
+BEGIN
+    IF current_setting('fittude.skip_tombstones', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF owner IS NULL AND old_row ? 'workout_plan_id' THEN
+        SELECT user_id INTO owner
+        FROM workout_plan
+        WHERE workout_plan_id = (old_row ->> 'workout_plan_id')::INTEGER;
+    END IF;
+    IF owner IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    FOR i IN 0 .. TG_NARGS - 1 LOOP
+        key := key || jsonb_build_object(TG_ARGV[i], old_row -> TG_ARGV[i]);
+    END LOOP;
+    INSERT INTO change_tombstone (user_id, table_name, row_key)
+    VALUES (owner, TG_TABLE_NAME, key);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_exercise_touch BEFORE UPDATE ON exercise
+    FOR EACH ROW EXECUTE FUNCTION touch_row_version();
+CREATE TRIGGER trg_workout_plan_touch BEFORE UPDATE ON workout_plan
+    FOR EACH ROW EXECUTE FUNCTION touch_row_version();
+CREATE TRIGGER trg_workout_split_touch BEFORE UPDATE ON workout_split
+    FOR EACH ROW EXECUTE FUNCTION touch_row_version();
+CREATE TRIGGER trg_split_exercise_touch BEFORE UPDATE ON split_exercise
+    FOR EACH ROW EXECUTE FUNCTION touch_row_version();
+CREATE TRIGGER trg_workout_report_touch BEFORE UPDATE ON workout_report
+    FOR EACH ROW EXECUTE FUNCTION touch_row_version();
+CREATE TRIGGER trg_set_report_touch BEFORE UPDATE ON set_report
+    FOR EACH ROW EXECUTE FUNCTION touch_row_version();
+
+CREATE TRIGGER trg_exercise_tombstone AFTER DELETE ON exercise
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('exercise_id');
+CREATE TRIGGER trg_workout_plan_tombstone AFTER DELETE ON workout_plan
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('workout_plan_id');
+CREATE TRIGGER trg_workout_split_tombstone AFTER DELETE ON workout_split
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('workout_plan_id', 'split');
+CREATE TRIGGER trg_split_exercise_tombstone AFTER DELETE ON split_exercise
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone(
+        'workout_plan_id', 'split', 'exercise_id', 'execution_order'
+    );
+CREATE TRIGGER trg_workout_report_tombstone AFTER DELETE ON workout_report
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone('workout_report_id');
+CREATE TRIGGER trg_set_report_tombstone AFTER DELETE ON set_report
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone(
+        'workout_report_id', 'exercise_id', 'split', 'workout_plan_id',
+        'set_number'
+    );
+
+-- Catalog name search (search_exercises, search_muscles, search_equipment).
+CREATE INDEX idx_exercise_name_trgm
+    ON exercise USING gin (immutable_unaccent(lower(exercise_name)) gin_trgm_ops);
+CREATE INDEX idx_muscle_name_trgm
+    ON muscle USING gin (immutable_unaccent(lower(muscle_name)) gin_trgm_ops);
+CREATE INDEX idx_equipment_name_trgm
+    ON equipment USING gin (immutable_unaccent(lower(equipment_name)) gin_trgm_ops);
+
+-- Full-text search over set notes and exercise descriptions. The 'simple'
+-- configuration does not stem, since notes are written in several languages.
+-- Notes are searched one user at a time, so the index also holds the plan:
+-- a search only reads the entries of the user's plans instead of every
+-- shard-wide match of a common word.
+CREATE INDEX idx_set_report_workout_plan_id_notes_document
+    ON set_report USING gin (workout_plan_id, notes_document);
+CREATE INDEX idx_exercise_search_document ON exercise USING gin (search_document);
@@ -1,15 +1,69 @@
-from datetime import date
+from datetime import date, datetime
+from uuid import UUID
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import Computed, ForeignKey, ForeignKeyConstraint, Identity, func
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import Mapped, mapped_column, registry
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.types import UserDefinedType
 
 reg = registry()
 
+
+class XID8(UserDefinedType):
+    """PostgreSQL 64-bit transaction ID, used as the row version for sync."""
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        return "XID8"
+
+
+class current_xact_id(FunctionElement):
+    """ID of the current transaction, the default of every row_version."""
+
+    type = XID8()
+    inherit_cache = True
+
+
+@compiles(current_xact_id)
+def _compile_current_xact_id(element, compiler, **kw):
+    return "pg_current_xact_id()"
+
+
+# The local SQLite database built by setup.py has no row versions, full-text
+# search or parsed reps: those columns exist there but stay empty.
+@compiles(current_xact_id, "sqlite")
+def _compile_current_xact_id_sqlite(element, compiler, **kw):
+    return "0"
+
+
+@compiles(XID8, "sqlite")
+def _compile_xid8_sqlite(element, compiler, **kw):
+    return "INTEGER"
+
+
+@compiles(TSVECTOR, "sqlite")
+def _compile_tsvector_sqlite(element, compiler, **kw):
+    return "TEXT"
+
+
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(element, compiler, **kw):
+    return "JSON"
+
+
+@compiles(Computed, "sqlite")
+def _compile_computed_sqlite(element, compiler, **kw):
+    return "GENERATED ALWAYS AS (NULL) VIRTUAL"
+
+
 @reg.mapped_as_dataclass
 class MuscleGroup:
     __tablename__ = "muscle_group"
 
-    user_id: Mapped[int] = mapped_column(ForeignKey("user.user_id"), nullable=True)
+    user_id: Mapped[int] = mapped_column(nullable=True)
     group_name: Mapped[str] = mapped_column(primary_key=True)
     active: Mapped[bool] = mapped_column(default=True)
 
@@ -31,9 +85,7 @@ class Muscle:
     group_name: Mapped[str] = mapped_column(
         ForeignKey("muscle_group.group_name"), unique=True
     )
-    user_id: Mapped[int] = mapped_column(
-        ForeignKey("user.user_id"), unique=True, nullable=True
-    )
+    user_id: Mapped[int] = mapped_column(unique=True, nullable=True)
     muscle_name: Mapped[str] = mapped_column(unique=True)
     active: Mapped[bool] = mapped_column(default=True)
 
@@ -43,9 +95,7 @@ class Equipment:
     __tablename__ = "equipment"
 
     equipment_id: Mapped[int] = mapped_column(primary_key=True, init=False, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(
-        ForeignKey("user.user_id"), unique=True, nullable=True
-    )
+    user_id: Mapped[int] = mapped_column(unique=True, nullable=True)
     group_name: Mapped[str] = mapped_column(
         ForeignKey("muscle_group.group_name"), unique=True
     )
@@ -58,12 +108,24 @@ class Exercise:
     __tablename__ = "exercise"
 
     exercise_id: Mapped[int] = mapped_column(primary_key=True, init=False, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(
-        ForeignKey("user.user_id"), unique=True, nullable=True
-    )
+    user_id: Mapped[int] = mapped_column(unique=True, nullable=True)
     exercise_name: Mapped[str] = mapped_column(unique=True)
     description: Mapped[str]
     active: Mapped[bool] = mapped_column(default=True)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+    search_document: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('simple', immutable_unaccent(exercise_name)), 'A')"
+            " || setweight(to_tsvector('simple',"
+            " immutable_unaccent(COALESCE(description, ''))), 'B')"
+        ),
+        nullable=True,
+        init=False,
+    )
 
 
 @reg.mapped_as_dataclass
@@ -95,10 +157,14 @@ class WorkoutPlan:
     __tablename__ = "workout_plan"
 
     workout_plan_id: Mapped[int] = mapped_column(primary_key=True, init=False, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("user.user_id"), unique=True)
+    user_id: Mapped[int] = mapped_column(unique=True)
     workout_plan_name: Mapped[str] = mapped_column(unique=True)
     workout_plan_goal: Mapped[str]
     active: Mapped[bool] = mapped_column(default=True)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
 
 
 @reg.mapped_as_dataclass
@@ -110,6 +176,10 @@ class WorkoutSplit:
         ForeignKey("workout_plan.workout_plan_id"), primary_key=True
     )
     active: Mapped[bool] = mapped_column(default=True)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
 
 
 @reg.mapped_as_dataclass
@@ -131,38 +201,188 @@ class SplitExercise:
     advanced_technique: Mapped[str] = mapped_column(nullable=True)
     rest_time: Mapped[int]
     active: Mapped[bool] = mapped_column(default=True)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
 
 
 @reg.mapped_as_dataclass
 class WorkoutReport:
     __tablename__ = "workout_report"
+    __table_args__ = {"postgresql_partition_by": "RANGE (report_date)"}
 
-    report_date: Mapped[date]
-    workout_report_id: Mapped[int] = mapped_column(primary_key=True, init=False, autoincrement=True)
+    report_date: Mapped[date] = mapped_column(primary_key=True)
+    # Part of a composite key because of partitioning, which SQLite cannot
+    # autoincrement; the identity is generated by Postgres only.
+    workout_report_id: Mapped[int] = mapped_column(
+        Identity(), primary_key=True, init=False
+    )
     workout_plan_id: Mapped[int] = mapped_column(
         ForeignKey("workout_split.workout_plan_id")
     )
     split: Mapped[str] = mapped_column(ForeignKey("workout_split.split"))
+    idempotency_key: Mapped[UUID] = mapped_column(nullable=True, default=None)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
 
 
 @reg.mapped_as_dataclass
 class SetReport:
     __tablename__ = "set_report"
-
-    workout_report_id: Mapped[int] = mapped_column(
-        ForeignKey("workout_report.workout_report_id"), primary_key=True
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["workout_report_id", "report_date"],
+            ["workout_report.workout_report_id", "workout_report.report_date"],
+        ),
+        ForeignKeyConstraint(
+            ["workout_plan_id", "split"],
+            ["workout_split.workout_plan_id", "workout_split.split"],
+        ),
+        {"postgresql_partition_by": "RANGE (report_date)"},
     )
+
+    workout_report_id: Mapped[int] = mapped_column(primary_key=True)
+    report_date: Mapped[date] = mapped_column(primary_key=True)
     exercise_id: Mapped[int] = mapped_column(
-        ForeignKey("split_exercise.exercise_id"), primary_key=True
-    )
-    split: Mapped[str] = mapped_column(
-        ForeignKey("split_exercise.split"), primary_key=True
-    )
-    workout_plan_id: Mapped[int] = mapped_column(
-        ForeignKey("split_exercise.workout_plan_id"), primary_key=True
+        ForeignKey("exercise.exercise_id"), primary_key=True
     )
+    split: Mapped[str] = mapped_column(primary_key=True)
+    workout_plan_id: Mapped[int] = mapped_column(primary_key=True)
     execution_order: Mapped[int]
     set_number: Mapped[int] = mapped_column(primary_key=True)
     reps: Mapped[str]
     weight: Mapped[int]
-    notes: Mapped[str] = mapped_column(nullable=True)
\ No newline at end of file
+    notes: Mapped[str] = mapped_column(nullable=True)
+    idempotency_key: Mapped[UUID] = mapped_column(nullable=True, default=None)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    updated_at: Mapped[datetime] = mapped_column(init=False, server_default=func.now())
+    reps_count: Mapped[int] = mapped_column(
+        Computed("substring(reps FROM '^\\s*([0-9]{1,6})(?![0-9])')::INTEGER"),
+        nullable=True,
+        init=False,
+    )
+    notes_document: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed("to_tsvector('simple', immutable_unaccent(COALESCE(notes, '')))"),
+        nullable=True,
+        init=False,
+    )
+
+
+@reg.mapped_as_dataclass
+class DeletionJob:
+    __tablename__ = "deletion_job"
+
+    deletion_job_id: Mapped[int] = mapped_column(primary_key=True, init=False, autoincrement=True)
+    user_id: Mapped[int]
+    target_type: Mapped[str]
+    target_id: Mapped[int]
+    stage: Mapped[int] = mapped_column(default=0)
+    rows_deleted: Mapped[int] = mapped_column(default=0)
+    status: Mapped[str] = mapped_column(default="pending")
+    attempts: Mapped[int] = mapped_column(default=0)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.now)
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+@reg.mapped_as_dataclass
+class ChangeTombstone:
+    __tablename__ = "change_tombstone"
+
+    change_tombstone_id: Mapped[int] = mapped_column(primary_key=True, init=False, autoincrement=True)
+    user_id: Mapped[int]
+    table_name: Mapped[str]
+    row_key: Mapped[dict] = mapped_column(JSONB)
+    row_version: Mapped[str] = mapped_column(
+        XID8, init=False, server_default=current_xact_id()
+    )
+    deleted_at: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+@reg.mapped_as_dataclass
+class ReportArchive:
+    __tablename__ = "report_archive"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    archive_year: Mapped[int] = mapped_column(primary_key=True)
+    file_path: Mapped[str]
+    row_count: Mapped[int]
+    min_date: Mapped[date]
+    max_date: Mapped[date]
+    archived_before: Mapped[date]
+    archived_at: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+@reg.mapped_as_dataclass
+class UserStreak:
+    __tablename__ = "user_streak"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    current_start: Mapped[date]
+    last_date: Mapped[date]
+    current_length: Mapped[int]
+    longest_length: Mapped[int]
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+@reg.mapped_as_dataclass
+class LeaderboardEntry:
+    __tablename__ = "leaderboard_entry"
+
+    metric: Mapped[str] = mapped_column(primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(primary_key=True)
+    period: Mapped[str] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    score: Mapped[float]
+    achieved_on: Mapped[date]
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+@reg.mapped_as_dataclass
+class OverloadSuggestion:
+    __tablename__ = "overload_suggestion"
+
+    workout_plan_id: Mapped[int] = mapped_column(primary_key=True)
+    split: Mapped[str] = mapped_column(primary_key=True)
+    exercise_id: Mapped[int] = mapped_column(primary_key=True)
+    execution_order: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int]
+    action: Mapped[str]
+    suggested_sets: Mapped[int]
+    suggested_reps: Mapped[int]
+    suggested_weight: Mapped[int]
+    last_weight: Mapped[int]
+    last_reps: Mapped[int] = mapped_column(nullable=True)
+    based_on: Mapped[date]
+    computed_at: Mapped[datetime] = mapped_column(default=datetime.now)
+
+
+@reg.mapped_as_dataclass
+class ShardAssignment:
+    __tablename__ = "shard_assignment"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    shard_name: Mapped[str]
+    status: Mapped[str] = mapped_column(default="active")
+
+
+@reg.mapped_as_dataclass
+class JobCheckpoint:
+    __tablename__ = "job_checkpoint"
+
+    job_name: Mapped[str] = mapped_column(primary_key=True)
+    shard_name: Mapped[str] = mapped_column(primary_key=True)
+    partition_index: Mapped[int] = mapped_column(primary_key=True, default=0)
+    partition_count: Mapped[int] = mapped_column(default=1)
+    status: Mapped[str] = mapped_column(default="running")
+    last_user_id: Mapped[int] = mapped_column(default=0)
+    users_processed: Mapped[int] = mapped_column(default=0)
+    items_processed: Mapped[int] = mapped_column(default=0)
+    started_at: Mapped[datetime] = mapped_column(default=datetime.now)
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.now)
+    finished_at: Mapped[datetime] = mapped_column(nullable=True, default=None)
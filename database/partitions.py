@@ -0,0 +1,150 @@
+"""
+Monthly range partitions of the report tables.
+
+``workout_report`` and ``set_report`` are partitioned by ``report_date``
+(see ``__table_args__`` in mapping.py). Partitions are named
+``<table>_<yyyy>_<mm>`` and should exist before rows for that month arrive,
+otherwise they land in the default partition. Creating the partition of a
+month later moves its rows out of the default partition first, so months
+from before partitioning was introduced can be backfilled as well.
+"""
+
+from datetime import date
+from typing import List
+
+PARTITIONED_TABLES = ("workout_report", "set_report")
+
+MONTHS_AHEAD = 3
+
+# Deletions moving rows out of the default partition are not user edits.
+_SKIP_TOMBSTONES = "SET LOCAL fittude.skip_tombstones = 'on';"
+
+_INSERTABLE_COLUMNS = """
+    SELECT string_agg(quote_ident(column_name), ', ' ORDER BY ordinal_position)
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+          AND table_name = %s
+          AND is_generated = 'NEVER';
+"""
+
+
+def month_start(day: date, months: int = 0) -> date:
+    """First day of the month ``months`` after the one containing ``day``."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def create_partition_sql(table: str, month: date) -> str:
+    """DDL creating the partition of ``table`` holding the month of ``month``."""
+    start = month_start(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start)} "
+        f"PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start}') TO ('{month_start(start, 1)}');"
+    )
+
+
+def _month_predicate(month: date) -> str:
+    start = month_start(month)
+    return f"report_date >= '{start}' AND report_date < '{month_start(start, 1)}'"
+
+
+def missing_months(
+    cursor, today: date, months_ahead: int = MONTHS_AHEAD
+) -> List[date]:
+    """
+    List the months whose partitions do not exist yet.
+
+    Covers every month from the oldest report held by the default partition
+    up to ``months_ahead`` months after ``today``.
+
+    Args:
+        cursor: Open database cursor
+        today (date): Any day of the current month
+        months_ahead (int): Number of future months to cover
+
+    Returns:
+        List[date]: First day of each month missing a partition, oldest first
+    """
+    cursor.execute(
+        f"SELECT min(report_date) "
+        f"FROM {default_partition_name(PARTITIONED_TABLES[0])};"
+    )
+    oldest = cursor.fetchone()[0]
+    first = month_start(min(oldest, today) if oldest else today)
+    last = month_start(today, months_ahead)
+
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = month_start(month, 1)
+
+    cursor.execute(
+        "SELECT relname FROM pg_class WHERE relname = ANY(%s);",
+        ([partition_name(PARTITIONED_TABLES[-1], month) for month in months],),
+    )
+    existing = {name for (name,) in cursor.fetchall()}
+    return [
+        month
+        for month in months
+        if partition_name(PARTITIONED_TABLES[-1], month) not in existing
+    ]
+
+
+def create_month_partitions(cursor, month: date) -> int:
+    """
+    Create the partitions of every report table for one month.
+
+    Rows of that month already in the default partitions are moved into the
+    new partitions, since Postgres refuses to attach a range the default
+    partition holds rows for. Meant to run in its own transaction, which
+    locks the default partitions while it runs.
+
+    Args:
+        cursor: Open database cursor
+        month (date): Any day of the month
+
+    Returns:
+        int: Number of rows moved out of the default partitions
+    """
+    predicate = _month_predicate(month)
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM "
+        f"{default_partition_name(PARTITIONED_TABLES[0])} WHERE {predicate});"
+    )
+    if not cursor.fetchone()[0]:
+        for table in PARTITIONED_TABLES:
+            cursor.execute(create_partition_sql(table, month))
+        return 0
+
+    cursor.execute(_SKIP_TOMBSTONES)
+    # set_report references workout_report: stash and delete children first,
+    # then put parents back first.
+    for table in reversed(PARTITIONED_TABLES):
+        cursor.execute(
+            f"CREATE TEMP TABLE moved_{table} ON COMMIT DROP AS "
+            f"SELECT * FROM {default_partition_name(table)} WHERE {predicate};"
+        )
+        cursor.execute(
+            f"DELETE FROM {default_partition_name(table)} WHERE {predicate};"
+        )
+
+    moved = 0
+    for table in PARTITIONED_TABLES:
+        cursor.execute(create_partition_sql(table, month))
+        cursor.execute(_INSERTABLE_COLUMNS, (table,))
+        columns = cursor.fetchone()[0]
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM moved_{table};"
+        )
+        moved += cursor.rowcount
+    return moved
@@ -0,0 +1,146 @@
+_EXERCISE_SETS = """
+    FROM set_report sr
+    JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
+    WHERE sr.exercise_id = %(exercise_id)s
+    AND wp.user_id = %(user_id)s
+    AND sr.report_date >= COALESCE(%(since)s::date, '-infinity'::date)
+    AND sr.report_date <= COALESCE(%(until)s::date, 'infinity'::date)
+"""
+
+GET_PROGRESS_RANGE = f"""
+    SELECT min(sr.report_date), max(sr.report_date)
+    {_EXERCISE_SETS};
+"""
+
+# Estimated 1RM uses the Epley formula, only on sets of up to
+# %(e1rm_max_reps)s reps where it is reasonably accurate.
+GET_PROGRESS_SERIES = f"""
+    SELECT date_trunc(%(bucket)s, sr.report_date)::date AS bucket,
+           max(sr.weight),
+           sum(sr.reps_count * sr.weight),
+           max(sr.weight * (1 + sr.reps_count / 30.0)) FILTER (
+               WHERE sr.reps_count BETWEEN 1 AND %(e1rm_max_reps)s
+           ),
+           count(*)
+    {_EXERCISE_SETS}
+    GROUP BY bucket
+    ORDER BY bucket;
+"""
+
+GET_TRAINING_CALENDAR = """
+    WITH days AS (
+        SELECT wr.report_date, count(*) AS workouts
+        FROM workout_report wr
+        JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+        WHERE wp.user_id = %(user_id)s
+        AND wr.report_date BETWEEN %(since)s AND %(until)s
+        GROUP BY wr.report_date
+    ),
+    weeks AS (
+        SELECT date_trunc('week', report_date)::date AS week,
+               count(*) AS training_days
+        FROM days
+        GROUP BY week
+    )
+    SELECT COALESCE(
+               (SELECT json_agg(
+                           json_build_object(
+                               'date', report_date, 'workouts', workouts
+                           )
+                           ORDER BY report_date
+                       )
+                FROM days),
+               '[]'::json
+           ),
+           COALESCE(
+               (SELECT json_agg(
+                           json_build_object(
+                               'week', week, 'training_days', training_days
+                           )
+                           ORDER BY week
+                       )
+                FROM weeks),
+               '[]'::json
+           ),
+           s.current_start, s.last_date, s.current_length, s.longest_length
+    FROM (SELECT 1) AS single_row
+    LEFT JOIN user_streak s ON s.user_id = %(user_id)s;
+"""
+
+GET_USER_STREAK = """
+    SELECT current_start, last_date, current_length, longest_length
+    FROM user_streak
+    WHERE user_id = %s;
+"""
+
+# Extends the current streak or starts a new one when a later training day
+# is logged. Days inside the current streak need no change; older days can
+# join or merge past streaks and go through RECOMPUTE_USER_STREAK.
+ADVANCE_USER_STREAK = """
+    UPDATE user_streak
+    SET current_start = CASE
+            WHEN %(day)s::date = last_date + 1 THEN current_start
+            ELSE %(day)s::date
+        END,
+        current_length = CASE
+            WHEN %(day)s::date = last_date + 1 THEN current_length + 1
+            ELSE 1
+        END,
+        longest_length = GREATEST(
+            longest_length,
+            CASE
+                WHEN %(day)s::date = last_date + 1 THEN current_length + 1
+                ELSE 1
+            END
+        ),
+        last_date = %(day)s::date,
+        updated_at = now()
+    WHERE user_id = %(user_id)s AND %(day)s::date > last_date
+    RETURNING user_id;
+"""
+
+# Rebuilds the record from the whole history (gaps and islands over the
+# training days). With %(day)s set, only if that day is not already inside
+# the current streak.
+RECOMPUTE_USER_STREAK = """
+    WITH days AS (
+        SELECT DISTINCT wr.report_date
+        FROM workout_report wr
+        JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+        WHERE wp.user_id = %(user_id)s
+    ),
+    streaks AS (
+        SELECT min(report_date) AS first_day, max(report_date) AS last_day,
+               count(*) AS length
+        FROM (
+            SELECT report_date,
+                   report_date - (row_number() OVER (ORDER BY report_date))::int
+                       AS island
+            FROM days
+        ) AS numbered
+        GROUP BY island
+    )
+    INSERT INTO user_streak
+    (user_id, current_start, last_date, current_length, longest_length)
+    SELECT %(user_id)s, latest.first_day, latest.last_day, latest.length,
+           (SELECT max(length) FROM streaks)
+    FROM (SELECT * FROM streaks ORDER BY last_day DESC LIMIT 1) AS latest
+    WHERE %(day)s::date IS NULL OR NOT EXISTS (
+        SELECT 1
+        FROM user_streak
+        WHERE user_id = %(user_id)s
+        AND %(day)s::date BETWEEN current_start AND last_date
+    )
+    ON CONFLICT (user_id) DO UPDATE
+    SET current_start = EXCLUDED.current_start,
+        last_date = EXCLUDED.last_date,
+        current_length = EXCLUDED.current_length,
+        longest_length = EXCLUDED.longest_length,
+        updated_at = now()
+    RETURNING user_id;
+"""
+
+DELETE_USER_STREAK = """
+    DELETE FROM user_streak
+    WHERE user_id = %s;
+"""
@@ -0,0 +1,62 @@
+_USER_PLANS = "SELECT workout_plan_id FROM workout_plan WHERE user_id = %s"
+
+GET_COLD_SET_REPORTS = f"""
+    SELECT workout_report_id, report_date, exercise_id, split, workout_plan_id,
+           execution_order, set_number, reps, weight, notes
+    FROM set_report
+    WHERE workout_plan_id IN ({_USER_PLANS})
+    AND report_date < %s
+    ORDER BY report_date;
+"""
+
+DELETE_COLD_SET_REPORTS = f"""
+    DELETE FROM set_report
+    WHERE workout_plan_id IN ({_USER_PLANS})
+    AND report_date < %s;
+"""
+
+GET_USERS_WITH_COLD_REPORTS = """
+    SELECT DISTINCT wp.user_id
+    FROM set_report sr
+    JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
+    WHERE sr.report_date < %s;
+"""
+
+UPSERT_ARCHIVE_MANIFEST = """
+    INSERT INTO report_archive
+    (user_id, archive_year, file_path, row_count, min_date, max_date,
+     archived_before)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (user_id, archive_year) DO UPDATE
+    SET file_path = EXCLUDED.file_path,
+        row_count = EXCLUDED.row_count,
+        min_date = EXCLUDED.min_date,
+        max_date = EXCLUDED.max_date,
+        archived_before = GREATEST(
+            report_archive.archived_before, EXCLUDED.archived_before
+        ),
+        archived_at = now()
+    RETURNING archive_year;
+"""
+
+DELETE_ARCHIVE_MANIFEST_ENTRY = """
+    DELETE FROM report_archive
+    WHERE user_id = %s AND archive_year = %s;
+"""
+
+# Archived sets keep their workout_report row in the database, so a report
+# missing here was deleted, directly or with its plan.
+GET_ARCHIVED_REPORT_IDS = f"""
+    SELECT workout_report_id
+    FROM workout_report
+    WHERE workout_plan_id IN ({_USER_PLANS})
+    AND report_date < %s;
+"""
+
+GET_ARCHIVE_MANIFEST = """
+    SELECT archive_year, file_path, row_count, min_date, max_date,
+           archived_before
+    FROM report_archive
+    WHERE user_id = %s
+    ORDER BY archive_year DESC;
+"""
@@ -0,0 +1,167 @@
+INSERT_DELETION_JOB = """
+    INSERT INTO deletion_job (user_id, target_type, target_id)
+    SELECT %(user_id)s, %(target_type)s, %(target_id)s
+    WHERE CASE %(target_type)s
+        WHEN 'workout_plan' THEN EXISTS (
+            SELECT 1
+            FROM workout_plan
+            WHERE workout_plan_id = %(target_id)s AND user_id = %(user_id)s
+        )
+        WHEN 'workout_report' THEN EXISTS (
+            SELECT 1
+            FROM workout_report wr
+            JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+            WHERE wr.workout_report_id = %(target_id)s AND wp.user_id = %(user_id)s
+        )
+        ELSE %(target_id)s = %(user_id)s
+    END
+    RETURNING deletion_job_id;
+"""
+
+LOCK_DELETION_JOB = """
+    SELECT target_type, target_id, stage, status
+    FROM deletion_job
+    WHERE deletion_job_id = %s AND user_id = %s
+    FOR UPDATE;
+"""
+
+UPDATE_DELETION_JOB_PROGRESS = """
+    UPDATE deletion_job
+    SET stage = %s, rows_deleted = rows_deleted + %s, status = %s,
+        updated_at = now()
+    WHERE deletion_job_id = %s
+    RETURNING deletion_job_id;
+"""
+
+RECORD_DELETION_JOB_FAILURE = """
+    UPDATE deletion_job
+    SET attempts = attempts + 1,
+        status = CASE WHEN attempts + 1 >= %s THEN 'failed' ELSE status END,
+        updated_at = now()
+    WHERE deletion_job_id = %s AND user_id = %s
+    RETURNING status;
+"""
+
+GET_DELETION_JOB = """
+    SELECT deletion_job_id, user_id, target_type, target_id, stage,
+           rows_deleted, status, attempts, created_at, updated_at
+    FROM deletion_job
+    WHERE deletion_job_id = %s AND user_id = %s;
+"""
+
+GET_UNFINISHED_DELETION_JOBS = """
+    SELECT deletion_job_id, user_id
+    FROM deletion_job
+    WHERE status IN ('pending', 'running')
+    ORDER BY deletion_job_id;
+"""
+
+
+def _batch_delete(table: str, key: str, predicate: str) -> str:
+    return f"""
+    DELETE FROM {table}
+    WHERE ({key}) IN (
+        SELECT {key}
+        FROM {table}
+        WHERE {predicate}
+        LIMIT %(batch_size)s
+    );
+"""
+
+
+_SET_REPORT_KEY = (
+    "workout_report_id, exercise_id, split, workout_plan_id, set_number, report_date"
+)
+_OWNED_PLANS = "SELECT workout_plan_id FROM workout_plan WHERE user_id = %(user_id)s"
+_OWNED_EXERCISES = "SELECT exercise_id FROM exercise WHERE user_id = %(user_id)s"
+_OWNED_MUSCLES = "SELECT muscle_id FROM muscle WHERE user_id = %(user_id)s"
+_OWNED_EQUIPMENT = "SELECT equipment_id FROM equipment WHERE user_id = %(user_id)s"
+_TARGET_PLAN = (
+    f"workout_plan_id = %(target_id)s AND workout_plan_id IN ({_OWNED_PLANS})"
+)
+_USER_PLANS = f"workout_plan_id IN ({_OWNED_PLANS})"
+
+# Statements run in order for each kind of target. Each deletes at most
+# %(batch_size)s rows; a stage is complete once it deletes fewer than that.
+DELETION_STAGES = {
+    "workout_report": (
+        _batch_delete(
+            "set_report",
+            _SET_REPORT_KEY,
+            f"workout_report_id = %(target_id)s AND {_USER_PLANS}",
+        ),
+        _batch_delete(
+            "workout_report",
+            "workout_report_id, report_date",
+            f"workout_report_id = %(target_id)s AND {_USER_PLANS}",
+        ),
+    ),
+    "workout_plan": (
+        _batch_delete(
+            "overload_suggestion",
+            "workout_plan_id, split, exercise_id, execution_order",
+            _TARGET_PLAN,
+        ),
+        _batch_delete("set_report", _SET_REPORT_KEY, _TARGET_PLAN),
+        _batch_delete("workout_report", "workout_report_id, report_date", _TARGET_PLAN),
+        _batch_delete(
+            "split_exercise",
+            "workout_plan_id, split, exercise_id, execution_order",
+            _TARGET_PLAN,
+        ),
+        _batch_delete("workout_split", "split, workout_plan_id", _TARGET_PLAN),
+        _batch_delete(
+            "workout_plan",
+            "workout_plan_id",
+            "workout_plan_id = %(target_id)s AND user_id = %(user_id)s",
+        ),
+    ),
+    "user": (
+        _batch_delete("set_report", _SET_REPORT_KEY, _USER_PLANS),
+        _batch_delete("workout_report", "workout_report_id, report_date", _USER_PLANS),
+        _batch_delete(
+            "split_exercise",
+            "workout_plan_id, split, exercise_id, execution_order",
+            _USER_PLANS,
+        ),
+        _batch_delete("workout_split", "split, workout_plan_id", _USER_PLANS),
+        _batch_delete("workout_plan", "workout_plan_id", "user_id = %(user_id)s"),
+        _batch_delete(
+            "exercise_muscle",
+            "muscle_id, exercise_id",
+            f"exercise_id IN ({_OWNED_EXERCISES}) OR muscle_id IN ({_OWNED_MUSCLES})",
+        ),
+        _batch_delete(
+            "exercise_equipment",
+            "equipment_id, exercise_id",
+            f"exercise_id IN ({_OWNED_EXERCISES}) "
+            f"OR equipment_id IN ({_OWNED_EQUIPMENT})",
+        ),
+        _batch_delete("exercise", "exercise_id", "user_id = %(user_id)s"),
+        _batch_delete("muscle", "muscle_id", "user_id = %(user_id)s"),
+        _batch_delete("equipment", "equipment_id", "user_id = %(user_id)s"),
+        _batch_delete("muscle_group", "group_name", "user_id = %(user_id)s"),
+        _batch_delete(
+            "report_archive", "user_id, archive_year", "user_id = %(user_id)s"
+        ),
+        _batch_delete("user_streak", "user_id", "user_id = %(user_id)s"),
+        _batch_delete(
+            "leaderboard_entry",
+            "metric, exercise_id, period, user_id",
+            "user_id = %(user_id)s",
+        ),
+        _batch_delete(
+            "overload_suggestion",
+            "workout_plan_id, split, exercise_id, execution_order",
+            "user_id = %(user_id)s",
+        ),
+        _batch_delete(
+            "change_tombstone", "change_tombstone_id", "user_id = %(user_id)s"
+        ),
+        _batch_delete(
+            "deletion_job",
+            "deletion_job_id",
+            "user_id = %(user_id)s AND target_type <> 'user'",
+        ),
+    ),
+}
@@ -1,3 +1,5 @@
+from sql.search_sql import catalog_search_query
+
 INSERT_EQUIPMENT = """
     INSERT INTO equipment (user_id, group_name, equipment_name, active)
     VALUES (%s, %s, %s, %s)
@@ -36,8 +38,34 @@ GET_EQUIPMENT_BY_NAME = """
     WHERE equipment_name = %s AND user_id = %s;
 """
 
+GET_EQUIPMENT_BY_IDS = """
+    SELECT equipment_id, user_id, group_name, equipment_name, active
+    FROM equipment
+    WHERE equipment_id = ANY(%s::int[]) AND user_id = %s;
+"""
+
+GET_EQUIPMENT_BY_NAMES = """
+    SELECT equipment_id, user_id, group_name, equipment_name, active
+    FROM equipment
+    WHERE equipment_name = ANY(%s::text[]) AND user_id = %s;
+"""
+
 DELETE_EQUIPMENT = """
     DELETE FROM equipment
     WHERE equipment_id = %s AND user_id = %s;
     RETURNING equipment_id;
 """
+
+SEARCH_DEFAULT_EQUIPMENT = catalog_search_query(
+    "equipment",
+    "equipment_id, user_id, group_name, equipment_name, active",
+    "equipment_name",
+    "user_id IS NULL",
+)
+
+SEARCH_USER_EQUIPMENT = catalog_search_query(
+    "equipment",
+    "equipment_id, user_id, group_name, equipment_name, active",
+    "equipment_name",
+    "user_id = %(user_id)s",
+)
@@ -0,0 +1,36 @@
+def _index_exercises(owner: str) -> str:
+    return f"""
+    SELECT e.exercise_id, e.user_id, e.exercise_name, e.description,
+           COALESCE(
+               (SELECT array_agg(em.muscle_id)
+                FROM exercise_muscle em
+                WHERE em.exercise_id = e.exercise_id),
+               '{{}}'
+           ),
+           COALESCE(
+               (SELECT array_agg(DISTINCT m.group_name)
+                FROM exercise_muscle em
+                JOIN muscle m ON m.muscle_id = em.muscle_id
+                WHERE em.exercise_id = e.exercise_id),
+               '{{}}'
+           ),
+           COALESCE(
+               (SELECT array_agg(ee.equipment_id)
+                FROM exercise_equipment ee
+                WHERE ee.exercise_id = e.exercise_id),
+               '{{}}'
+           )
+    FROM exercise e
+    WHERE e.active = true AND {owner}
+    ORDER BY e.exercise_id;
+"""
+
+
+GET_DEFAULT_INDEX_EXERCISES = _index_exercises("e.user_id IS NULL")
+
+GET_USER_INDEX_EXERCISES = _index_exercises("e.user_id = %s")
+
+LISTEN_EXERCISE_INDEX_CHANGED = "LISTEN exercise_index_changed;"
+
+# Delivered to listeners only when the surrounding transaction commits.
+NOTIFY_EXERCISE_INDEX_CHANGED = "SELECT pg_notify('exercise_index_changed', %s);"
@@ -1,3 +1,5 @@
+from sql.search_sql import catalog_search_query
+
 INSERT_EXERCISE = """
     INSERT INTO exercise (user_id, exercise_name, description, active)
     VALUES (%s, %s, %s, %s)
@@ -36,6 +38,18 @@ GET_EXERCISE_BY_NAME = """
     WHERE exercise_name = %s AND user_id = %s;
 """
 
+GET_EXERCISES_BY_IDS = """
+    SELECT exercise_id, user_id, exercise_name, description, active
+    FROM exercise
+    WHERE exercise_id = ANY(%s::int[]) AND user_id = %s;
+"""
+
+GET_EXERCISES_BY_NAMES = """
+    SELECT exercise_id, user_id, exercise_name, description, active
+    FROM exercise
+    WHERE exercise_name = ANY(%s::text[]) AND user_id = %s;
+"""
+
 DELETE_EXERCISE = """
     DELETE FROM exercise
     WHERE exercise_id = %s AND user_id = %s
@@ -67,3 +81,124 @@ GET_EXERCISE_EQUIPMENT = """
     JOIN exercise_equipment ee ON ee.equipment_id = e.equipment_id
     WHERE ee.exercise_id = %s;
 """
+
+BIND_MUSCLES_TO_EXERCISE = """
+    INSERT INTO exercise_muscle (muscle_id, exercise_id)
+    SELECT muscle_id, %s
+    FROM unnest(%s::int[]) AS muscle_id
+    ON CONFLICT (muscle_id, exercise_id) DO NOTHING
+    RETURNING muscle_id;
+"""
+
+# Only bindings of the user's own exercises are removed.
+UNBIND_MUSCLES_FROM_EXERCISE = """
+    DELETE FROM exercise_muscle x
+    USING exercise e
+    WHERE e.exercise_id = x.exercise_id
+    AND e.exercise_id = %s AND e.user_id = %s
+    AND x.muscle_id = ANY(%s::int[])
+    RETURNING x.muscle_id;
+"""
+
+# Touches nothing unless the exercise is the user's; the last column tells
+# whether it is.
+REPLACE_EXERCISE_MUSCLES = """
+    WITH owned AS (
+        SELECT exercise_id
+        FROM exercise
+        WHERE exercise_id = %(exercise_id)s AND user_id = %(user_id)s
+    ), removed AS (
+        DELETE FROM exercise_muscle x
+        USING owned o
+        WHERE x.exercise_id = o.exercise_id
+        AND x.muscle_id <> ALL(%(muscle_ids)s::int[])
+        RETURNING x.muscle_id
+    ), added AS (
+        INSERT INTO exercise_muscle (muscle_id, exercise_id)
+        SELECT muscle_id, o.exercise_id
+        FROM owned o
+        CROSS JOIN unnest(%(muscle_ids)s::int[]) AS muscle_id
+        ON CONFLICT (muscle_id, exercise_id) DO NOTHING
+        RETURNING muscle_id
+    )
+    SELECT ARRAY(SELECT muscle_id FROM added),
+           ARRAY(SELECT muscle_id FROM removed),
+           EXISTS (SELECT 1 FROM owned);
+"""
+
+BIND_EQUIPMENT_LIST_TO_EXERCISE = """
+    INSERT INTO exercise_equipment (equipment_id, exercise_id)
+    SELECT equipment_id, %s
+    FROM unnest(%s::int[]) AS equipment_id
+    ON CONFLICT (equipment_id, exercise_id) DO NOTHING
+    RETURNING equipment_id;
+"""
+
+# Only bindings of the user's own exercises are removed.
+UNBIND_EQUIPMENT_LIST_FROM_EXERCISE = """
+    DELETE FROM exercise_equipment x
+    USING exercise e
+    WHERE e.exercise_id = x.exercise_id
+    AND e.exercise_id = %s AND e.user_id = %s
+    AND x.equipment_id = ANY(%s::int[])
+    RETURNING x.equipment_id;
+"""
+
+# Touches nothing unless the exercise is the user's; the last column tells
+# whether it is.
+REPLACE_EXERCISE_EQUIPMENT = """
+    WITH owned AS (
+        SELECT exercise_id
+        FROM exercise
+        WHERE exercise_id = %(exercise_id)s AND user_id = %(user_id)s
+    ), removed AS (
+        DELETE FROM exercise_equipment x
+        USING owned o
+        WHERE x.exercise_id = o.exercise_id
+        AND x.equipment_id <> ALL(%(equipment_ids)s::int[])
+        RETURNING x.equipment_id
+    ), added AS (
+        INSERT INTO exercise_equipment (equipment_id, exercise_id)
+        SELECT equipment_id, o.exercise_id
+        FROM owned o
+        CROSS JOIN unnest(%(equipment_ids)s::int[]) AS equipment_id
+        ON CONFLICT (equipment_id, exercise_id) DO NOTHING
+        RETURNING equipment_id
+    )
+    SELECT ARRAY(SELECT equipment_id FROM added),
+           ARRAY(SELECT equipment_id FROM removed),
+           EXISTS (SELECT 1 FROM owned);
+"""
+
+SEARCH_DEFAULT_EXERCISES = catalog_search_query(
+    "exercise",
+    "exercise_id, user_id, exercise_name, description, active",
+    "exercise_name",
+    "user_id IS NULL",
+)
+
+SEARCH_USER_EXERCISES = catalog_search_query(
+    "exercise",
+    "exercise_id, user_id, exercise_name, description, active",
+    "exercise_name",
+    "user_id = %(user_id)s",
+)
+
+
+def _search_descriptions(owner: str) -> str:
+    return f"""
+    SELECT exercise_id, user_id, exercise_name, description, active,
+           ts_rank_cd(search_document, query) AS rank
+    FROM exercise
+    CROSS JOIN websearch_to_tsquery(
+        'simple', immutable_unaccent(%(query)s)
+    ) AS query
+    WHERE {owner} AND active = true AND search_document @@ query
+    ORDER BY rank DESC, exercise_name
+    LIMIT %(limit)s;
+"""
+
+
+SEARCH_DEFAULT_EXERCISE_DESCRIPTIONS = _search_descriptions("user_id IS NULL")
+
+SEARCH_USER_EXERCISE_DESCRIPTIONS = _search_descriptions("user_id = %(user_id)s")
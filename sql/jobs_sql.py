@@ -0,0 +1,76 @@
+# Users are split into %(partition_count)s partitions by ID, each processed
+# by its own worker.
+GET_SHARD_USERS = """
+    SELECT DISTINCT user_id
+    FROM workout_plan
+    WHERE user_id > %(after)s
+    AND user_id %% %(partition_count)s = %(partition_index)s
+    ORDER BY user_id
+    LIMIT %(limit)s;
+"""
+
+# A partition whose last run finished (or any partition, without
+# %(resume)s) starts over; an unfinished one keeps its progress.
+START_JOB_PARTITION = """
+    INSERT INTO job_checkpoint
+    (job_name, shard_name, partition_index, partition_count)
+    VALUES (
+        %(job_name)s, %(shard_name)s, %(partition_index)s, %(partition_count)s
+    )
+    ON CONFLICT (job_name, shard_name, partition_index) DO UPDATE
+    SET partition_count = EXCLUDED.partition_count,
+        last_user_id = 0,
+        users_processed = 0,
+        items_processed = 0,
+        status = 'running',
+        started_at = now(),
+        updated_at = now(),
+        finished_at = NULL
+    WHERE job_checkpoint.status = 'done' OR NOT %(resume)s;
+"""
+
+GET_JOB_CHECKPOINT = """
+    SELECT last_user_id, users_processed, items_processed
+    FROM job_checkpoint
+    WHERE job_name = %s AND shard_name = %s AND partition_index = %s;
+"""
+
+ADVANCE_JOB_CHECKPOINT = """
+    UPDATE job_checkpoint
+    SET last_user_id = %s,
+        users_processed = users_processed + %s,
+        items_processed = items_processed + %s,
+        updated_at = now()
+    WHERE job_name = %s AND shard_name = %s AND partition_index = %s;
+"""
+
+FINISH_JOB_PARTITION = """
+    UPDATE job_checkpoint
+    SET status = 'done', updated_at = now(), finished_at = now()
+    WHERE job_name = %s AND shard_name = %s AND partition_index = %s;
+"""
+
+# Whole-shard jobs are checkpointed once, when done: a rerun after a crash
+# overwrites the count instead of adding to it.
+FINISH_JOB_SHARD = """
+    UPDATE job_checkpoint
+    SET items_processed = %s,
+        status = 'done',
+        updated_at = now(),
+        finished_at = now()
+    WHERE job_name = %s AND shard_name = %s AND partition_index = 0;
+"""
+
+DELETE_JOB_CHECKPOINTS = """
+    DELETE FROM job_checkpoint
+    WHERE job_name = %s;
+"""
+
+GET_JOB_CHECKPOINTS = """
+    SELECT shard_name, partition_index, partition_count, status, last_user_id,
+           users_processed, items_processed, started_at, updated_at,
+           finished_at
+    FROM job_checkpoint
+    WHERE job_name = %s
+    ORDER BY shard_name, partition_index;
+"""
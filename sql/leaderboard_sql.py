@@ -0,0 +1,189 @@
+# Scores use the same definitions as the progress series: volume is
+# weight x reps and the estimated 1RM uses the Epley formula on sets of up
+# to %(e1rm_max_reps)s reps. Periods are months ("YYYY-MM") for both
+# metrics, plus "all" for the all-time best estimated 1RM.
+
+_MONTHLY_SCORES = """
+    monthly AS (
+        SELECT sets.exercise_id, sets.user_id,
+               to_char(sets.report_date, 'YYYY-MM') AS period,
+               sum(sets.volume) AS volume,
+               max(sets.report_date) AS last_day,
+               max(sets.e1rm) AS e1rm,
+               (array_agg(sets.report_date ORDER BY sets.e1rm DESC NULLS LAST))[1]
+                   AS e1rm_day
+        FROM sets
+        GROUP BY sets.exercise_id, sets.user_id, period
+    ),
+    scores AS (
+        SELECT 'volume' AS metric, exercise_id, period, user_id,
+               volume AS score, last_day AS achieved_on
+        FROM monthly
+        UNION ALL
+        SELECT 'e1rm', exercise_id, period, user_id, e1rm, e1rm_day
+        FROM monthly
+        UNION ALL
+        (
+            SELECT DISTINCT ON (exercise_id, user_id)
+                   'e1rm', exercise_id, 'all', user_id, e1rm, e1rm_day
+            FROM monthly
+            WHERE e1rm IS NOT NULL
+            ORDER BY exercise_id, user_id, e1rm DESC, e1rm_day
+        )
+    )
+"""
+
+_SET_SCORES = """
+    SELECT sr.exercise_id, wp.user_id, sr.report_date,
+           sr.weight * sr.reps_count AS volume,
+           CASE
+               WHEN sr.reps_count BETWEEN 1 AND %(e1rm_max_reps)s
+               THEN sr.weight * (1 + sr.reps_count / 30.0)
+           END AS e1rm
+    FROM set_report sr
+    JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
+    JOIN exercise e ON e.exercise_id = sr.exercise_id AND e.user_id IS NULL
+"""
+
+# Recomputes the user's scores for the months of the new sets, from that
+# user's sets of those exercises and months only, and stores the ones that
+# reach the current top %(size)s. TRIM_LEADERBOARD then drops whoever
+# fell off.
+RECORD_LEADERBOARD_SCORES = f"""
+    WITH touched AS (
+        SELECT DISTINCT t.exercise_id,
+               date_trunc('month', t.report_date)::date AS month
+        FROM unnest(%(exercise_ids)s::int[], %(report_dates)s::date[])
+            AS t(exercise_id, report_date)
+    ),
+    sets AS (
+        {_SET_SCORES}
+        JOIN touched t
+            ON t.exercise_id = sr.exercise_id
+            AND sr.report_date >= t.month
+            AND sr.report_date < t.month + interval '1 month'
+        WHERE wp.user_id = %(user_id)s
+    ),
+    {_MONTHLY_SCORES}
+    INSERT INTO leaderboard_entry
+    (metric, exercise_id, period, user_id, score, achieved_on)
+    SELECT s.metric, s.exercise_id, s.period, s.user_id, s.score, s.achieved_on
+    FROM scores s
+    WHERE s.score IS NOT NULL
+    AND (
+        EXISTS (
+            SELECT 1
+            FROM leaderboard_entry le
+            WHERE (le.metric, le.exercise_id, le.period, le.user_id)
+                = (s.metric, s.exercise_id, s.period, s.user_id)
+        )
+        OR (
+            SELECT count(*)
+            FROM leaderboard_entry le
+            WHERE (le.metric, le.exercise_id, le.period)
+                = (s.metric, s.exercise_id, s.period)
+        ) < %(size)s
+        OR s.score > (
+            SELECT min(le.score)
+            FROM leaderboard_entry le
+            WHERE (le.metric, le.exercise_id, le.period)
+                = (s.metric, s.exercise_id, s.period)
+        )
+    )
+    ON CONFLICT (metric, exercise_id, period, user_id) DO UPDATE
+    SET score = GREATEST(leaderboard_entry.score, EXCLUDED.score),
+        achieved_on = CASE
+            WHEN EXCLUDED.score >= leaderboard_entry.score
+            THEN EXCLUDED.achieved_on
+            ELSE leaderboard_entry.achieved_on
+        END,
+        updated_at = now()
+    RETURNING metric, exercise_id, period;
+"""
+
+TRIM_LEADERBOARD = """
+    DELETE FROM leaderboard_entry le
+    USING (
+        SELECT metric, exercise_id, period, user_id,
+               row_number() OVER (
+                   PARTITION BY metric, exercise_id, period
+                   ORDER BY score DESC, achieved_on, user_id
+               ) AS position
+        FROM leaderboard_entry
+        WHERE (metric, exercise_id, period) IN (
+            SELECT *
+            FROM unnest(%s::varchar[], %s::int[], %s::varchar[])
+        )
+    ) ranked
+    WHERE ranked.position > %s
+    AND (le.metric, le.exercise_id, le.period, le.user_id)
+        = (ranked.metric, ranked.exercise_id, ranked.period, ranked.user_id);
+"""
+
+# All-time bests are kept: the sets they came from may have been archived
+# since.
+DELETE_RECONCILED_LEADERBOARDS = """
+    DELETE FROM leaderboard_entry
+    WHERE period <> 'all' AND period >= to_char(%s::date, 'YYYY-MM');
+"""
+
+# Rebuilds the monthly boards of the months from %(since)s on and folds the
+# bests of those months into the all-time boards, which only ever improve.
+# Older sets are not read. TRIM_ALL_TIME_LEADERBOARDS then drops whoever
+# fell off the all-time boards.
+RECONCILE_LEADERBOARDS = f"""
+    WITH sets AS (
+        {_SET_SCORES}
+        WHERE sr.report_date >= %(since)s
+    ),
+    {_MONTHLY_SCORES},
+    ranked AS (
+        SELECT scores.*,
+               row_number() OVER (
+                   PARTITION BY metric, exercise_id, period
+                   ORDER BY score DESC, achieved_on, user_id
+               ) AS position
+        FROM scores
+        WHERE score IS NOT NULL
+    )
+    INSERT INTO leaderboard_entry
+    (metric, exercise_id, period, user_id, score, achieved_on)
+    SELECT metric, exercise_id, period, user_id, score, achieved_on
+    FROM ranked
+    WHERE position <= %(size)s
+    ON CONFLICT (metric, exercise_id, period, user_id) DO UPDATE
+    SET score = EXCLUDED.score,
+        achieved_on = EXCLUDED.achieved_on,
+        updated_at = now()
+    WHERE EXCLUDED.score > leaderboard_entry.score;
+"""
+
+TRIM_ALL_TIME_LEADERBOARDS = """
+    DELETE FROM leaderboard_entry le
+    USING (
+        SELECT metric, exercise_id, period, user_id,
+               row_number() OVER (
+                   PARTITION BY metric, exercise_id
+                   ORDER BY score DESC, achieved_on, user_id
+               ) AS position
+        FROM leaderboard_entry
+        WHERE period = 'all'
+    ) ranked
+    WHERE ranked.position > %s
+    AND (le.metric, le.exercise_id, le.period, le.user_id)
+        = (ranked.metric, ranked.exercise_id, ranked.period, ranked.user_id);
+"""
+
+GET_LEADERBOARD = """
+    SELECT user_id, score, achieved_on
+    FROM leaderboard_entry
+    WHERE metric = %s AND exercise_id = %s AND period = %s
+    ORDER BY score DESC, achieved_on, user_id
+    LIMIT %s;
+"""
+
+GET_LEADERBOARD_USER_NAMES = """
+    SELECT user_id, name
+    FROM "user"
+    WHERE user_id = ANY(%s);
+"""
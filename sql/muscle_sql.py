@@ -1,3 +1,5 @@
+from sql.search_sql import catalog_search_query
+
 INSERT_MUSCLE = """
     INSERT INTO muscle (user_id, group_name, muscle_name, active)
     VALUES (%s, %s, %s, %s)
@@ -36,8 +38,34 @@ GET_MUSCLE_BY_NAME = """
     WHERE muscle_name = %s AND user_id = %s;
 """
 
+GET_MUSCLES_BY_IDS = """
+    SELECT muscle_id, user_id, group_name, muscle_name, active
+    FROM muscle
+    WHERE muscle_id = ANY(%s::int[]) AND user_id = %s;
+"""
+
+GET_MUSCLES_BY_NAMES = """
+    SELECT muscle_id, user_id, group_name, muscle_name, active
+    FROM muscle
+    WHERE muscle_name = ANY(%s::text[]) AND user_id = %s;
+"""
+
 DELETE_MUSCLE = """
     DELETE FROM muscle
     WHERE muscle_id = %s AND user_id = %s;
     RETURNING muscle_id;
 """
+
+SEARCH_DEFAULT_MUSCLES = catalog_search_query(
+    "muscle",
+    "muscle_id, user_id, group_name, muscle_name, active",
+    "muscle_name",
+    "user_id IS NULL",
+)
+
+SEARCH_USER_MUSCLES = catalog_search_query(
+    "muscle",
+    "muscle_id, user_id, group_name, muscle_name, active",
+    "muscle_name",
+    "user_id = %(user_id)s",
+)
@@ -0,0 +1,96 @@
+# Users who trained since %(since)s, plus those still holding suggestions so
+# that suggestions no longer backed by recent sessions get deleted. Follows
+# the partitioning of GET_SHARD_USERS.
+GET_SUGGESTION_USERS = """
+    SELECT wp.user_id
+    FROM workout_report wr
+    JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+    WHERE wr.report_date >= %(since)s AND wp.active
+    AND wp.user_id > %(after)s
+    AND wp.user_id %% %(partition_count)s = %(partition_index)s
+    UNION
+    SELECT user_id
+    FROM overload_suggestion
+    WHERE user_id > %(after)s
+    AND user_id %% %(partition_count)s = %(partition_index)s
+    ORDER BY user_id
+    LIMIT %(limit)s;
+"""
+
+# Per active split exercise of the users, its most recent %(sessions)s
+# sessions since %(since)s: the top weight and, at that weight, how many sets
+# were done and the fewest reps in any of them.
+GET_OVERLOAD_HISTORY = """
+    WITH targets AS (
+        SELECT wp.user_id, se.workout_plan_id, se.split, se.exercise_id,
+               se.execution_order, se.sets, se.reps
+        FROM split_exercise se
+        JOIN workout_split ws
+            ON ws.workout_plan_id = se.workout_plan_id AND ws.split = se.split
+        JOIN workout_plan wp ON wp.workout_plan_id = se.workout_plan_id
+        WHERE wp.user_id = ANY(%(user_ids)s)
+        AND wp.active AND ws.active AND se.active
+    ),
+    session_sets AS (
+        SELECT sr.workout_plan_id, sr.split, sr.exercise_id, sr.execution_order,
+               sr.workout_report_id, sr.report_date, sr.weight, sr.reps_count,
+               max(sr.weight) OVER (
+                   PARTITION BY sr.workout_report_id, sr.report_date,
+                                sr.exercise_id, sr.execution_order
+               ) AS top_weight
+        FROM targets t
+        JOIN set_report sr
+            ON sr.workout_plan_id = t.workout_plan_id
+            AND sr.split = t.split
+            AND sr.exercise_id = t.exercise_id
+            AND sr.execution_order = t.execution_order
+        WHERE sr.report_date >= %(since)s
+    ),
+    sessions AS (
+        SELECT workout_plan_id, split, exercise_id, execution_order, report_date,
+               max(top_weight) AS top_weight,
+               count(*) FILTER (WHERE weight = top_weight) AS top_sets,
+               min(reps_count) FILTER (WHERE weight = top_weight) AS top_min_reps,
+               row_number() OVER (
+                   PARTITION BY workout_plan_id, split, exercise_id, execution_order
+                   ORDER BY report_date DESC, workout_report_id DESC
+               ) AS recency
+        FROM session_sets
+        GROUP BY workout_plan_id, split, exercise_id, execution_order,
+                 workout_report_id, report_date
+    )
+    SELECT t.user_id, t.workout_plan_id, t.split, t.exercise_id,
+           t.execution_order, t.sets, t.reps, s.recency, s.report_date,
+           s.top_weight, s.top_sets, s.top_min_reps
+    FROM targets t
+    JOIN sessions s
+        ON s.workout_plan_id = t.workout_plan_id
+        AND s.split = t.split
+        AND s.exercise_id = t.exercise_id
+        AND s.execution_order = t.execution_order
+    WHERE s.recency <= %(sessions)s
+    ORDER BY t.workout_plan_id, t.split, t.exercise_id, t.execution_order,
+             s.recency;
+"""
+
+DELETE_USERS_SUGGESTIONS = """
+    DELETE FROM overload_suggestion
+    WHERE user_id = ANY(%s);
+"""
+
+INSERT_SUGGESTIONS = """
+    INSERT INTO overload_suggestion
+    (workout_plan_id, split, exercise_id, execution_order, user_id, action,
+     suggested_sets, suggested_reps, suggested_weight, last_weight, last_reps,
+     based_on)
+    VALUES %s;
+"""
+
+GET_SPLIT_SUGGESTIONS = """
+    SELECT os.exercise_id, os.execution_order, os.action, os.suggested_sets,
+           os.suggested_reps, os.suggested_weight, os.last_weight, os.last_reps,
+           os.based_on, os.computed_at
+    FROM overload_suggestion os
+    WHERE os.workout_plan_id = %s AND os.split = %s AND os.user_id = %s
+    ORDER BY os.execution_order;
+"""
@@ -0,0 +1,14 @@
+LISTEN_WORKOUT_PLAN_CHANGED = "LISTEN workout_plan_changed;"
+
+# Delivered to listeners only when the surrounding transaction commits.
+NOTIFY_WORKOUT_PLAN_CHANGED = "SELECT pg_notify('workout_plan_changed', %s);"
+
+GET_PLAN_TREE_EXERCISES = """
+    SELECT se.split, se.exercise_id, se.execution_order, se.sets, se.reps,
+           se.advanced_technique, se.rest_time, se.active,
+           e.exercise_name, e.description
+    FROM split_exercise se
+    JOIN exercise e ON e.exercise_id = se.exercise_id
+    WHERE se.workout_plan_id = %s AND se.active = true
+    ORDER BY se.split, se.execution_order;
+"""
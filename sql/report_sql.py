@@ -1,7 +1,24 @@
+# A replayed insert with the same idempotency key returns the existing row
+# without writing it, so its row_version does not change.
 INSERT_WORKOUT_REPORT = """
-    INSERT INTO workout_report (workout_plan_id, report_date, split)
-    VALUES (%s, %s, %s)
-    RETURNING workout_report_id;
+    WITH new_report AS (
+        INSERT INTO workout_report
+        (workout_plan_id, report_date, split, idempotency_key)
+        SELECT workout_plan_id, %(report_date)s, %(split)s, %(idempotency_key)s
+        FROM workout_plan
+        WHERE workout_plan_id = %(workout_plan_id)s AND user_id = %(user_id)s
+        ON CONFLICT (idempotency_key, report_date) DO NOTHING
+        RETURNING workout_report_id, report_date
+    )
+    SELECT workout_report_id, report_date FROM new_report
+    UNION ALL
+    SELECT wr.workout_report_id, wr.report_date
+    FROM workout_report wr
+    JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+    WHERE wr.idempotency_key = %(idempotency_key)s
+    AND wr.report_date = %(report_date)s
+    AND wr.workout_plan_id = %(workout_plan_id)s
+    AND wp.user_id = %(user_id)s;
 """
 
 GET_WORKOUT_REPORT_BY_ID = """
@@ -17,6 +34,7 @@ GET_WORKOUT_REPORTS_BY_PLAN = """
     FROM workout_report wr
     JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
     WHERE wr.workout_plan_id = %s AND wp.user_id = %s
+    AND wr.report_date >= COALESCE(%s::date, '-infinity'::date)
     ORDER BY wr.report_date DESC
     LIMIT %s OFFSET %s;
 """
@@ -29,15 +47,189 @@ DELETE_WORKOUT_REPORT = """
         FROM workout_plan 
         WHERE user_id = %s
     )
-    RETURNING workout_report_id;
+    RETURNING workout_report_id, report_date;
 """
 
+# The split and plan come from the report, and the exercise must be at
+# that execution order in the report's split; returns nothing otherwise.
 INSERT_SET_REPORT = """
-    INSERT INTO set_report 
-    (workout_report_id, exercise_id, split, workout_plan_id, 
-     execution_order, set_number, reps, weight, notes)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-    RETURNING workout_report_id;
+    INSERT INTO set_report
+    (workout_report_id, report_date, exercise_id, split, workout_plan_id,
+     execution_order, set_number, reps, weight, notes, idempotency_key)
+    SELECT wr.workout_report_id, wr.report_date, se.exercise_id, wr.split,
+           wr.workout_plan_id, se.execution_order, %(set_number)s, %(reps)s,
+           %(weight)s, %(notes)s, %(idempotency_key)s
+    FROM workout_report wr
+    JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+    JOIN split_exercise se
+        ON (se.workout_plan_id, se.split, se.exercise_id, se.execution_order)
+            = (wr.workout_plan_id, wr.split, %(exercise_id)s, %(execution_order)s)
+    WHERE wr.workout_report_id = %(workout_report_id)s
+    AND wp.user_id = %(user_id)s
+    ON CONFLICT (idempotency_key, report_date) DO UPDATE
+    SET reps = EXCLUDED.reps, weight = EXCLUDED.weight, notes = EXCLUDED.notes
+    WHERE set_report.workout_report_id = EXCLUDED.workout_report_id
+    AND (set_report.reps, set_report.weight, set_report.notes)
+        IS DISTINCT FROM (EXCLUDED.reps, EXCLUDED.weight, EXCLUDED.notes)
+    RETURNING workout_report_id, exercise_id, report_date;
+"""
+
+# Set already stored under an idempotency key, in one of the user's reports.
+GET_SET_REPORT_BY_KEY = """
+    SELECT sr.workout_report_id, sr.exercise_id, sr.split, sr.workout_plan_id,
+           sr.execution_order, sr.set_number, sr.reps, sr.weight, sr.notes,
+           sr.report_date
+    FROM set_report sr
+    JOIN workout_report wr
+        ON wr.workout_report_id = sr.workout_report_id
+        AND wr.report_date = sr.report_date
+    JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+    WHERE sr.idempotency_key = %s
+    AND sr.workout_report_id = %s
+    AND wp.user_id = %s;
+"""
+
+# Bulk replay of offline writes. Rows whose plan or report is not the
+# user's are skipped; keys already stored resolve to the existing rows,
+# which are not written again.
+UPSERT_WORKOUT_REPORTS = """
+    WITH r AS (
+        SELECT r.*
+        FROM unnest(%s::int[], %s::date[], %s::varchar[], %s::uuid[])
+            AS r(workout_plan_id, report_date, split, idempotency_key)
+        JOIN workout_plan wp ON wp.workout_plan_id = r.workout_plan_id
+        WHERE wp.user_id = %s
+    ), new_reports AS (
+        INSERT INTO workout_report
+        (workout_plan_id, report_date, split, idempotency_key)
+        SELECT workout_plan_id, report_date, split, idempotency_key
+        FROM r
+        ON CONFLICT (idempotency_key, report_date) DO NOTHING
+        RETURNING idempotency_key, workout_report_id, report_date
+    )
+    SELECT idempotency_key::text, workout_report_id, report_date
+    FROM new_reports
+    UNION ALL
+    SELECT wr.idempotency_key::text, wr.workout_report_id, wr.report_date
+    FROM workout_report wr
+    JOIN r
+        ON r.idempotency_key = wr.idempotency_key
+        AND r.report_date = wr.report_date
+        AND r.workout_plan_id = wr.workout_plan_id;
+"""
+
+# Sets whose key is already stored in the same report are updated, only if
+# their values changed; new keys are inserted. A set whose exercise is not at
+# its execution order in the report's split, a new set whose number is
+# already taken in the report, or one whose key belongs to another report, is
+# skipped and left out of the result. The last column tells whether the row
+# was written.
+UPSERT_SET_REPORTS = """
+    WITH s AS (
+        SELECT s.*, wr.split, wr.workout_plan_id
+        FROM unnest(
+            %s::int[], %s::date[], %s::int[], %s::int[], %s::int[],
+            %s::varchar[], %s::int[], %s::varchar[], %s::uuid[]
+        ) AS s(workout_report_id, report_date, exercise_id, execution_order,
+               set_number, reps, weight, notes, idempotency_key)
+        JOIN workout_report wr
+            ON wr.workout_report_id = s.workout_report_id
+            AND wr.report_date = s.report_date
+        JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+        JOIN split_exercise se
+            ON (se.workout_plan_id, se.split, se.exercise_id, se.execution_order)
+                = (wr.workout_plan_id, wr.split, s.exercise_id, s.execution_order)
+        WHERE wp.user_id = %s
+    ), existing AS (
+        SELECT sr.idempotency_key, sr.exercise_id, sr.report_date,
+               (sr.reps, sr.weight, sr.notes)
+                   IS DISTINCT FROM (s.reps, s.weight, s.notes) AS changed
+        FROM set_report sr
+        JOIN s
+            ON sr.idempotency_key = s.idempotency_key
+            AND sr.report_date = s.report_date
+            AND sr.workout_report_id = s.workout_report_id
+    ), updated AS (
+        UPDATE set_report sr
+        SET reps = s.reps, weight = s.weight, notes = s.notes
+        FROM s
+        WHERE sr.idempotency_key = s.idempotency_key
+        AND sr.report_date = s.report_date
+        AND sr.workout_report_id = s.workout_report_id
+        AND (sr.reps, sr.weight, sr.notes)
+            IS DISTINCT FROM (s.reps, s.weight, s.notes)
+    ), inserted AS (
+        INSERT INTO set_report
+        (workout_report_id, report_date, exercise_id, split, workout_plan_id,
+         execution_order, set_number, reps, weight, notes, idempotency_key)
+        SELECT s.workout_report_id, s.report_date, s.exercise_id, s.split,
+               s.workout_plan_id, s.execution_order, s.set_number, s.reps,
+               s.weight, s.notes, s.idempotency_key
+        FROM s
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM set_report sr
+            WHERE sr.idempotency_key = s.idempotency_key
+            AND sr.report_date = s.report_date
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING idempotency_key, exercise_id, report_date
+    )
+    SELECT idempotency_key::text, exercise_id, report_date, changed
+    FROM existing
+    UNION ALL
+    SELECT idempotency_key::text, exercise_id, report_date, true
+    FROM inserted;
+"""
+
+# Serializes set numbering within a report: LOG_NEXT_SET runs after this in
+# the same transaction, so its snapshot includes every set logged by the
+# previous holder of the lock.
+LOCK_WORKOUT_REPORT = """
+    SELECT wr.workout_report_id
+    FROM workout_report wr
+    JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+    WHERE wr.workout_report_id = %(workout_report_id)s
+    AND wp.user_id = %(user_id)s
+    FOR UPDATE OF wr;
+"""
+
+# Picks the split_exercise row of the report's split for the exercise (the
+# requested execution order, or its first occurrence) and numbers the set
+# after the ones already logged. Returns nothing when the report is not the
+# user's, the exercise is not part of its split or the idempotency key is
+# already stored.
+LOG_NEXT_SET = """
+    INSERT INTO set_report
+    (workout_report_id, report_date, exercise_id, split, workout_plan_id,
+     execution_order, set_number, reps, weight, notes, idempotency_key)
+    SELECT wr.workout_report_id, wr.report_date, se.exercise_id, se.split,
+           se.workout_plan_id, se.execution_order,
+           COALESCE((
+               SELECT max(sr.set_number)
+               FROM set_report sr
+               WHERE sr.workout_report_id = wr.workout_report_id
+               AND sr.report_date = wr.report_date
+               AND sr.exercise_id = se.exercise_id
+               AND sr.split = se.split
+               AND sr.workout_plan_id = se.workout_plan_id
+           ), 0) + 1,
+           %(reps)s, %(weight)s, %(notes)s, %(idempotency_key)s
+    FROM workout_report wr
+    JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+    JOIN split_exercise se
+        ON se.workout_plan_id = wr.workout_plan_id AND se.split = wr.split
+    WHERE wr.workout_report_id = %(workout_report_id)s
+    AND wp.user_id = %(user_id)s
+    AND se.exercise_id = %(exercise_id)s
+    AND se.execution_order = COALESCE(
+        %(execution_order)s::int, se.execution_order
+    )
+    ORDER BY se.execution_order
+    LIMIT 1
+    ON CONFLICT (idempotency_key, report_date) DO NOTHING
+    RETURNING workout_report_id, exercise_id, split, workout_plan_id,
+              execution_order, set_number, reps, weight, notes, report_date;
 """
 
 GET_SET_REPORTS_BY_WORKOUT = """
@@ -48,6 +240,9 @@ GET_SET_REPORTS_BY_WORKOUT = """
     JOIN exercise e ON e.exercise_id = sr.exercise_id
     JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
     WHERE sr.workout_report_id = %s 
+    AND sr.report_date = (
+        SELECT report_date FROM workout_report WHERE workout_report_id = %s
+    )
     AND wp.user_id = %s
     ORDER BY sr.execution_order, sr.set_number;
 """
@@ -55,19 +250,164 @@ GET_SET_REPORTS_BY_WORKOUT = """
 GET_SET_REPORTS_BY_EXERCISE = """
     SELECT sr.workout_report_id, sr.exercise_id, sr.split, sr.workout_plan_id,
            sr.execution_order, sr.set_number, sr.reps, sr.weight, sr.notes,
-           wr.report_date
+           sr.report_date
     FROM set_report sr
-    JOIN workout_report wr ON wr.workout_report_id = sr.workout_report_id
     JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
     WHERE sr.exercise_id = %s 
     AND wp.user_id = %s
-    ORDER BY wr.report_date DESC, sr.set_number
+    AND sr.report_date >= COALESCE(%s::date, '-infinity'::date)
+    ORDER BY sr.report_date DESC, sr.set_number
     LIMIT %s OFFSET %s;
 """
 
+COUNT_SET_REPORTS_BY_EXERCISE = """
+    SELECT COUNT(*)
+    FROM set_report sr
+    JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
+    WHERE sr.exercise_id = %s
+    AND wp.user_id = %s
+    AND sr.report_date >= COALESCE(%s::date, '-infinity'::date);
+"""
+
+GET_SET_REPORTS_BY_USER = """
+    SELECT sr.workout_report_id, sr.exercise_id, sr.split, sr.workout_plan_id,
+           sr.execution_order, sr.set_number, sr.reps, sr.weight, sr.notes,
+           sr.report_date
+    FROM set_report sr
+    JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
+    WHERE wp.user_id = %s
+    AND sr.report_date >= COALESCE(%s::date, '-infinity'::date)
+    ORDER BY sr.report_date DESC, sr.workout_report_id, sr.execution_order,
+             sr.set_number;
+"""
+
+# Headlines are only built for the rows of the requested page.
+SEARCH_SET_NOTES = """
+    SELECT page.*,
+           ts_headline(
+               'simple',
+               page.notes,
+               websearch_to_tsquery('simple', immutable_unaccent(%(query)s))
+           )
+    FROM (
+        SELECT sr.workout_report_id, sr.exercise_id, sr.split,
+               sr.workout_plan_id, sr.execution_order, sr.set_number, sr.reps,
+               sr.weight, sr.notes, sr.report_date, e.exercise_name,
+               ts_rank_cd(sr.notes_document, query) AS rank
+        FROM set_report sr
+        JOIN workout_plan wp ON wp.workout_plan_id = sr.workout_plan_id
+        JOIN exercise e ON e.exercise_id = sr.exercise_id
+        CROSS JOIN websearch_to_tsquery(
+            'simple', immutable_unaccent(%(query)s)
+        ) AS query
+        WHERE wp.user_id = %(user_id)s
+        AND sr.notes_document @@ query
+        AND sr.report_date >= COALESCE(%(since)s::date, '-infinity'::date)
+        ORDER BY rank DESC, sr.report_date DESC, sr.workout_report_id,
+                 sr.set_number
+        LIMIT %(limit)s OFFSET %(offset)s
+    ) AS page
+    ORDER BY page.rank DESC, page.report_date DESC, page.workout_report_id,
+             page.set_number;
+"""
+
+# Totals per exercise for the report and the previous one of the same plan
+# and split; LAG pairs each exercise with its previous totals, from which
+# the differences are taken, and LEAD spots exercises done last time but
+# skipped now. The outer join keeps one row
+# even when neither session has sets, so an empty result means not found.
+COMPARE_WITH_PREVIOUS_SESSION = """
+    WITH current_report AS (
+        SELECT wr.workout_report_id, wr.workout_plan_id, wr.split, wr.report_date
+        FROM workout_report wr
+        JOIN workout_plan wp ON wp.workout_plan_id = wr.workout_plan_id
+        WHERE wr.workout_report_id = %(workout_report_id)s
+        AND wp.user_id = %(user_id)s
+    ),
+    previous_report AS (
+        SELECT wr.workout_report_id, wr.report_date
+        FROM workout_report wr
+        JOIN current_report c
+            ON wr.workout_plan_id = c.workout_plan_id AND wr.split = c.split
+        WHERE (wr.report_date, wr.workout_report_id)
+            < (c.report_date, c.workout_report_id)
+        ORDER BY wr.report_date DESC, wr.workout_report_id DESC
+        LIMIT 1
+    ),
+    sessions AS (
+        SELECT workout_report_id, report_date FROM current_report
+        UNION ALL
+        SELECT workout_report_id, report_date FROM previous_report
+    ),
+    totals AS (
+        SELECT s.workout_report_id, s.report_date, sr.exercise_id,
+               min(sr.execution_order) AS execution_order,
+               count(*) AS sets,
+               sum(sr.reps_count) AS reps,
+               max(sr.weight) AS top_weight,
+               sum(sr.reps_count * sr.weight) AS volume
+        FROM sessions s
+        JOIN set_report sr
+            ON sr.workout_report_id = s.workout_report_id
+            AND sr.report_date = s.report_date
+        GROUP BY s.workout_report_id, s.report_date, sr.exercise_id
+    ),
+    compared AS (
+        SELECT t.*,
+               lag(t.sets) OVER w AS previous_sets,
+               lag(t.reps) OVER w AS previous_reps,
+               lag(t.top_weight) OVER w AS previous_top_weight,
+               lag(t.volume) OVER w AS previous_volume,
+               t.sets - lag(t.sets) OVER w AS sets_delta,
+               t.reps - lag(t.reps) OVER w AS reps_delta,
+               t.top_weight - lag(t.top_weight) OVER w AS top_weight_delta,
+               t.volume - lag(t.volume) OVER w AS volume_delta,
+               lead(t.workout_report_id) OVER w AS next_report_id
+        FROM totals t
+        WINDOW w AS (
+            PARTITION BY t.exercise_id
+            ORDER BY t.report_date, t.workout_report_id
+        )
+    )
+    SELECT c.workout_report_id, p.workout_report_id, p.report_date,
+           x.exercise_id, e.exercise_name, x.execution_order,
+           CASE WHEN x.workout_report_id = c.workout_report_id THEN x.sets END,
+           CASE WHEN x.workout_report_id = c.workout_report_id THEN x.reps END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.top_weight END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.volume END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.previous_sets ELSE x.sets END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.previous_reps ELSE x.reps END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.previous_top_weight ELSE x.top_weight END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.previous_volume ELSE x.volume END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.sets_delta END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.reps_delta END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.top_weight_delta END,
+           CASE WHEN x.workout_report_id = c.workout_report_id
+                THEN x.volume_delta END
+    FROM current_report c
+    LEFT JOIN previous_report p ON true
+    LEFT JOIN compared x
+        ON x.workout_report_id = c.workout_report_id
+        OR (x.workout_report_id = p.workout_report_id AND x.next_report_id IS NULL)
+    LEFT JOIN exercise e ON e.exercise_id = x.exercise_id
+    ORDER BY x.workout_report_id = c.workout_report_id DESC, x.execution_order;
+"""
+
 DELETE_SET_REPORT = """
     DELETE FROM set_report
     WHERE workout_report_id = %s
+    AND report_date = (
+        SELECT report_date FROM workout_report WHERE workout_report_id = %s
+    )
     AND workout_plan_id IN (
         SELECT workout_plan_id 
         FROM workout_plan 
@@ -0,0 +1,30 @@
+# Scoped to the current transaction, like SET LOCAL.
+SET_SIMILARITY_THRESHOLD = (
+    "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true);"
+)
+
+
+def catalog_search_query(
+    table: str, columns: str, name_column: str, owner: str
+) -> str:
+    """
+    Build a name search over a catalog table.
+
+    Names and the query are compared lowercased and without accents, the
+    same expression the trigram indexes are built on. Prefix matches rank
+    first, then substring and typo-tolerant matches by word similarity.
+    """
+    name = f"immutable_unaccent(lower({name_column}))"
+    return f"""
+    SELECT {columns},
+           {name} LIKE immutable_unaccent(lower(%(prefix)s)) AS prefix_match,
+           word_similarity(immutable_unaccent(lower(%(query)s)), {name}) AS score
+    FROM {table}
+    WHERE {owner} AND active = true
+    AND (
+        {name} LIKE immutable_unaccent(lower(%(contains)s))
+        OR immutable_unaccent(lower(%(query)s)) <%% {name}
+    )
+    ORDER BY prefix_match DESC, score DESC, {name_column}
+    LIMIT %(limit)s;
+"""
@@ -0,0 +1,91 @@
+GET_SHARD_ASSIGNMENTS = """
+    SELECT user_id, shard_name, status
+    FROM shard_assignment;
+"""
+
+UPSERT_SHARD_ASSIGNMENT = """
+    INSERT INTO shard_assignment (user_id, shard_name, status)
+    VALUES (%s, %s, %s)
+    ON CONFLICT (user_id) DO UPDATE
+    SET shard_name = EXCLUDED.shard_name, status = EXCLUDED.status
+    RETURNING user_id;
+"""
+
+_USER_PLANS = (
+    "workout_plan_id IN (SELECT workout_plan_id FROM workout_plan WHERE user_id = %s)"
+)
+_USER_EXERCISES = "exercise_id IN (SELECT exercise_id FROM exercise WHERE user_id = %s)"
+
+# Tables holding user-owned rows, in foreign key order. Each entry is
+# (table, columns, predicate selecting the rows of one user). change_tombstone
+# is left out on purpose: rebalance_user drops the user's tombstones on the
+# source, since sync tokens from another shard force a full sync anyway.
+USER_DATA_TABLES = (
+    ("muscle_group", "group_name, user_id, active", "user_id = %s"),
+    (
+        "equipment",
+        "equipment_id, user_id, group_name, equipment_name, active",
+        "user_id = %s",
+    ),
+    ("muscle", "muscle_id, group_name, user_id, muscle_name, active", "user_id = %s"),
+    (
+        "exercise",
+        "exercise_id, user_id, exercise_name, description, active",
+        "user_id = %s",
+    ),
+    ("exercise_muscle", "muscle_id, exercise_id", _USER_EXERCISES),
+    ("exercise_equipment", "equipment_id, exercise_id", _USER_EXERCISES),
+    (
+        "workout_plan",
+        "workout_plan_id, user_id, workout_plan_name, workout_plan_goal, active",
+        "user_id = %s",
+    ),
+    ("workout_split", "split, workout_plan_id, active", _USER_PLANS),
+    (
+        "split_exercise",
+        "workout_plan_id, split, exercise_id, execution_order, sets, reps, "
+        "advanced_technique, rest_time, active",
+        _USER_PLANS,
+    ),
+    (
+        "workout_report",
+        "workout_report_id, workout_plan_id, report_date, split, idempotency_key",
+        _USER_PLANS,
+    ),
+    (
+        "set_report",
+        "workout_report_id, report_date, exercise_id, split, workout_plan_id, "
+        "execution_order, set_number, reps, weight, notes, idempotency_key",
+        _USER_PLANS,
+    ),
+    (
+        "report_archive",
+        "user_id, archive_year, file_path, row_count, min_date, max_date, "
+        "archived_before, archived_at",
+        "user_id = %s",
+    ),
+    (
+        "user_streak",
+        "user_id, current_start, last_date, current_length, longest_length, "
+        "updated_at",
+        "user_id = %s",
+    ),
+    (
+        "leaderboard_entry",
+        "metric, exercise_id, period, user_id, score, achieved_on, updated_at",
+        "user_id = %s",
+    ),
+    (
+        "overload_suggestion",
+        "workout_plan_id, split, exercise_id, execution_order, user_id, action, "
+        "suggested_sets, suggested_reps, suggested_weight, last_weight, "
+        "last_reps, based_on, computed_at",
+        "user_id = %s",
+    ),
+    (
+        "deletion_job",
+        "deletion_job_id, user_id, target_type, target_id, stage, rows_deleted, "
+        "status, attempts, created_at, updated_at",
+        "user_id = %s",
+    ),
+)
@@ -0,0 +1,65 @@
+# Deletions run after this in the same transaction leave no tombstones.
+SKIP_TOMBSTONES = "SET LOCAL fittude.skip_tombstones = 'on';"
+
+# Oldest transaction still running: every change committed after this point
+# has a row_version at or above it.
+GET_SYNC_HORIZON = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text;"
+
+_USER_PLANS = "SELECT workout_plan_id FROM workout_plan WHERE user_id = %s"
+
+GET_CHANGED_WORKOUT_PLANS = """
+    SELECT workout_plan_id, user_id, workout_plan_name, workout_plan_goal, active,
+           updated_at
+    FROM workout_plan
+    WHERE user_id = %s AND row_version >= %s::xid8;
+"""
+
+GET_CHANGED_WORKOUT_SPLITS = f"""
+    SELECT split, workout_plan_id, active, updated_at
+    FROM workout_split
+    WHERE workout_plan_id IN ({_USER_PLANS}) AND row_version >= %s::xid8;
+"""
+
+GET_CHANGED_SPLIT_EXERCISES = f"""
+    SELECT workout_plan_id, split, exercise_id, execution_order, sets, reps,
+           advanced_technique, rest_time, active, updated_at
+    FROM split_exercise
+    WHERE workout_plan_id IN ({_USER_PLANS}) AND row_version >= %s::xid8;
+"""
+
+GET_CHANGED_EXERCISES = """
+    SELECT exercise_id, user_id, exercise_name, description, active, updated_at
+    FROM exercise
+    WHERE user_id = %s AND row_version >= %s::xid8;
+"""
+
+GET_CHANGED_WORKOUT_REPORTS = f"""
+    SELECT workout_report_id, workout_plan_id, report_date, split, updated_at
+    FROM workout_report
+    WHERE workout_plan_id IN ({_USER_PLANS}) AND row_version >= %s::xid8;
+"""
+
+GET_CHANGED_SET_REPORTS = f"""
+    SELECT workout_report_id, exercise_id, split, workout_plan_id,
+           execution_order, set_number, reps, weight, notes, report_date,
+           updated_at
+    FROM set_report
+    WHERE workout_plan_id IN ({_USER_PLANS}) AND row_version >= %s::xid8;
+"""
+
+GET_TOMBSTONES_SINCE = """
+    SELECT table_name, row_key
+    FROM change_tombstone
+    WHERE user_id = %s AND row_version >= %s::xid8
+    ORDER BY row_version;
+"""
+
+DELETE_USER_TOMBSTONES = """
+    DELETE FROM change_tombstone
+    WHERE user_id = %s;
+"""
+
+PRUNE_TOMBSTONES = """
+    DELETE FROM change_tombstone
+    WHERE deleted_at < now() - %s * INTERVAL '1 day';
+"""
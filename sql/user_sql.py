@@ -1,24 +1,36 @@
 INSERT_USER = """
-    INSERT INTO users (email, name, password)
+    INSERT INTO "user" (email, name, password)
     VALUES (%s, %s, %s)
-    RETURNING id;
+    RETURNING user_id;
 """
 
 UPDATE_USER_PASSWORD = """
-    UPDATE users
+    UPDATE "user"
     SET password = %s
-    WHERE email = %s;
-    RETURNING id;
+    WHERE email = %s
+    RETURNING user_id;
 """
 
 GET_USER_BY_EMAIL = """
-    SELECT id, email, name, password
-    FROM users
+    SELECT user_id, email, name
+    FROM "user"
     WHERE email = %s;
 """
 
 GET_USER_BY_ID = """
-    SELECT id, email, name, password
-    FROM users
-    WHERE id = %s;
+    SELECT user_id, email, name
+    FROM "user"
+    WHERE user_id = %s;
+"""
+
+GET_USER_CREDENTIALS = """
+    SELECT user_id, email, name, password
+    FROM "user"
+    WHERE email = %s;
+"""
+
+DELETE_USER = """
+    DELETE FROM "user"
+    WHERE user_id = %s
+    RETURNING user_id, email;
 """
@@ -61,6 +61,55 @@ GET_SPLIT_EXERCISES = """
     ORDER BY se.execution_order;
 """
 
+# For each exercise of the split, the first lateral finds the newest report
+# in which the user logged it, with one probe of
+# idx_set_report_workout_plan_exercise_report_date per plan of the user
+# (and per monthly partition), and the second collects that report's sets.
+GET_SPLIT_SESSION_CONTEXT = """
+    SELECT se.workout_plan_id, se.split, se.exercise_id, se.execution_order,
+           se.sets, se.reps, se.advanced_technique, se.rest_time, se.active,
+           e.exercise_name, e.description,
+           last_report.workout_report_id, last_report.report_date,
+           COALESCE(last_sets.sets, '[]'::json)
+    FROM split_exercise se
+    JOIN exercise e ON e.exercise_id = se.exercise_id
+    LEFT JOIN LATERAL (
+        SELECT plan_last.workout_report_id, plan_last.report_date
+        FROM workout_plan wp
+        CROSS JOIN LATERAL (
+            SELECT sr.workout_report_id, sr.report_date
+            FROM set_report sr
+            WHERE sr.workout_plan_id = wp.workout_plan_id
+            AND sr.exercise_id = se.exercise_id
+            ORDER BY sr.report_date DESC, sr.workout_report_id DESC
+            LIMIT 1
+        ) plan_last
+        WHERE wp.user_id = %(user_id)s
+        ORDER BY plan_last.report_date DESC, plan_last.workout_report_id DESC
+        LIMIT 1
+    ) last_report ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(
+                   json_build_object(
+                       'set_number', sr.set_number,
+                       'reps', sr.reps,
+                       'weight', sr.weight,
+                       'notes', sr.notes
+                   )
+                   ORDER BY sr.set_number
+               ) AS sets
+        FROM set_report sr
+        WHERE sr.exercise_id = se.exercise_id
+        AND sr.report_date = last_report.report_date
+        AND sr.workout_report_id = last_report.workout_report_id
+    ) last_sets ON true
+    WHERE se.workout_plan_id = %(workout_plan_id)s
+          AND se.split = %(split)s
+          AND e.user_id = %(user_id)s
+          AND se.active = true
+    ORDER BY se.execution_order;
+"""
+
 INSERT_SPLIT_EXERCISE = """
     INSERT INTO split_exercise 
     (workout_plan_id, split, exercise_id, execution_order, sets, reps, 
@@ -68,3 +117,148 @@ INSERT_SPLIT_EXERCISE = """
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
     RETURNING workout_plan_id;
 """
+
+# A single statement: pk_split_exercise is deferrable, so positions are
+# only checked for collisions once every row has moved. Nothing is written
+# unless the ordering lists exactly the active exercises of the split, and
+# the first column of every returned row tells whether it did. Inactive rows
+# are placed after the requested (active) ones.
+REORDER_SPLIT_EXERCISES = """
+    WITH requested AS (
+        SELECT exercise_id, position,
+               row_number() OVER (
+                   PARTITION BY exercise_id ORDER BY position
+               ) AS occurrence
+        FROM unnest(%(ordering)s::int[]) WITH ORDINALITY AS o(exercise_id, position)
+    ), current_rows AS (
+        SELECT se.exercise_id, se.execution_order, se.active IS TRUE AS active,
+               row_number() OVER (
+                   PARTITION BY se.exercise_id, se.active IS TRUE
+                   ORDER BY se.execution_order
+               ) AS occurrence,
+               row_number() OVER (
+                   PARTITION BY se.active IS TRUE ORDER BY se.execution_order
+               ) AS rank_in_state
+        FROM split_exercise se
+        JOIN workout_plan wp ON wp.workout_plan_id = se.workout_plan_id
+        WHERE se.workout_plan_id = %(workout_plan_id)s
+              AND se.split = %(split)s
+              AND wp.user_id = %(user_id)s
+    ), target AS (
+        SELECT c.exercise_id, c.execution_order, c.active,
+               CASE
+                   WHEN c.active THEN r.position
+                   ELSE cardinality(%(ordering)s::int[]) + c.rank_in_state
+               END AS new_order
+        FROM current_rows c
+        LEFT JOIN requested r
+               ON c.active
+              AND r.exercise_id = c.exercise_id
+              AND r.occurrence = c.occurrence
+    ), valid AS (
+        SELECT count(*) FILTER (WHERE active) = cardinality(%(ordering)s::int[])
+               AND count(*) FILTER (WHERE new_order IS NULL) = 0 AS ok
+        FROM target
+    ), moved AS (
+        UPDATE split_exercise se
+        SET execution_order = t.new_order
+        FROM target t, valid v
+        WHERE v.ok
+              AND se.workout_plan_id = %(workout_plan_id)s
+              AND se.split = %(split)s
+              AND se.exercise_id = t.exercise_id
+              AND se.execution_order = t.execution_order
+              AND se.execution_order <> t.new_order
+    )
+    SELECT v.ok, t.exercise_id, t.new_order
+    FROM valid v
+    LEFT JOIN target t ON v.ok AND t.active
+    ORDER BY t.new_order;
+"""
+
+CLONE_WORKOUT_PLAN = """
+    WITH source_plan AS (
+        SELECT workout_plan_id, workout_plan_goal, active
+        FROM workout_plan
+        WHERE workout_plan_id = %(source_id)s AND user_id = %(source_user_id)s
+    ), new_plan AS (
+        INSERT INTO workout_plan
+        (user_id, workout_plan_name, workout_plan_goal, active)
+        SELECT %(target_user_id)s, %(new_name)s, workout_plan_goal, active
+        FROM source_plan
+        RETURNING workout_plan_id
+    ), new_splits AS (
+        INSERT INTO workout_split (split, workout_plan_id, active)
+        SELECT ws.split, np.workout_plan_id, ws.active
+        FROM workout_split ws
+        CROSS JOIN new_plan np
+        WHERE ws.workout_plan_id = %(source_id)s
+    ), new_split_exercises AS (
+        INSERT INTO split_exercise
+        (workout_plan_id, split, exercise_id, execution_order, sets, reps,
+         advanced_technique, rest_time, active)
+        SELECT np.workout_plan_id, se.split, se.exercise_id, se.execution_order,
+               se.sets, se.reps, se.advanced_technique, se.rest_time, se.active
+        FROM split_exercise se
+        CROSS JOIN new_plan np
+        WHERE se.workout_plan_id = %(source_id)s
+    )
+    SELECT workout_plan_id FROM new_plan;
+"""
+
+GET_PLAN_SPLIT_EXERCISES = """
+    SELECT se.split, se.exercise_id, se.execution_order, se.sets, se.reps,
+           se.advanced_technique, se.rest_time, se.active, e.user_id
+    FROM split_exercise se
+    JOIN exercise e ON e.exercise_id = se.exercise_id
+    WHERE se.workout_plan_id = %s;
+"""
+
+PLAN_USES_OTHER_USERS_EXERCISES = """
+    SELECT EXISTS (
+        SELECT 1
+        FROM split_exercise se
+        JOIN exercise e ON e.exercise_id = se.exercise_id
+        WHERE se.workout_plan_id = %s
+              AND e.user_id IS NOT NULL
+              AND e.user_id <> %s
+    );
+"""
+
+# Creates the same plan for many users from a template passed as arrays, so
+# it also works when the template lives on another shard.
+CLONE_WORKOUT_PLAN_TEMPLATE = """
+    WITH new_plans AS (
+        INSERT INTO workout_plan
+        (user_id, workout_plan_name, workout_plan_goal, active)
+        SELECT user_id, %(new_name)s, %(workout_plan_goal)s, %(active)s
+        FROM unnest(%(user_ids)s::int[]) AS user_id
+        ON CONFLICT (user_id, workout_plan_name) DO NOTHING
+        RETURNING workout_plan_id, user_id
+    ), new_splits AS (
+        INSERT INTO workout_split (split, workout_plan_id, active)
+        SELECT s.split, np.workout_plan_id, s.active
+        FROM new_plans np
+        CROSS JOIN unnest(%(splits)s::text[], %(split_active)s::boolean[])
+             AS s(split, active)
+    ), new_split_exercises AS (
+        INSERT INTO split_exercise
+        (workout_plan_id, split, exercise_id, execution_order, sets, reps,
+         advanced_technique, rest_time, active)
+        SELECT np.workout_plan_id, e.split, e.exercise_id, e.execution_order,
+               e.sets, e.reps, e.advanced_technique, e.rest_time, e.active
+        FROM new_plans np
+        CROSS JOIN unnest(
+            %(exercise_splits)s::text[],
+            %(exercise_ids)s::int[],
+            %(execution_orders)s::int[],
+            %(sets)s::int[],
+            %(reps)s::text[],
+            %(advanced_techniques)s::text[],
+            %(rest_times)s::int[],
+            %(exercise_active)s::boolean[]
+        ) AS e(split, exercise_id, execution_order, sets, reps,
+               advanced_technique, rest_time, active)
+    )
+    SELECT user_id, workout_plan_id FROM new_plans;
+"""
@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from app.analytics_repo import choose_bucket, lttb
+
+
+def test_choose_bucket_picks_the_smallest_bucket_within_max_points():
+    first = date(2026, 1, 1)
+    assert choose_bucket(first, first + timedelta(days=9), max_points=10) == "day"
+    assert choose_bucket(first, first + timedelta(days=10), max_points=10) == "week"
+    assert choose_bucket(first, first + timedelta(days=69), max_points=10) == "week"
+    assert choose_bucket(first, first + timedelta(days=70), max_points=10) == "month"
+
+
+def series(values):
+    first = date(2026, 1, 1)
+    return [
+        {"date": first + timedelta(days=day), "e1rm": value}
+        for day, value in enumerate(values)
+    ]
+
+
+def test_lttb_returns_short_series_unchanged():
+    points = series([1, 2, 3])
+    assert lttb(points, "e1rm", 5) == points
+    assert lttb(points, "e1rm", 2) == points
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    values = [0] * 50
+    values[17] = 100
+    values[33] = -100
+    points = series(values)
+
+    kept = lttb(points, "e1rm", 10)
+
+    assert len(kept) == 10
+    assert kept[0] is points[0] and kept[-1] is points[-1]
+    assert points[17] in kept and points[33] in kept
+    assert [point["date"] for point in kept] == sorted(
+        point["date"] for point in kept
+    )
+
+
+def test_lttb_treats_missing_values_as_zero():
+    points = series([None, 5, None, 7, None, 1])
+    assert len(lttb(points, "e1rm", 4)) == 4
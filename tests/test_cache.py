@@ -0,0 +1,44 @@
+from app.cache import MISSING, TTLCache
+
+
+def test_get_or_load_caches_loaded_value():
+    cache = TTLCache(max_size=10, ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"name": "Ana"}
+
+    assert cache.get_or_load("a", loader) == {"name": "Ana"}
+    assert cache.get_or_load("a", loader) == {"name": "Ana"}
+    assert len(calls) == 1
+
+
+def test_get_or_load_skips_value_loaded_across_an_invalidation():
+    cache = TTLCache(max_size=10, ttl=60)
+
+    def loader():
+        # A writer invalidates while the old row is being read.
+        cache.invalidate("a")
+        return "stale"
+
+    assert cache.get_or_load("a", loader) == "stale"
+    assert cache.get("a") is MISSING
+
+
+def test_negative_entries_are_cached():
+    cache = TTLCache(max_size=10, ttl=60, negative_ttl=30)
+    cache.set("a", None)
+    assert cache.get("a") is None
+    assert cache.stats()["negative_hits"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,30 @@
+import numpy as np
+
+from app.exercise_substitution import _top_k
+
+
+def test_top_k_returns_the_best_columns_of_each_row_in_order():
+    scores = np.array(
+        [
+            [0.1, 0.9, 0.5, 0.7],
+            [0.8, 0.2, 0.6, 0.4],
+        ],
+        dtype=np.float32,
+    )
+
+    columns, best = _top_k(scores, 3)
+
+    assert columns.tolist() == [[1, 3, 2], [0, 2, 3]]
+    np.testing.assert_allclose(best, [[0.9, 0.7, 0.5], [0.8, 0.6, 0.4]])
+
+
+def test_top_k_is_capped_by_the_number_of_columns():
+    columns, best = _top_k(np.array([[0.3, 0.6]], dtype=np.float32), 5)
+    assert columns.tolist() == [[1, 0]]
+    assert best.shape == (1, 2)
+
+
+def test_top_k_of_an_empty_catalog():
+    columns, best = _top_k(np.empty((2, 0), dtype=np.float32), 5)
+    assert columns.shape == (2, 0) and best.shape == (2, 0)
+    assert columns.dtype == np.int64
@@ -0,0 +1,53 @@
+from datetime import date
+
+from app.overload_suggestions import compute_suggestions
+
+DAY = date(2026, 10, 1)
+
+
+def history(exercise_id, sessions, sets=3, reps="8-12"):
+    """Rows of GET_OVERLOAD_HISTORY, sessions as (weight, top_sets, min_reps)."""
+    return [
+        (7, 1, "A", exercise_id, exercise_id, sets, reps, recency, DAY,
+         weight, top_sets, min_reps)
+        for recency, (weight, top_sets, min_reps) in enumerate(sessions, start=1)
+    ]
+
+
+def suggestion(rows):
+    (result,) = compute_suggestions(rows)
+    return result[5], result[7], result[8]
+
+
+def test_top_of_range_on_every_set_increases_the_weight():
+    assert suggestion(history(1, [(100, 3, 12)])) == ("increase", 8, 102)
+
+
+def test_bodyweight_exercise_adds_a_rep_instead():
+    assert suggestion(history(1, [(0, 3, 12)])) == ("increase", 13, 0)
+
+
+def test_missing_the_bottom_of_the_range_every_session_deloads():
+    rows = history(1, [(100, 3, 6), (100, 3, 7), (100, 3, 5)])
+    assert suggestion(rows) == ("deload", 8, 90)
+
+
+def test_otherwise_holds_the_weight_and_adds_a_rep():
+    rows = history(1, [(100, 3, 9), (100, 3, 6), (100, 3, 6)])
+    assert suggestion(rows) == ("hold", 10, 100)
+
+
+def test_rows_are_grouped_per_split_exercise():
+    rows = history(1, [(100, 3, 12)]) + history(2, [(60, 3, 9)])
+    results = compute_suggestions(rows)
+    assert [(result[2], result[5]) for result in results] == [
+        (1, "increase"),
+        (2, "hold"),
+    ]
+    assert results[0][4] == 7
+    assert results[0][11] == DAY
+
+
+def test_non_numeric_targets_are_skipped():
+    assert compute_suggestions(history(1, [(100, 3, 12)], reps="AMRAP")) == []
+    assert compute_suggestions([]) == []